@@ -9,18 +9,25 @@ from bs4 import BeautifulSoup, Tag
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.webdriver.remote.webdriver import WebDriver
 import signal
+import threading
+from queue import Queue, Empty
+from collections import namedtuple, OrderedDict
 
 
 from kafka import KafkaConsumer, KafkaProducer
 
 from feed.service import Client
-from feed.settings import kafka_params, routing_params, nanny_params
+from feed.settings import kafka_params, routing_params, nanny_params, worker_params, dispatch_params, chain_pool_params
+from feed.engine import KeyedThreadPool
+from feed.errorreports import ErrorReports
+from feed.parsers import parse
 from feed.actiontypes import Action, \
         ActionChainException, \
         ClickAction, \
         InputAction, \
         CaptureAction, \
-        PublishAction
+        PublishAction, \
+        get_mandatory_params
 
 
 
@@ -90,7 +97,7 @@ class BrowserSearchParams(ObjectSearchParams):
             formatted = lambda item: item.text
         elif self.returnType == 'src':
             classes = set([element.get_attribute('class') for element in item])
-            soup = BeautifulSoup(driver.page_source)
+            soup = parse(driver.page_source)
             out = []
             for cls in classes:
                 logging.debug(f'ObjectSearchParam::_returnItem(): searching for node with attribues, class=[{cls}]')
@@ -137,6 +144,10 @@ class BrowserSearchParams(ObjectSearchParams):
             # TODO brute search with text at this point
             return None
 
+# an action compiled for its chain, see ActionChain.compile
+ActionPlan = namedtuple('ActionPlan', ['position', 'action', 'actionHash', 'handler', 'callbackName'])
+
+
 class ActionChain:
     """
     a list of Actions and methods to support the running of a series of Actions.
@@ -148,17 +159,22 @@ class ActionChain:
     :param: repeating: should the actionchain run repeatedly
     :param: userID: the user id who requested the actionchain to be ran.
     :param: actions: A list of Action parameters key value pairs.
+    :param: streaming: yield returns to callbacks and the publisher as they are extracted, rather than as a list.
+    :param: browserProfile: name of the browser profile to run in, see feed.settings.browser_profiles
     """
     actions= {}
+    plan = ()
 
     def __init__(self, **kwargs):
         self.kwargs = kwargs
+        self.actions = {}
         self.name = kwargs.get('name')
         self.startUrl = kwargs.get('startUrl')
         self.repeating = kwargs.get('isRepeating', True)
         self.userID = kwargs.get('userID', None)
         actionParams = kwargs.get('actions', [])
         self.isSample = False
+        self.streaming = kwargs.get('streaming', False)
 
         # ActionChain has it's own implementation of a http client (a wrapper around requests lib) 
         # so that we can have implementation of sessions/cookies and or auth amongst services
@@ -175,10 +191,39 @@ class ActionChain:
                 # TODO: wAt this point we should pass this onto the user
                 traceback.print_exc()
                 logging.error(f'{type(self).__name__}::__init__(): chainName=[{self.name}], position=[{order}] actionType=[{params.get("actionType")}] is missing {ex.args} default parameter')
+        self.plan = self.compile()
+        self._callbacks = (None, ()) # (caller, callbacks bound to caller for each step of plan)
 
     def __repr__(self):
         return f'{type(self).__name__}: name={self.name}'
 
+    # parameters of a chain, and of its actions, which differ between messages for the same chain, see ChainPool
+    runParams = ('startUrl', 'userID', 'isRepeating')
+    actionRunParams = ('data', 'parentAttributes')
+
+    def reset(self, **kwargs):
+        """
+        make a chain taken from a ChainPool ready to run a message, the chain's definition
+        is the same but the message's run parameters are not.
+        """
+        self.kwargs = kwargs
+        self.startUrl = kwargs.get('startUrl')
+        self.repeating = kwargs.get('isRepeating', True)
+        self.userID = kwargs.get('userID', None)
+        self.isSample = False
+        self.failedChain = False
+        for order, params in enumerate(kwargs.get('actions', [])):
+            action = self.actions.get(order)
+            if action is None:
+                # dropped by actionFactory, see __init__
+                continue
+            # run parameters the message does not have take their defaults, as for a new chain
+            definition = {param: value for param, value in action.to_dict().items() if param not in ActionChain.actionRunParams}
+            runParams = {param: params.get(param) for param in ActionChain.actionRunParams if param in params}
+            self.actions[order] = type(action)(position=order, **definition, **runParams)
+        self.plan = self.compile()
+        self.initialiseClients()
+
     def recoverHistory(self) -> None:
         """
         make a request to the router service for the last point a repeating actionchain visited.
@@ -196,16 +241,15 @@ class ActionChain:
     def shouldRun(self) -> bool:
         """
         determine whether or not the chain should run by checking the previous fail flag to stop
-        a repeating actionchain and request for errors from nanny service.
+        a repeating actionchain and for error reports from nanny service, see feed.errorreports.ErrorReports
         """
         logging.debug(f'Checking if {self.name} should run')
         if self.failedChain:
             return False
+        reports = ErrorReports.shared().get(self.nannyClient, self.name, list(self.actions))
         for actionIndex in self.actions:
-            logging.debug(f'Checking if {actionIndex} in {self.name} can be run')
-            errors = self.nannyClient.get(f'/actionsmanager/findActionErrorReports/{self.name}/{actionIndex}', resp=True, error=[])
-            if len(errors) > 0:
-                logging.info(f'Will not run {self.name}')
+            if reports.get(actionIndex):
+                logging.info(f'Will not run {self.name}, position=[{actionIndex}] has error reports')
                 return False
         return True
 
@@ -215,9 +259,42 @@ class ActionChain:
         Construct an action to execute
         """
         logging.info(f'ActionChain::actionFactory: node=[{position}]: {", ".join(map(lambda key: "{}=[{}]".format(key, actionParams[key]), actionParams))}')
-        actionConstructor = ActionTypes.get(actionParams.get('actionType'))
+        actionType = actionParams.get('actionType')
+        actionConstructor = ActionTypesMap.get(actionType)
+        if actionConstructor is None:
+            raise KeyError('actionType')
+        # css, xpath, text and isSingle default, see BrowserSearchParams, the parameters of the action type do not
+        missing = [param for param in get_mandatory_params(actionType) if param not in actionParams and param not in get_mandatory_params('Action')]
+        if missing:
+            raise KeyError(*missing)
         return actionConstructor(position=position, **actionParams)
 
+    def compile(self) -> tuple:
+        """
+        turn the chain's actions into an immutable plan, so that executing the chain,
+        however often it repeats, does no per action setup.
+        """
+        plan = []
+        for position in sorted(self.actions):
+            action = self.actions.get(position)
+            actionType = type(action).__name__
+            plan.append(ActionPlan(position=position,
+                                   action=action,
+                                   actionHash=action.getActionHash(),
+                                   handler=getattr(self, f'on{actionType}'),
+                                   callbackName=f'on{actionType}Callback'))
+        return tuple(plan)
+
+    def _bindCallbacks(self, caller) -> tuple:
+        """
+        the caller's on<ActionType>Callback for each step of the plan, bound once per caller.
+        """
+        boundTo, callbacks = self._callbacks
+        if boundTo is not caller:
+            callbacks = tuple(getattr(caller, step.callbackName) for step in self.plan)
+            self._callbacks = (caller, callbacks)
+        return callbacks
+
     def initialise(self, caller):
         pass
 
@@ -233,6 +310,12 @@ class ActionChain:
     def onCaptureAction(self, action):
         raise NotImplementedError
 
+    def onActionOutcome(self, action, error=None):
+        """
+        called after each action is executed, with the exception it raised if it failed.
+        """
+        pass
+
     def onChainEnd(self):
         """
         called after the chaions execute method
@@ -244,28 +327,54 @@ class ActionChain:
         self.nannyClient.behalf = self.userID
         self.routerClient.behalf = self.userID
 
+    def _callback(self, callBackMethod, item, action):
+        try:
+            callBackMethod(item, chain=self)
+        except ActionChainException as ex:
+            logging.warning(f'{type(ex).__name__} raised during on{type(action).__name__}CallBack')
+            ex.chainName = self.name
+            Action.publishActionError(self, ex)
+
     def execute(self, caller, initialise=True):
+        """
+        run the chain's actions, calling the caller's on<ActionType>Callback for each item returned.
+        If the caller has a callbackPool, see ActionChainRunner, callbacks run on the pool in
+        the order they were returned while the chain carries on, and execute waits for them
+        before returning. An exception from a callback, other than an ActionChainException, is
+        raised from execute in either case.
+        """
         self.initialiseClients()
         self.failedChain = False
         if initialise:
             self.initialise(caller)
-        for i in range(len(self.actions)):
-            self.current_pos = i
-            action = self.actions.get(i)
+        pool = getattr(caller, 'callbackPool', None)
+        pool = pool if isinstance(pool, KeyedThreadPool) else None
+        try:
+            self._execute(caller, pool)
+        finally:
+            if pool is not None:
+                pool.wait_completion(id(self))
+                failure = pool.pop_failure(id(self))
+        if pool is not None and failure is not None:
+            # as the callback would have raised it on the chain's thread
+            raise failure
+
+    def _execute(self, caller, pool):
+        for step, callBackMethod in zip(self.plan, self._bindCallbacks(caller)):
+            self.current_pos = step.position
+            action = step.action
             logging.info(f'ActionChain::execute(): executing action {type(action).__name__}')
-            success = Action.execute(self, action)
+            success = Action.execute(self, action, handler=step.handler)
             if not success:
-                logging.info(f'{type(self).__name__}::execute(): Detected failure: actionType={type(action).__name__}, position={i}, name={self.name}. Will go straight to next action. {"Will not re-evaluate" if self.repeating else ""}')
+                logging.info(f'{type(self).__name__}::execute(): Detected failure: actionType={type(action).__name__}, position={step.position}, name={self.name}. Will go straight to next action. {"Will not re-evaluate" if self.repeating else ""}')
                 self.failedChain = True
                 continue
-            callBackMethod = getattr(caller, f'on{type(action).__name__}Callback')
-            for item in success:
-                try:
-                    callBackMethod(item, chain=self)
-                except ActionChainException as ex:
-                    logging.warning(f'{type(ex).__name__} raised during on{type(action).__name__}CallBack')
-                    ex.chainName = self.name
-                    Action.publishActionError(self, ex)
+            for item in Action.stream(self, action, success):
+                if pool is None:
+                    self._callback(callBackMethod, item, action)
+                else:
+                    # blocks while the pool's queue is full
+                    pool.add_task(id(self), self._callback, callBackMethod, item, action)
             self.saveHistory()
             self.onChainEnd()
 
@@ -296,6 +405,76 @@ class ActionChain:
 
 
 
+class ChainPool:
+    """
+    Chains kept between messages, by the fingerprint of their definition, so that a runner
+    sent the same chain again and again does not construct it, its actions and its clients,
+    for each message. A chain taken from the pool is reset with the message's run parameters,
+    see ActionChain.reset, and is not given out again until it is put back.
+
+    :param: implementation: ActionChain class
+    :param: size: chains kept, least recently used go first
+    """
+    def __init__(self, implementation, size=None):
+        self.implementation = implementation
+        self.size = size if size is not None else chain_pool_params['size']
+        self._idle = OrderedDict() # fingerprint: [chain, ...]
+        self._idleCount = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(actionChainParams) -> str:
+        definition = {key: value for key, value in actionChainParams.items() if key not in ActionChain.runParams and key != 'actions'}
+        definition['actions'] = [{key: value for key, value in params.items() if key not in ActionChain.actionRunParams}
+                                 for params in actionChainParams.get('actions', [])]
+        return hashlib.md5(json.dumps(definition, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def get(self, driver, **actionChainParams) -> ActionChain:
+        """
+        a chain for the message, from the pool if there is one idle.
+        """
+        fingerprint = ChainPool.fingerprint(actionChainParams)
+        chain = None
+        with self._lock:
+            idle = self._idle.get(fingerprint)
+            if idle:
+                chain = idle.pop()
+                self._idleCount -= 1
+                if not idle:
+                    del self._idle[fingerprint]
+        if chain is None:
+            self.misses += 1
+            chain = self.implementation(driver=driver, **actionChainParams)
+        else:
+            self.hits += 1
+            chain.reset(driver=driver, **actionChainParams)
+        chain.fingerprint = fingerprint
+        return chain
+
+    def put(self, chain: ActionChain):
+        """
+        return a chain once it has finished running.
+        """
+        if not self.size:
+            return
+        with self._lock:
+            self._idle.setdefault(chain.fingerprint, []).append(chain)
+            self._idle.move_to_end(chain.fingerprint)
+            self._idleCount += 1
+            while self._idleCount > self.size:
+                fingerprint, idle = next(iter(self._idle.items()))
+                idle.pop(0)
+                self._idleCount -= 1
+                if not idle:
+                    del self._idle[fingerprint]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(size=self.size, idle=self._idleCount, definitions=len(self._idle), hits=self.hits, misses=self.misses)
+
+
 class KafkaChainPublisher(ActionChain):
     pass
 
@@ -305,7 +484,7 @@ class ActionReturnSerialiser(JSONEncoder):
         if isinstance(obj, Tag):
             return str(obj)
         elif isinstance(obj, Action):
-            return obj.__dict__()
+            return obj.to_dict()
         else:
             return super().default(obj)
 
@@ -320,9 +499,8 @@ class KafkaActionPublisher(ActionChain):
     def rePublish(self, actionReturn, topic):
         self.messages_out_since_flush += 1
         # construct chain parameters to send
-        actionReturn.action.data = actionReturn.data
         payload = {
-            'actions': [actionReturn.action],
+            'actions': [dict(actionReturn.action.to_dict(), data=actionReturn.data)],
             'startUrl': actionReturn.current_url,
             'isRepeating': False,
             'name': actionReturn.name,
@@ -338,6 +516,48 @@ class KafkaActionPublisher(ActionChain):
             self.producer.flush()
 
 
+class QueueSubscription:
+    """
+    the runner's subscription read by a thread of its own, so workers can poll it without
+    blocking and share it between them.
+    :param: subscription: iterator of (actionChainParams, route)
+    """
+    def __init__(self, subscription, size=1):
+        self.messages = Queue(size)
+        self._thread = threading.Thread(target=self._read, args=(subscription,), name='QueueSubscription', daemon=True)
+        self._thread.start()
+
+    def _read(self, subscription):
+        for message in subscription:
+            self.messages.put(message)
+
+    def poll(self, timeout) -> list:
+        try:
+            return [self.messages.get(timeout=timeout) if timeout else self.messages.get(block=False)]
+        except Empty:
+            return []
+
+    def close(self):
+        pass
+
+
+class KafkaSubscription:
+    """
+    a consumer of the group, kafka shares the topics' partitions between the consumers of a
+    group so each message goes to one worker.
+    """
+    def __init__(self, consumer, route):
+        self.consumer = consumer
+        self.route = route
+
+    def poll(self, timeout) -> list:
+        records = self.consumer.poll(timeout_ms=int(timeout * 1000), max_records=worker_params['max_records'])
+        return [(message.value, self.route(message)) for messages in records.values() for message in messages]
+
+    def close(self):
+        self.consumer.close()
+
+
 class ActionChainRunner:
 
     driver = None
@@ -369,9 +589,81 @@ class ActionChainRunner:
     def driverHealthCheck(self):
         pass
 
+    def useProfile(self, name=None):
+        """
+        use the browser profile the chain asks for, see feed.crawling.BrowserService
+        """
+        pass
+
     def initialiseCallback(self, *args, **kwargs):
         logging.info('initialiseCallback')
 
+    _callbackPool = None
+    _chainPool = None
+
+    def newChain(self, driver, actionChainParams) -> ActionChain:
+        """
+        a chain of the implementation for a message, from the runner's ChainPool when chain_pool_params size is set.
+        """
+        if not chain_pool_params['size']:
+            return self.implementation(driver=driver, **actionChainParams)
+        if self._chainPool is None:
+            self._chainPool = ChainPool(self.implementation)
+        return self._chainPool.get(driver, **actionChainParams)
+
+    def releaseChain(self, chain):
+        """
+        a chain from newChain has finished running.
+        """
+        if self._chainPool is not None:
+            self._chainPool.put(chain)
+
+    @property
+    def callbackPool(self) -> KeyedThreadPool:
+        """
+        the pool chains run this runner's on<ActionType>Callbacks on, so a slow callback
+        does not hold the browser, None to call them on the chain's thread. see dispatch_params
+        """
+        if self._callbackPool is None and dispatch_params['threads']:
+            self._callbackPool = KeyedThreadPool(dispatch_params['threads'], queue_size=dispatch_params['queue_size'])
+        return self._callbackPool
+
+    """
+    following methods are used by the workers of feed.workers.ChainWorkers
+    """
+    def workerSubscription(self, index):
+        """
+        the subscription of a worker, anything with poll(timeout) -> [(actionChainParams, route), ...] and close().
+        defaults to the runner's subscription, shared by the workers.
+        """
+        if getattr(self, '_sharedSubscription', None) is None:
+            self._sharedSubscription = QueueSubscription(self.subscription())
+        return self._sharedSubscription
+
+    def checkWorkers(self, workers):
+        """
+        raise ValueError if workers, across every process, can not share the subscription.
+        """
+        pass
+
+    def checkoutWorkerDriver(self):
+        """
+        a driver for a worker of its own.
+        """
+        return self.driver
+
+    def checkinWorkerDriver(self, driver, healthy=True):
+        pass
+
+    def workerDriverHealthy(self, driver) -> bool:
+        return True
+
+    def workerTabs(self, driver):
+        """
+        the tabs to run a worker's chains in, see feed.tabs.SessionTabs, None to share the driver.
+        """
+        return None
+
     def main(self):
         killer = GracefulKiller()
         logging.info(f'{type(self).__name__}::main(): beginning subscription poll of kafka')
@@ -379,14 +671,16 @@ class ActionChainRunner:
             # If shutdown was triggered, then do that now
             if killer.kill_now:
                 break
+            self.useProfile(actionChainParams.get('browserProfile'))
             if not self.driverHealthCheck():
                 self.renewDriverSession()
 
-            actionChain = self.implementation(driver=self.driver, **actionChainParams)
+            actionChain = self.newChain(self.driver, actionChainParams)
             if 'sample' in route:
                 actionChain.isSample = True
             if not actionChain.shouldRun():
                 logging.info(f'Skipping {actionChain.name}.')
+                self.releaseChain(actionChain)
                 # TODO notifications service here
                 continue
             logging.info(f'{type(self).__name__}::main(): START:{actionChain.name} implementing action chain {actionChainParams.get("name")}: {json.dumps(actionChainParams, indent=4)}')
@@ -399,6 +693,7 @@ class ActionChainRunner:
                     break
                 ret = actionChain.execute(caller=self, initialise=False)
                 self.onChainEndCallback(actionChain, ret)
+            self.releaseChain(actionChain)
             if killer.kill_now:
                 break
             logging.info(f'{type(self).__name__}::main(): END:{actionChain.name} ActionChain::execute() has returned')
@@ -415,7 +710,11 @@ class KafkaActionSubscription(ActionChainRunner):
         self.topics = list(map(KafkaActionSubscription.topic_name, topics))
 
         logging.info(f'Starting ActionChainRuner type {type(self).__name__}, topics=[{self.topics}], prefix=[{os.environ["KAFKA_TOPIC_PREFIX"]}]')
-        self._consumer = KafkaConsumer(**kafka_params, value_deserializer=lambda m: json.loads(m.decode('utf-8')))
+        self._consumer = self._newConsumer()
+
+    @staticmethod
+    def _newConsumer():
+        return KafkaConsumer(**kafka_params, group_id=worker_params['group_id'], value_deserializer=lambda m: json.loads(m.decode('utf-8')))
 
     @staticmethod
     def topic_name(topic):
@@ -431,6 +730,22 @@ class KafkaActionSubscription(ActionChainRunner):
             route = KafkaActionSubscription.get_route(mes)
             yield mes.value, route
 
+    def checkWorkers(self, workers):
+        """
+        without a consumer group every consumer is assigned every partition, so every worker
+        would run every message.
+        """
+        if workers > 1 and not worker_params['group_id']:
+            raise ValueError(f'{workers} workers need KAFKA_GROUP_ID to share the partitions of {self.topics}, otherwise each runs every message')
+
+    def workerSubscription(self, index):
+        """
+        a consumer of worker_params group_id for each worker, the first worker has the runner's.
+        """
+        consumer = self._consumer if index == 0 else KafkaActionSubscription._newConsumer()
+        consumer.subscribe(self.topics)
+        return KafkaSubscription(consumer, KafkaActionSubscription.get_route)
+
 
 class CommandsActionSubscription(ActionChainRunner):
 
@@ -1,6 +1,7 @@
 import logging
 import os
 import hashlib
+import re
 import traceback
 import requests
 import json
@@ -15,31 +16,49 @@ from kafka import KafkaConsumer, KafkaProducer
 
 from feed.service import Client
 from feed.settings import kafka_params, routing_params, nanny_params
+from feed.parsers import parse
+from feed.scripts import ELEMENT_SEARCH
+from feed.errorreports import ErrorReports
 #from feed.actionchains import ActionChain
 
 class ObjectSearchParams:
     """
     Base class for to hold parameters for an item on page, and verifies the items
     found are of the correct quantity.
+
+    search parameters, and the actions built on them, are slotted and immutable, a chain can
+    hold thousands of them and they are shared between the chain's runs. see Action.replace
+    for a copy with some parameters changed.
     """
+    __slots__ = ('isSingle', 'returnType', 'attribute')
+
     def __init__(self, **kwargs):
         #super().__init__(**kwargs)
-        self.isSingle = kwargs.get('isSingle', False)
-        self.returnType = kwargs.get('returnType', 'src') # see actiontypes.py ReturnType
-        self.attribute = kwargs.get('attribute', None)
+        self._set(isSingle=kwargs.get('isSingle', False),
+                  returnType=kwargs.get('returnType', 'src'), # see actiontypes.py ReturnType
+                  attribute=kwargs.get('attribute', None))
 
-    def __dict__(self):
-        return self.kwargs
+    def _set(self, **fields):
+        """
+        set fields while the object is constructed.
+        """
+        for field, value in fields.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable, can not set {name}, see Action.replace')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable, can not delete {name}')
 
     def _verifyResultLength(self, items) -> bool:
         """
-        check the number of found items is correct, if there are too many items,
-        the items are stored as a backup.
+        check the number of found items is correct, too many items are not, but can be
+        used as a backup, see BrowserSearchParams.search.
         """
         if len(items) == 0:
             return False
         if self.isSingle and len(items) > 1:
-            self.backup = items
             return False
         else:
             return True
@@ -54,7 +73,14 @@ class BrowserSearchParams(ObjectSearchParams):
     """
     TODO: Move this to crawling.py as it is specific to selenium driver.
     Implementation for browser driver ObjectSearchParams.
+
+    fuzzyText: whether the text search also takes close matches of the text, see
+    feed.pagecache.PageSnapshot.findByText. only clicks do, a capture or publish of a near
+    miss would return the wrong data.
     """
+    __slots__ = ('css', 'xpath', 'text')
+    fuzzyText = False
+
     def __init__(self, **kwargs):
         """
         :params: css of the item
@@ -62,42 +88,46 @@ class BrowserSearchParams(ObjectSearchParams):
         :params: text of item
         """
         super().__init__(**kwargs)
-        self.kwargs = kwargs
-        self.css = kwargs.get('css')
-        self.xpath = kwargs.get('xpath')
-        self.text = kwargs.get('text')
+        self._set(css=kwargs.get('css'), xpath=kwargs.get('xpath'), text=kwargs.get('text'))
         #self.class = kwargs.get('class') 
         # TODO increase number of possible params 
         # larger scale feature to offer more range of 
         # options for viewing source (e.g: raw html source and side by side page) in ui where 
         # user can specify things on lower level
-        self.backup = None # backup is set if _verifyResultLength returns incorrect number of items.
 
-    def _returnItem(self, item: WebElement, driver: WebDriver): # -> ReturnItem
+    def _returnItem(self, item: list, driver: WebDriver, pages=None, stream=False): # -> ReturnItem
         """
-        given a located element of the page, and the caller's webdriver, return the item
-        in a representation dependent on the
+        given the located elements of the page, as described by feed.scripts.ELEMENT_SEARCH,
+        and the caller's webdriver, return the item in a representation dependent on the
         return type.
 
+        :param: pages: the caller's feed.pagecache.PageCache, if there is one the parsed source is shared with it.
+        :param: stream: return an iterator which formats each item as it is taken, rather than a list or single item.
         """
         logging.debug(f'returning returnType=[{self.returnType}] type for actionType=[{type(self).__name__}]')
         # define formatter (callable) depending on the returnType
         if self.returnType == 'text':
-            formatted = lambda item: item.text
+            formatted = lambda described: described.get('text')
         elif self.returnType == 'src':
-            classes = set([element.get_attribute('class') for element in item])
-            soup = BeautifulSoup(driver.page_source)
+            classes = set([described.get('class') for described in item])
+            if pages is not None:
+                findByClass = pages.get(driver).findByClass
+            else:
+                soup = parse(driver.page_source)
+                findByClass = lambda cls: soup.findAll(attrs={'class': cls})
             out = []
             for cls in classes:
                 logging.debug(f'ObjectSearchParam::_returnItem(): searching for node with attribues, class=[{cls}]')
-                out.extend(soup.findAll(attrs={'class': cls}))
+                out.extend(findByClass(cls))
             item = out
             formatted = lambda it: (it, it.find_parent("a").attrs if it.find_parent('a') is not None else {})
         elif self.returnType == 'attr':
-            formatted = lambda element: element.get_attribute(self.attribute)
+            formatted = lambda described: described.get('attr')
         elif self.returnType == 'element':
-            formatted = lambda it: it
+            formatted = lambda described: described.get('element')
         logging.debug(f'ObjectSearchParams::_returnItem(): returning {len(item)}.')
+        if stream:
+            return map(formatted, item)
         retVal = list(map(formatted, item))
         if len(retVal) == 0:
             logging.warning(f'No items found for item return for {type(self).__name__}.')
@@ -107,71 +137,153 @@ class BrowserSearchParams(ObjectSearchParams):
         else:
             return retVal
 
-    def search(self, driver) -> WebElement:
+    def _strategies(self) -> list:
+        """
+        the [kind, selector] pairs to search with, in order.
+        """
+        return [[kind, selector] for kind, selector in (('css', self.css), ('xpath', self.xpath)) if selector]
+
+    def search(self, driver, pages=None, stream=False, strategyStats=None, located=None) -> WebElement:
         """
         Find the element of the page, given the parameters.
         object is searched in conjunction with'_verifyResultLength' in
         order of parameters.
 
-        TODO: make the order configurable - not necessarily to the user but
-        to the running environment
-        """
-
-        # first try css selector
-        logging.info(f'{type(self).__name__}::search(driver): searching for elemnent with css=[{self.css}]' ) # we need to stop typing function names, makes grep awful
-        ret = driver.find_elements_by_css_selector(self.css)
-        if self._verifyResultLength(ret):
-            logging.info(f'BrowserSearchParams::search(): found elements count=[{len(ret)}], isSingle=[{self.isSingle}] with css')
-            return self._returnItem(ret, driver)
-
-        # then try xpath
-        logging.info(f'{type(self).__name__}::search(driver): searching for elemnent with xpath=[{self.xpath}]')
-        ret = driver.find_elements_by_xpath(self.xpath)
-        if self._verifyResultLength(ret):
-            logging.info(f'BrowserSearchParams::search: found element [{ret}] with xpath')
-            return self._returnItem(ret, driver)
-
-        # then try backup with text. backup is set in ObjectSearchParams::_verifyResultLength(items)
-        if self.backup:
-            for res in filter(lambda item: item.text.upper() == self.text, self.backup):
-                logging.debug(f'using element [{ret}] from backup')
-                return self._returnItem([ret], driver)
-            return self._returnItem([self.backup[0]], driver)
-        else:
-            # TODO brute search with text at this point
+        The whole search, including fallbacks and the class, text and attribute of each
+        element, is a single execute_script round trip. WebElements are only returned
+        for the 'element' returnType.
+
+        :param: pages: feed.pagecache.PageCache to take parsed page source from
+        :param: stream: see _returnItem
+        :param: strategyStats: feed.locators.StrategyStats, when given the strategy which has
+                               found this action's elements most often is tried first.
+        :param: located: dict, updated with the kind and selector of the strategy which found
+                         the items, and the text the item was picked from several by. left
+                         empty if the item can not be found again that way.
+        """
+        backup = None # (kind, items) of a strategy which found too many, see _verifyResultLength
+        strategies = self._strategies()
+        if strategyStats is not None:
+            strategies = strategyStats.order(self.getActionHash(), strategies)
+        selectors = dict(strategies)
+        logging.info(f'{type(self).__name__}::search(driver): searching for element with strategies=[{strategies}]')
+        results = driver.execute_script(ELEMENT_SEARCH, strategies, self.isSingle, self.attribute, self.returnType == 'element')
+        for kind, ret in results:
+            if self._verifyResultLength(ret):
+                logging.info(f'BrowserSearchParams::search(): found elements count=[{len(ret)}], isSingle=[{self.isSingle}] with {kind}')
+                if strategyStats is not None:
+                    strategyStats.record(self.getActionHash(), kind)
+                if located is not None:
+                    located.update(kind=kind, selector=selectors.get(kind), text=None)
+                return self._returnItem(ret, driver, pages=pages, stream=stream)
+            if len(ret) > 1:
+                backup = (kind, ret)
+
+        # then try backup with text.
+        if backup:
+            kind, ret = backup
+            text = self.text.upper() if self.text else None
+            for res in filter(lambda described: (described.get('text') or '').upper() == text, ret):
+                logging.debug(f'using element [{res}] from backup')
+                if located is not None:
+                    located.update(kind=kind, selector=selectors.get(kind), text=self.text)
+                return self._returnItem([res], driver, pages=pages, stream=stream)
+            return self._returnItem([ret[0]], driver, pages=pages, stream=stream)
+        elif self.text and pages is not None:
+            return self._searchText(driver, pages, stream=stream, located=located)
+        return None
+
+    def _searchText(self, driver, pages, stream=False, located=None):
+        """
+        find the element by its text when the selectors found nothing. the text is looked up
+        in the text index of the parsed page, see feed.pagecache.PageSnapshot.findByText, and
+        the elements it matches are located in the browser by their absolute xpath.
+        """
+        snapshot = pages.get(driver)
+        nodes = snapshot.findByText(self.text, fuzzy=self.fuzzyText)
+        if not nodes:
+            logging.info(f'{type(self).__name__}::_searchText: no element with text=[{self.text}]')
             return None
+        strategies = [['xpath', snapshot.xpathFor(node)] for node in nodes]
+        logging.info(f'{type(self).__name__}::_searchText: searching for text=[{self.text}] with strategies=[{strategies}]')
+        results = driver.execute_script(ELEMENT_SEARCH, strategies, True, self.attribute, self.returnType == 'element')
+        for (kind, selector), (_, ret) in zip(strategies, results):
+            if ret:
+                if located is not None and len(ret) == 1:
+                    located.update(kind=kind, selector=selector, text=None)
+                return self._returnItem(ret[:1], driver, pages=pages, stream=stream)
+        return None
 
 
 class Action(BrowserSearchParams):
 
     """
     Base action class
+
+    params are the parameters an action is built from and serialised to, see to_dict,
+    parameters an action does not know are kept in extra, so they are passed on when it is
+    republished.
     """
+    __slots__ = ('position', 'actionHash', 'extra')
+    params = ('actionType', 'css', 'xpath', 'text', 'isSingle', 'returnType', 'attribute')
+
     def __init__(self, position, **kwargs):
         super().__init__(**kwargs)
-        self.kwargs = kwargs
-        self.position = position
+        extra = {param: value for param, value in kwargs.items() if param not in self.params}
+        self._set(position=position, extra=extra or None)
+        self._set(actionHash=hashlib.md5(f'{type(self).__name__}:{self.position}:{self.css}:{self.xpath}'.encode('utf-8')).hexdigest())
+
+    @property
+    def actionType(self):
+        return type(self).__name__
 
     def getActionHash(self):
-        return hashlib.md5(f'{type(self).__name__}:{self.position}:{self.css}:{self.xpath}'.encode('utf-8')).hexdigest()
+        return self.actionHash
+
+    def to_dict(self) -> dict:
+        """
+        the action's parameters, as chains are defined and republished with.
+        """
+        out = dict(self.extra) if self.extra else {}
+        out.update((param, getattr(self, param)) for param in self.params)
+        return out
+
+    @staticmethod
+    def from_dict(params: dict, position=0):
+        """
+        the action of the type params['actionType'].
+        """
+        actionTypes = {actionType.__name__: actionType for actionType in Action.__subclasses__()}
+        return actionTypes[params['actionType']](position=position, **params)
+
+    def replace(self, **params):
+        """
+        a copy of the action with some of its parameters changed.
+        """
+        return type(self)(position=self.position, **dict(self.to_dict(), **params))
 
     @staticmethod
-    def execute(chain, action):
+    def execute(chain, action, handler=None):
         """
         Call the actionchains execute method for this action type
         TODO: This should really be moved to the action chain itself, so actions run
         through the chain.
+        :param: handler: the chain's bound on<ActionType> method, looked up if not given
         """
         actionType = type(action).__name__
         try:
-            ret = getattr(chain, f'on{actionType}')(action)
+            handler = handler if handler else getattr(chain, f'on{actionType}')
+            ret = handler(action)
             logging.debug(f'Action::execute: Action executed succesfully, name=[{chain.name}], position=[{action.position}]')
+            chain.onActionOutcome(action)
             return ret
         except ActionChainException as ex:
+            chain.onActionOutcome(action, ex)
             Action.publishActionError(chain, ex)
             logging.info(f'{type(ex).__name__} thrown whilst processing')
             return False
         except Exception as ex:
+            chain.onActionOutcome(action, ex)
             traceback.print_exc()
             logging.warning(f'Action::execute:: {type(ex).__name__} thrown whilst processing name=[{chain.name}], position=[{action.position}], args=[{ex.args}]')
             Action.publishUnhandledActionError(chain, ex, action)
@@ -179,28 +291,52 @@ class Action(BrowserSearchParams):
             # TODO Exception reporting callback called here
             # OnClickException for example
 
-    def getActionableItem(self, action, driver):
+    def getActionableItem(self, action, driver, pages=None, stream=False, strategyStats=None, located=None):
         """
         just a wrapper, probably pointless
         """
-        item = self.search(driver)
+        item = self.search(driver, pages=pages, stream=stream, strategyStats=strategyStats, located=located)
         # TODO this should be overriden by specifc action implementation.
         # heck, it could even be user python code working on a ReturnType.
         # Could then be used to enact user defined python code on the 
         # html string of the entire webpage. Just need to have the types
         # in place.
-        logging.info(f'{type(self).__name__}::getActionableItem: have num_items=[{ 1 if not isinstance(item, list) else len(item)}]')
+        if not stream:
+            logging.info(f'{type(self).__name__}::getActionableItem: have num_items=[{ 1 if not isinstance(item, list) else len(item)}]')
         return item
 
     @staticmethod
-    def get_params():
+    def stream(chain, action, items):
+        """
+        iterate over the items an action returned. when the chain is streaming, items are
+        extracted as they are iterated, so errors are handled here as execute does.
+        """
+        try:
+            for item in items:
+                yield item
+        except ActionChainException as ex:
+            chain.failedChain = True
+            chain.onActionOutcome(action, ex)
+            Action.publishActionError(chain, ex)
+            logging.info(f'{type(ex).__name__} thrown whilst streaming')
+        except Exception as ex:
+            chain.failedChain = True
+            chain.onActionOutcome(action, ex)
+            traceback.print_exc()
+            logging.warning(f'Action::stream:: {type(ex).__name__} thrown whilst streaming name=[{chain.name}], position=[{action.position}], args=[{ex.args}]')
+            Action.publishUnhandledActionError(chain, ex, action)
+
+    @classmethod
+    def get_params(cls):
         # TODO For UI-Server
-        return [self.__dict__().keys()]
+        return list(cls.params)
 
     @staticmethod
     def publishActionError(chain, actionException):
         actionException.userID = chain.nannyClient.behalf
-        chain.nannyClient.put(f'/actionsmanager/reportActionError/{actionException.chainName}', payload=actionException.__dict__())
+        report = actionException.to_dict()
+        chain.nannyClient.put(f'/actionsmanager/reportActionError/{actionException.chainName}', payload=report)
+        ErrorReports.shared().reported(actionException.userID, actionException.chainName, report)
 
     @staticmethod
     def publishUnhandledActionError(chain, exception, action):
@@ -210,11 +346,14 @@ class Action(BrowserSearchParams):
         """
         #chain.nannyClient.put(f'')
         # TODO 
-        logging.warning(f'Unhandled exception in action {action.__dict__()}, exception={exception.args}')
+        logging.warning(f'Unhandled exception in action {action.to_dict()}, exception={exception.args}')
         pass
 
 
 class CaptureAction(Action):
+    __slots__ = ('parentAttributes', 'captureName', 'data', 'backupKey')
+    params = Action.params + __slots__
+
     def __init__(self, **kwargs):
         """
         :param: returnType: I dont see why this should be a parameter!!! should change for simplicity
@@ -224,26 +363,20 @@ class CaptureAction(Action):
         :param: backupKey: if no unique identifier is found within the set of results, what to save it as (eg. if no url is found),
         """
         super().__init__(**kwargs)
-        self.returnType = self.kwargs.pop('returnType', 'src')
-        self.parentAttributes = self.kwargs.pop('parentAttributes', {})
-        # webcralwer adds the attributes of the parent of the html tag to the parser, incase it contains a link. you can probably tell... a hack
-        self.captureName = self.kwargs.pop('captureName') # mandatory
-        self.data = self.kwargs.pop('data', None)
-        self.backupKey = self.kwargs.pop('backupKey', None) # TODO: this could remove the hack of the parentAttributes if done correctly
-
-    def __dict__(self):
-        return dict(data=self.data, parentAttributes=self.parentAttributes, backupKey=self.backupKey, captureName=self.captureName, returnType=self.returnType, **self.kwargs)
+        self._set(returnType=kwargs.get('returnType', 'src'),
+                  parentAttributes=kwargs.get('parentAttributes', {}),
+                  # webcralwer adds the attributes of the parent of the html tag to the parser, incase it contains a link. you can probably tell... a hack
+                  captureName=kwargs['captureName'], # mandatory
+                  data=kwargs.get('data', None),
+                  backupKey=kwargs.get('backupKey', None)) # TODO: this could remove the hack of the parentAttributes if done correctly
 
 class InputAction(Action):
+    __slots__ = ('inputString',)
+    params = Action.params + __slots__
 
     def __init__(self, inputString, **kwargs):
         super().__init__(**kwargs)
-        self.insputString = inputString
-        self.isSingle = True
-        self.returnType = 'element'
-
-    def __dict__(self):
-        return dict(inputString=self.insputString, **self.kwargs)
+        self._set(inputString=inputString, isSingle=True, returnType='element')
 
 class PublishAction(Action):
     """
@@ -253,18 +386,21 @@ class PublishAction(Action):
     need is parameters from nanny. That way users can reuse actionchains
     for example a login action chain followed by a list of different actionchains.
     """
+    __slots__ = ('urlStub', 'urlStubPattern')
+    params = Action.params + ('urlStub',)
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.urlStub = kwargs.get('urlStub')
-
-    def __dict__(self):
-        return dict(url=self.url, urlStub=self.urlStub, **self.kwargs)
+        urlStub = kwargs.get('urlStub')
+        self._set(urlStub=urlStub, urlStubPattern=re.compile(f'{urlStub}/*') if urlStub else None)
 
 class ClickAction(Action):
+    __slots__ = ()
+    fuzzyText = True # a button's label is often reworded, eg. Next for Next page
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.isSingle = True
-        self.returnType = 'element'
+        self._set(isSingle=True, returnType='element')
 
 
 ActionTypes = {
@@ -310,9 +446,21 @@ class ActionChainException(Exception):
         self.actionHash = actionHash
         self.message = kwargs.get('message', '')
 
-    def __dict__(self):
+    def to_dict(self) -> dict:
+        """
+        the error report, as it is published to nanny.
+        """
         return dict(userID=self.userID, position=self.position, actionHash=self.actionHash, chainName=self.chainName, errorType=type(self).__name__, message=self.message)
 
+    @staticmethod
+    def from_dict(report: dict):
+        """
+        the exception of the report's errorType.
+        """
+        errorTypes = {errorType.__name__: errorType for errorType in ActionChainException.__subclasses__()}
+        params = {param: value for param, value in report.items() if param != 'errorType'}
+        return errorTypes.get(report.get('errorType'), ActionChainException)(**params)
+
 class ActionableItemNotFound(ActionChainException):
     pass
 
@@ -0,0 +1,247 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from feed.settings import aio_params
+from feed.actionchains import ActionChainRunner, GracefulKiller
+
+
+class AsyncAdapter:
+    """
+    Awaitable calls of a blocking object, each run on an executor so the event loop carries
+    on while it waits. Methods of the object are awaited as they are, attributes which make
+    a call, eg. a driver's current_url, with attribute.
+
+        url = await driver.attribute('current_url')
+        await driver.get(url)
+
+    Chains themselves are blocking, see AsyncActionChainRunner, the adapters are for the
+    runner's async def callbacks, which run on the event loop and would hold it up with a
+    blocking call:
+
+        async def onCaptureActionCallback(self, item, *args, **kwargs):
+            await self.publisher.rePublish(item, topic)
+
+    :param: wrapped: the blocking object
+    :param: executor: concurrent.futures executor, None for the loop's default
+    """
+    def __init__(self, wrapped, executor=None):
+        self.wrapped = wrapped
+        self.executor = executor
+
+    async def call(self, method, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def attribute(self, name):
+        return await self.call(getattr, self.wrapped, name)
+
+    def __getattr__(self, name):
+        method = getattr(self.wrapped, name)
+        if not callable(method):
+            return method
+        return functools.partial(self.call, method)
+
+
+class AsyncDriver(AsyncAdapter):
+    """
+    a webdriver, see AsyncAdapter.
+    """
+    async def currentUrl(self):
+        return await self.attribute('current_url')
+
+    async def pageSource(self):
+        return await self.attribute('page_source')
+
+
+class AsyncClient(AsyncAdapter):
+    """
+    a feed.service.Client, see AsyncAdapter.
+    """
+    async def get(self, endpoint, payload=None, resp=False, error=None, **kwargs):
+        return await self.call(self.wrapped.get, endpoint, payload=payload, resp=resp, error=error, **kwargs)
+
+    async def put(self, endpoint, payload=None, resp=False, error=None, **kwargs):
+        return await self.call(self.wrapped.put, endpoint, payload=payload, resp=resp, error=error, **kwargs)
+
+    async def post(self, endpoint, payload=None, resp=False, error=None, **kwargs):
+        return await self.call(self.wrapped.post, endpoint, payload=payload, resp=resp, error=error, **kwargs)
+
+    async def delete(self, endpoint, payload=None, resp=False, error=None, **kwargs):
+        return await self.call(self.wrapped.delete, endpoint, payload=payload, resp=resp, error=error, **kwargs)
+
+
+class AsyncPublisher(AsyncAdapter):
+    """
+    a publisher, eg. KafkaActionPublisher, see AsyncAdapter. Its calls run one at a time on
+    a thread of their own, so messages go out in the order they were published.
+    """
+    def __init__(self, wrapped):
+        super().__init__(wrapped, ThreadPoolExecutor(max_workers=1, thread_name_prefix='AsyncPublisher'))
+
+    async def rePublish(self, actionReturn, topic):
+        return await self.call(self.wrapped.rePublish, actionReturn, topic)
+
+    async def flush(self):
+        return await self.call(self.wrapped.producer.flush)
+
+
+class CallbackBridge:
+    """
+    the runner as the caller of chains running on the executor. Callbacks which are
+    coroutine functions are run on the event loop, and the chain waits for them, so they
+    are called with the same arguments, in the same order, and exceptions they raise reach
+    the chain as they would from a plain callback.
+    """
+    def __init__(self, runner, loop):
+        self.runner = runner
+        self.loop = loop
+
+    def __getattr__(self, name):
+        method = getattr(self.runner, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        def callback(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self.loop).result()
+        return callback
+
+
+class AsyncActionChainRunner(ActionChainRunner):
+    """
+    ActionChainRunner on an event loop, running up to concurrency chains at once in one
+    process. Reading the subscription, the shouldRun checks, constructing chains and each
+    run of a chain are awaited on an executor, and repeats of a repeating chain are awaited
+    one at a time, so the loop carries on with the other chains in between.
+
+    Chains and their actions are blocking, so a chain holds a thread of the executor for the
+    whole of each run, and concurrency is bounded by the executor's threads. There are at
+    least concurrency threads, and one more for the subscription.
+
+    on<Action>Callbacks keep their contract, they may be plain or async def, see CallbackBridge.
+    Chains run in tabs of the runner's session where it has them, see feed.tabs, and one at
+    a time otherwise if they need a driver.
+
+    :param: concurrency: chains run at once, defaults to aio_params
+    :param: threads: threads of the executor, defaults to aio_params
+    """
+    def __init__(self, implementation, concurrency=None, threads=None, **kwargs):
+        super().__init__(implementation, **kwargs)
+        self.concurrency = concurrency if concurrency is not None else aio_params['concurrency']
+        threads = threads if threads is not None else aio_params['threads']
+        if threads <= self.concurrency:
+            # each running chain holds a thread, the subscription would wait on them
+            logging.info(f'{type(self).__name__}::__init__(): threads=[{threads}] is not more than concurrency=[{self.concurrency}], using {self.concurrency + 1}')
+            threads = self.concurrency + 1
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='AsyncActionChainRunner')
+        self._stopping = threading.Event()
+        self._killer = None
+
+    async def _run(self, method, *args, **kwargs):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, functools.partial(method, *args, **kwargs))
+
+    async def asyncSubscription(self):
+        """
+        async iterator of (actionChainParams, route), polling the runner's subscription.
+        """
+        subscription = self.workerSubscription(0)
+        try:
+            while not self.stopping:
+                for message in await self._run(subscription.poll, aio_params['poll_timeout']):
+                    yield message
+        finally:
+            subscription.close()
+
+    async def runChain(self, actionChainParams, route, bridge, driver, tabs=None):
+        """
+        run a chain, and its repeats, as ActionChainRunner.main does.
+        """
+        tab = await self._run(tabs.open) if tabs is not None else None
+        actionChain = None
+        try:
+            actionChain = await self._run(self.newChain, tab if tab is not None else driver, actionChainParams)
+            if 'sample' in route:
+                actionChain.isSample = True
+            if not await self._run(actionChain.shouldRun):
+                logging.info(f'Skipping {actionChain.name}.')
+                return
+            logging.info(f'{type(self).__name__}::runChain(): START:{actionChain.name}')
+            ret = await self._run(actionChain.execute, bridge)
+            await self._callback('onChainEndCallback', actionChain, ret)
+            while actionChain.repeating and not self.stopping and await self._run(actionChain.shouldRun):
+                ret = await self._run(actionChain.execute, caller=bridge, initialise=False)
+                await self._callback('onChainEndCallback', actionChain, ret)
+            logging.info(f'{type(self).__name__}::runChain(): END:{actionChain.name}')
+        finally:
+            if actionChain is not None:
+                self.releaseChain(actionChain)
+            if tab is not None:
+                await self._run(tabs.close, tab)
+
+    async def _callback(self, name, *args, **kwargs):
+        method = getattr(self, name)
+        if asyncio.iscoroutinefunction(method):
+            return await method(*args, **kwargs)
+        return method(*args, **kwargs)
+
+    async def _runLogged(self, slots, *args):
+        try:
+            await self.runChain(*args)
+        except Exception:
+            logging.exception(f'{type(self).__name__}::_runLogged(): chain has failed')
+        finally:
+            slots.release()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set() or (self._killer is not None and self._killer.kill_now)
+
+    async def mainAsync(self):
+        self._stopping.clear()
+        self._killer = GracefulKiller()
+        loop = asyncio.get_event_loop()
+        bridge = CallbackBridge(self, loop)
+        driver = await self._run(self.checkoutWorkerDriver)
+        tabs = self.workerTabs(driver) if driver is not None else None
+        concurrency = self.concurrency
+        if tabs is not None and tabs.maxTabs:
+            concurrency = min(concurrency, tabs.maxTabs)
+        elif tabs is None and driver is not None:
+            # chains sharing a driver run one at a time
+            concurrency = 1
+        slots = asyncio.Semaphore(concurrency)
+        running = set()
+        logging.info(f'{type(self).__name__}::mainAsync(): beginning subscription, concurrency=[{concurrency}]')
+        try:
+            async for actionChainParams, route in self.asyncSubscription():
+                await slots.acquire()
+                if self.stopping:
+                    slots.release()
+                    break
+                task = asyncio.ensure_future(self._runLogged(slots, actionChainParams, route, bridge, driver, tabs))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        finally:
+            self._stopping.set()
+            if running:
+                await asyncio.gather(*running)
+            await self._run(self.checkinWorkerDriver, driver)
+        self.cleanUp()
+
+    def stop(self):
+        """
+        stop taking messages, chains running finish the run they are on.
+        """
+        self._stopping.set()
+
+    def main(self):
+        # asyncio.run is from python 3.7
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.mainAsync())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -0,0 +1,405 @@
+"""
+benchmarks for the parsing and extraction paths, ran against saved pages.
+
+    python -m feed.benchmarks parsers listing1.html listing2.html --repeat 5
+    python -m feed.benchmarks parsers --recording recordings/donedeal
+    python -m feed.benchmarks links --cards 1000
+    python -m feed.benchmarks profiles --hub http://localhost:4444/wd/hub --profile default --profile lean
+    python -m feed.benchmarks records --cards 5000
+"""
+import argparse
+import gc
+import glob
+import logging
+import os
+import re
+import sys
+import threading
+import tracemalloc
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from time import perf_counter, sleep
+import selenium.webdriver as webdriver
+
+from feed.parsers import availableParsers, getParser, parse
+from feed.links import LinkExtractor
+from feed.replay import Recording
+from feed.profiles import BrowserProfile
+from feed.actiontypes import Action
+from feed.crawling import BrowserActions
+
+
+def _timed(func, repeat):
+    """
+    return the best of repeat timings of func and its last return value
+    """
+    best = None
+    ret = None
+    for _ in range(repeat):
+        start = perf_counter()
+        ret = func()
+        took = perf_counter() - start
+        best = took if best is None else min(best, took)
+    return best, ret
+
+
+def _loadPages(paths):
+    pages = {}
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as fh:
+            pages.update({path: fh.read()})
+    return pages
+
+
+def _soupSignature(soup):
+    """
+    the parts of a parsed page that search, click and publish depend on: the elements
+    found for each class string and the links of anchors.
+    """
+    classes = {}
+    for tag in soup.find_all(attrs={'class': True}):
+        cls = ' '.join(tag.attrs.get('class'))
+        classes.update({cls: classes.get(cls, 0) + 1})
+    links = [a.attrs.get('href') for a in soup.find_all('a', href=True)]
+    return classes, links
+
+
+def benchmarkParsers(pages: dict, backends=None, reference='html.parser', repeat=3):
+    """
+    time each parser backend over the pages and check it finds the same classes and links
+    as the reference backend.
+    :param: pages: mapping of name to html source
+    :return: list of dict(backend, seconds, mismatches) sorted fastest first
+    """
+    backends = backends if backends else availableParsers()
+    expected = {name: _soupSignature(getParser(reference).parse(source)) for name, source in pages.items()}
+    results = []
+    for backend in backends:
+        parser = getParser(backend)
+        total = 0
+        mismatches = []
+        for name, source in pages.items():
+            took, soup = _timed(lambda: parser.parse(source), repeat)
+            total += took
+            if _soupSignature(soup) != expected.get(name):
+                mismatches.append(name)
+        results.append(dict(backend=backend, seconds=total, mismatches=mismatches))
+    return sorted(results, key=lambda result: result.get('seconds'))
+
+
+def listingPage(cards=1000, urlStub='https://www.donedeal.ie/cars-for-sale'):
+    """
+    a listing page of cards, with the link to each card placed as the card's own href,
+    on an ancestor, on a descendant, or missing.
+    """
+    out = []
+    for i in range(cards):
+        body = f'<span class="title">car {i}</span><span class="price">{i * 100}</span>'
+        placement = i % 4
+        if placement == 0:
+            out.append(f'<a href="{urlStub}/{i}"><div class="card__body">{body}</div></a>')
+        elif placement == 1:
+            out.append(f'<div class="card"><div class="card__body"><a href="{urlStub}/{i}">{body}</a></div></div>')
+        elif placement == 2:
+            out.append(f'<a class="card__body" href="{urlStub}/{i}">{body}</a>')
+        else:
+            out.append(f'<div class="card__body">{body}<a href="/saved">save</a></div>')
+    return f'<html><body><div class="cards">{"".join(out)}</div></body></html>'
+
+
+def _legacyLinks(items, urlStub):
+    """
+    the per item search onPublishAction did before feed.links, kept for comparison.
+    """
+    pattern = re.compile(f'{urlStub}/*')
+    out = []
+    for item in items:
+        link = item.attrs.get('href')
+        if link and urlStub in link:
+            out.append(link)
+            continue
+        parent = item.findParent(attrs={'href': pattern})
+        if parent is not None:
+            out.append(parent.attrs.get('href'))
+            continue
+        child = item.findChild(attrs={'href': pattern})
+        if child is not None:
+            out.append(child.attrs.get('href'))
+            continue
+        link = ''
+        parentAtag = item.findParent('a', attrs={'href': pattern})
+        if parentAtag:
+            link = parentAtag.attrs.get('href')
+        if not parentAtag or urlStub not in link:
+            bckup = item.findChild('a', attrs={'href': pattern})
+            if bckup is not None:
+                link = bckup.attrs.get('href') if urlStub in bckup.attrs.get('href') else None
+        if link == '':
+            continue
+        out.append(link)
+    return out
+
+
+def benchmarkLinks(source, cls='card__body', urlStub='https://www.donedeal.ie/cars-for-sale', repeat=3):
+    """
+    time the per item link search against feed.links.LinkExtractor on a page.
+    :return: dict(legacy, extractor) of seconds, and whether the links were the same
+    """
+    soup = parse(source)
+    items = soup.findAll(attrs={'class': cls})
+    legacy, expected = _timed(lambda: _legacyLinks(items, urlStub), repeat)
+    extractor, found = _timed(lambda: LinkExtractor(urlStub).extract(soup, items), repeat)
+    return dict(items=len(items), links=len(found), legacy=legacy, extractor=extractor, same=expected == found)
+
+
+class _DictRecord:
+    """
+    a record as actions and returns were before they were slotted, its fields in a __dict__
+    and, for actions, a copy of the parameters it was built from.
+    """
+    def __init__(self, kwargs=None, **fields):
+        self.__dict__.update(fields)
+        if kwargs is not None:
+            self.kwargs = dict(kwargs)
+
+
+def _retained(build, count) -> float:
+    """
+    bytes per item allocated by build and still held by what it returns.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        gc.collect()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def benchmarkRecords(source, cls='card__body', url='https://www.donedeal.ie/cars-for-sale'):
+    """
+    the memory each action and return holds, against records with a __dict__, and the memory
+    of captured items held as bs4 Tags, which keep the parsed page alive, against detached markup.
+    :return: dict of bytes per item for each, before and after.
+    """
+    def capture(detached):
+        soup = parse(source)
+        action = Action.from_dict(dict(actionType='CaptureAction', css=f'.{cls}', captureName='cars'))
+        return [BrowserActions.Return(action=action, data=(item, item.find_parent('a').attrs if item.find_parent('a') is not None else {}),
+                                      current_url=url, name='benchmark', detached=detached) for item in soup.findAll(attrs={'class': cls})]
+
+    items = len(capture(True))
+    params = [dict(actionType='CaptureAction', css=f'.{cls}-{i}', xpath='', text='', isSingle=False, captureName='cars') for i in range(items)]
+    data = [f'<div class="{cls}">car {i}</div>' for i in range(items)]
+    action = Action.from_dict(params[0])
+
+    def legacyAction(position, params):
+        return _DictRecord(kwargs=params, position=position, actionHash=f'{position:032x}', isSingle=False, returnType='src', attribute=None, css=params.get('css'),
+                           xpath='', text='', parentAttributes={}, captureName='cars', data=None, backupKey=None)
+
+    return dict(items=items,
+                action=(_retained(lambda: [legacyAction(i, p) for i, p in enumerate(params)], items),
+                        _retained(lambda: [Action.from_dict(p, position=i) for i, p in enumerate(params)], items)),
+                ret=(_retained(lambda: [_DictRecord(name='benchmark', current_url=url, data=d, action=action, userID=None) for d in data], items),
+                     _retained(lambda: [BrowserActions.Return(action=action, data=d, current_url=url, name='benchmark') for d in data], items)),
+                data=(_retained(lambda: capture(False), items), _retained(lambda: capture(True), items)))
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    """
+    serves saved pages from a directory, or generated listing pages at /page/<n> when there
+    is none. Every other path is an asset, an image, font, stylesheet or script, which takes
+    latency seconds, as third party assets do.
+    """
+    latency = 0.1
+    cards = 50
+    root = None # directory of saved pages, the working directory if None
+
+    _assets = {'.png': 'image/png', '.woff2': 'font/woff2', '.css': 'text/css', '.js': 'application/javascript'}
+
+    def log_message(self, format, *args):
+        logging.debug(f'FixtureHandler: {format % args}')
+
+    def translate_path(self, path):
+        """
+        the file path under root, SimpleHTTPRequestHandler only takes a directory from python 3.7
+        """
+        translated = super().translate_path(path)
+        if FixtureHandler.root is None:
+            return translated
+        return os.path.join(FixtureHandler.root, os.path.relpath(translated, os.getcwd()))
+
+    def _send(self, body: bytes, contentType):
+        self.send_response(200)
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        if path.startswith('/page/'):
+            page = path.split('/')[-1]
+            body = listingPage(FixtureHandler.cards).replace('<html><body>', fixtureAssets(page), 1)
+            return self._send(body.encode('utf-8'), 'text/html')
+        extension = os.path.splitext(path)[1]
+        if extension in FixtureHandler._assets:
+            sleep(FixtureHandler.latency)
+            return self._send(b'/* fixture */', FixtureHandler._assets.get(extension))
+        return super().do_GET()
+
+
+def fixtureAssets(page, images=10):
+    """
+    the head and the start of the body of a generated fixture page, referencing assets which load slowly.
+    """
+    imgs = ''.join(f'<img src="/assets/{page}-{i}.png">' for i in range(images))
+    return (f'<html><head><link rel="stylesheet" href="/assets/style.css?{page}">'
+            f'<link rel="preload" as="font" href="/assets/font.woff2?{page}" crossorigin>'
+            f'<script async src="/assets/tracker.js?{page}"></script></head><body>{imgs}')
+
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+    """
+    serves each request on a thread of its own, as http.server.ThreadingHTTPServer does from python 3.7
+    """
+    daemon_threads = True
+
+
+def fixtureSite(directory=None, host='127.0.0.1', port=0, latency=0.1):
+    """
+    start serving fixture pages in a background thread.
+    :return: the server, its base url is http://<host>:<server.server_port>
+    """
+    FixtureHandler.latency = latency
+    FixtureHandler.root = directory
+    server = FixtureServer((host, port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def remoteDriver(hub, profile: BrowserProfile):
+    driver = webdriver.Remote(command_executor=hub, desired_capabilities=profile.capabilities(), options=profile.options())
+    profile.apply(driver)
+    return driver
+
+
+def benchmarkProfiles(driverFactory, urls, profiles):
+    """
+    load urls in a session of each browser profile.
+    :param: driverFactory: callable taking a BrowserProfile and returning a new session
+    :return: list of dict(profile, pages, seconds, pagesPerMinute) fastest first
+    """
+    results = []
+    for profile in profiles:
+        driver = driverFactory(profile)
+        try:
+            driver.get(urls[0]) # warm up
+            start = perf_counter()
+            for url in urls:
+                driver.get(url)
+            seconds = perf_counter() - start
+        finally:
+            driver.quit()
+        results.append(dict(profile=profile.name, pages=len(urls), seconds=seconds, pagesPerMinute=len(urls) / seconds * 60))
+    return sorted(results, key=lambda result: -result.get('pagesPerMinute'))
+
+
+def _runProfiles(args):
+    server = fixtureSite(directory=args.fixtures, host=args.host, port=args.port, latency=args.latency)
+    base = f'http://{args.host}:{server.server_port}'
+    if args.fixtures:
+        names = sorted(os.path.basename(path) for path in glob.glob(os.path.join(args.fixtures, '*.html')))
+        urls = [f'{base}/{names[i % len(names)]}' for i in range(args.pages)] if names else []
+    else:
+        urls = [f'{base}/page/{i}' for i in range(args.pages)]
+    if not urls:
+        raise SystemExit('feed.benchmarks profiles: no fixture pages')
+    profiles = [BrowserProfile.get(name) for name in (args.profile if args.profile else ['default'])]
+    try:
+        results = benchmarkProfiles(lambda profile: remoteDriver(args.hub, profile), urls, profiles)
+    finally:
+        server.shutdown()
+    print(f'{"profile":<16}{"pages":>8}{"seconds":>12}{"pages/min":>12}')
+    for result in results:
+        print(f'{result.get("profile"):<16}{result.get("pages"):>8}{result.get("seconds"):>12.2f}{result.get("pagesPerMinute"):>12.1f}')
+
+
+def _runRecords(args):
+    source = _loadPages([args.page]).get(args.page) if args.page else listingPage(args.cards)
+    result = benchmarkRecords(source, cls=args.cls)
+    print(f'items={result.get("items")}, bytes per item')
+    print(f'{"record":<24}{"before":>12}{"after":>12}{"saved":>12}')
+    for name, label in (('action', 'CaptureAction'), ('ret', 'Return'), ('data', 'captured Tag, detached')):
+        before, after = result.get(name)
+        print(f'{label:<24}{before:>12.0f}{after:>12.0f}{before - after:>12.0f}')
+
+
+def _runLinks(args):
+    source = _loadPages([args.page]).get(args.page) if args.page else listingPage(args.cards)
+    result = benchmarkLinks(source, cls=args.cls, urlStub=args.urlStub, repeat=args.repeat)
+    print(f'items={result.get("items")} links={result.get("links")} same_links={result.get("same")}')
+    print(f'{"per item search":<20}{result.get("legacy"):>12.4f}s')
+    print(f'{"LinkExtractor":<20}{result.get("extractor"):>12.4f}s')
+
+
+def _runParsers(args):
+    pages = _loadPages(args.pages)
+    if args.recording:
+        pages.update(Recording(args.recording).sources())
+    if not pages:
+        raise SystemExit('feed.benchmarks parsers: no pages given')
+    results = benchmarkParsers(pages, backends=args.backend, reference=args.reference, repeat=args.repeat)
+    print(f'{"backend":<16}{"seconds":>12}  mismatches (vs {args.reference})')
+    for result in results:
+        print(f'{result.get("backend"):<16}{result.get("seconds"):>12.4f}  {", ".join(result.get("mismatches")) or "none"}')
+
+
+def main(argv=None):
+    cli = argparse.ArgumentParser(prog='feed.benchmarks')
+    commands = cli.add_subparsers(dest='command')
+    commands.required = True
+
+    parsers = commands.add_parser('parsers', help='time html parser backends over saved pages')
+    parsers.add_argument('pages', nargs='*', help='saved html pages')
+    parsers.add_argument('--recording', help='directory of pages recorded with feed.replay.PageRecorder')
+    parsers.add_argument('--backend', action='append', help='backend to time, defaults to all installed')
+    parsers.add_argument('--reference', default='html.parser', help='backend whose results are taken as correct')
+    parsers.add_argument('--repeat', type=int, default=3)
+    parsers.set_defaults(run=_runParsers)
+
+    links = commands.add_parser('links', help='time publish link extraction')
+    links.add_argument('--page', help='saved html page, defaults to a generated listing page')
+    links.add_argument('--cards', type=int, default=1000, help='cards on the generated listing page')
+    links.add_argument('--cls', default='card__body', help='class of the cards')
+    links.add_argument('--urlStub', default='https://www.donedeal.ie/cars-for-sale')
+    links.add_argument('--repeat', type=int, default=3)
+    links.set_defaults(run=_runLinks)
+
+    profiles = commands.add_parser('profiles', help='pages per minute of browser profiles against fixture pages')
+    profiles.add_argument('--hub', default='http://localhost:4444/wd/hub', help='selenium hub to start sessions on')
+    profiles.add_argument('--profile', action='append', help='profile of feed.settings.browser_profiles, defaults to default')
+    profiles.add_argument('--fixtures', help='directory of saved pages, defaults to generated listing pages')
+    profiles.add_argument('--pages', type=int, default=20, help='pages to load with each profile')
+    profiles.add_argument('--latency', type=float, default=0.1, help='seconds each image, font, stylesheet and script takes')
+    profiles.add_argument('--host', default='127.0.0.1', help='address the browser reaches the fixture pages on')
+    profiles.add_argument('--port', type=int, default=0)
+    profiles.set_defaults(run=_runProfiles)
+
+    records = commands.add_parser('records', help='memory of each action and return, and of captured items, with tracemalloc')
+    records.add_argument('--page', help='saved html page, defaults to a generated listing page')
+    records.add_argument('--cards', type=int, default=5000, help='cards on the generated listing page')
+    records.add_argument('--cls', default='card__body', help='class of the cards')
+    records.set_defaults(run=_runRecords)
+
+    args = cli.parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+    main()
@@ -1,4 +1,3 @@
-from queue import Queue
 import logging
 import os
 import sys
@@ -11,16 +10,25 @@ from bs4 import BeautifulSoup
 from bs4 import Tag, NavigableString
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 from selenium.common.exceptions import WebDriverException, NoSuchElementException
 from urllib3.exceptions import MaxRetryError, ProtocolError
-import threading
-import subprocess
 import argparse
+import threading
 
-from feed.settings import browser_params
+from feed.settings import browser_params, selenium_params, worker_params, chain_pool_params, record_params
 from feed.service import Client
+from feed.pagecache import PageCache
+from feed.parsers import parse
+from feed.links import LinkExtractor
+from feed.navigation import NavigationWaiter
+from feed.locators import Locator, LocatorCache, StrategyStats, strategyBy
+from feed.drivers import DriverHealth, DriverPool, PooledDriver, SessionLimit
+from feed.profiles import BrowserProfile
+from feed.supervisor import SeleniumSupervisor
+from feed.tabs import SessionTabs
 
 from feed.actionchains import ActionChain
 from feed.actiontypes import ActionableItemNotFound, ClickAction, InputAction, CaptureAction, PublishAction, Action
@@ -41,25 +49,89 @@ class BrowserActions(ActionChain):
 
 
     class Return:
-        def __init__(self, action: Action, data, current_url, name, *args, **kwargs):
-            self.name = name
-            self.current_url = current_url
-            self.data = data
-            self.action = action
-            self.userID = kwargs.get('userID')
-
-        def __dict__(self):
-            return dict(name=self.name, userID=self.userID, current_url=self.current_url, data=self.data, action=self.action.__dict__())
+        """
+        an item an action returned. returns are slotted and immutable, with detached the data
+        is kept as markup rather than as bs4 Tags, which each keep the whole parsed page alive,
+        see Return.detach.
+        """
+        __slots__ = ('name', 'current_url', 'data', 'action', 'userID')
+
+        def __init__(self, action: Action, data, current_url, name, *args, detached=False, **kwargs):
+            fields = dict(name=name, current_url=current_url, data=BrowserActions.Return.detach(data) if detached else data, action=action, userID=kwargs.get('userID'))
+            for field, value in fields.items():
+                object.__setattr__(self, field, value)
+
+        def __setattr__(self, name, value):
+            raise AttributeError(f'{type(self).__name__} is immutable, can not set {name}')
+
+        @staticmethod
+        def detach(data):
+            """
+            the data with the Tags in it as their markup, as ActionReturnSerialiser would publish them.
+            """
+            if isinstance(data, (Tag, NavigableString)):
+                return str(data)
+            elif isinstance(data, (list, tuple)):
+                return type(data)(BrowserActions.Return.detach(item) for item in data)
+            elif isinstance(data, dict):
+                return {key: BrowserActions.Return.detach(value) for key, value in data.items()}
+            return data
+
+        def to_dict(self) -> dict:
+            return dict(name=self.name, userID=self.userID, current_url=self.current_url, data=self.data, action=self.action.to_dict() if self.action is not None else None)
+
+        @staticmethod
+        def from_dict(params: dict):
+            action = params.get('action')
+            return BrowserActions.Return(action=Action.from_dict(action) if action is not None else None, data=params.get('data'),
+                                         current_url=params.get('current_url'), name=params.get('name'), userID=params.get('userID'))
 
     driver = None # type: WebDriver
+    _routingSessions = {} # (userID, name): when the router session was initialised
+    _routingSessionsLock = threading.Lock()
 
     def __init__(self, driver: WebDriver, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.initialiseRoutingSession()
+        self.kwargs = kwargs
+        self.driver = driver
+        self.pages = PageCache() # parsed source of the current page, shared between actions
+        self.navigation = NavigationWaiter()
+        self.locators = LocatorCache() # how buttons were last found, for repeats
+        self.strategyStats = StrategyStats.shared() # which search strategy wins for each action
+        self.navigationTimeout = kwargs.get('navigationTimeout') # seconds to wait after clicks, overrides the domain and default timeout
+        self.detachReturns = kwargs.get('detachReturns', record_params['detach_returns']) # captured items are returned as markup, see Return.detach
+        self.soup = parse("<div>None</div>")
+        self.backupKeyIncrement = 0
+
+    def initialiseRoutingSession(self, pooled=False):
+        """
+        start the chain's session with the router. a chain reset from a ChainPool does not,
+        if this process started it within chain_pool_params routing_session_ttl seconds, by
+        default it always does.
+        """
+        key = (self.userID, self.name)
+        with BrowserActions._routingSessionsLock:
+            started = BrowserActions._routingSessions.get(key)
+            live = pooled and started is not None and time() - started < chain_pool_params['routing_session_ttl']
+            if not live:
+                BrowserActions._routingSessions[key] = time()
+        if live:
+            logging.debug(f'{type(self).__name__}::initialiseRoutingSession: router session for name=[{self.name}] is live')
+            return
         self.routerClient.get(f'/routingcontroller/initialiseRoutingSession/{self.name}')
+
+    def reset(self, driver: WebDriver = None, **kwargs):
+        """
+        see ActionChain.reset, the chain keeps its locators but not its page.
+        """
+        super().reset(**kwargs)
         self.kwargs = kwargs
         self.driver = driver
-        self.soup = BeautifulSoup("<div>None</div>")
+        self.pages.invalidate()
+        self.soup = parse("<div>None</div>")
         self.backupKeyIncrement = 0
+        self.initialiseRoutingSession(pooled=True)
 
     @staticmethod
     def _get_button_to_click(item, action):
@@ -86,7 +158,7 @@ class BrowserActions(ActionChain):
 
     def _update_soup(self):
         logging.info(f'Updating soup for {self}')
-        self.soup = BeautifulSoup(self.driver.page_source)
+        self.soup = self.pages.get(self.driver).soup
 
     @staticmethod
     def _searchNavigableStringForTag(navString: NavigableString, text):
@@ -94,7 +166,7 @@ class BrowserActions(ActionChain):
         private helper function to search navigavle string rescurively
         """
         if navString == text:
-            return BeautifulSoup(str(navString))
+            return parse(str(navString))
         newString = navString.findNextSibling()
         if newString is not None:
             BrowserActions._searchNavigableStringForTag(newString, text)
@@ -115,28 +187,30 @@ class BrowserActions(ActionChain):
         else:
             return True
 
-    def onClickAction(self, action: ClickAction):
+    def _findButton(self, action: ClickAction):
         """
         Much of this code is ultimatley using user input to find elements,
         then use those elements to find other elements
 
         Need a smarter way - this is where ML would be handy identifying next buttons from html source and
         where we want to go. Probaly easiest first step.
+
+        :return: the button and the feed.locators.Locator which found it
         """
-        logging.info(f'{type(self).__name__}::onClickAction: css=[{action.css}], xpath=[{action.xpath}], text=[{action.text}]')
+        located = {}
         try:
-            button: WebElement = action.getActionableItem(action, self.driver)
+            button: WebElement = action.getActionableItem(action, self.driver, pages=self.pages, strategyStats=self.strategyStats, located=located)
             html_class = button.get_attribute('class')
         except Exception:
             raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
-        # TODO an action chain should cache there last interaction in the case of a repeat so it does not havbe to do the searching again.
+        # the strategy which found the button, None if the search could not tell it from others
+        locator = Locator(strategyBy.get(located.get('kind')), located.get('selector'), located.get('text')) if located else None
         if not self._verify_class_string(html_class):
             logging.info(f'{type(self).__name__}::onClickAction: Checking {html_class} for {action.css}')
             html_class = list(filter(lambda item: item in action.css, html_class.split(' ')))[0]
             # we take the first class only, should probably do all but well probably spend all day need a more intelligent way obviously.
-        soup = BeautifulSoup(self.driver.page_source)
         logging.info(f'will search html with html_class=[{html_class}]')
-        items = soup.find_all(attrs={'class': html_class}) # find all or one, hoping the button is in there with that class name.
+        items = self.pages.get(self.driver).findByClass(html_class) # find all or one, hoping the button is in there with that class name.
         if len(items) < 1:
             logging.info(f'{type(self).__name__}::onClickAction: Couldnt find button with class=[{html_class}]')
             pass
@@ -155,59 +229,115 @@ class BrowserActions(ActionChain):
                             # this generally happens 9/10.
                             logging.info(f'{type(self).__name__}: found unique button to click with className=[{className}], should only have appeared here once')
                             button = elems[0]
+                            locator = Locator(By.CLASS_NAME, className, None)
                         else:
                             found = False
                             logging.info(f'Checking elems={list(map(lambda item: item.text, elems))}')
                             for item in elems:
                                 try:
                                     it = item.find_element_by_link_text(action.text)
+                                    itLocator = Locator(By.LINK_TEXT, action.text, action.text)
                                 except NoSuchElementException:
                                     if action.text.upper() in str(item).upper():
                                         it = item
+                                        # picked by part of its text, which a locator can not repeat
+                                        itLocator = None
                                     else:
                                         continue
                                 if it:
                                     logging.info(f'Found by text {it}, {action.text}')
                                     button = it
+                                    locator = itLocator
                                     found = True
                                     break
+        return button, locator
 
-        logging.info(f'{type(self).__name__}::onClickAction(): clicking on text={button.text}')
+    def onClickAction(self, action: ClickAction):
+        """
+        find the button to click, trying the locator which found it last time on this kind of
+        page before searching, then click it and wait for the page to settle.
+        """
+        logging.info(f'{type(self).__name__}::onClickAction: css=[{action.css}], xpath=[{action.xpath}], text=[{action.text}]')
         clickingFrom = self.driver.current_url
-        clickTime = time()
+        button = self.locators.find(self.driver, action.getActionHash(), clickingFrom)
+        if button is None:
+            button, locator = self._findButton(action)
+            self.locators.put(action.getActionHash(), clickingFrom, locator)
+        else:
+            logging.info(f'{type(self).__name__}::onClickAction: using cached locator, locator_stats=[{self.locators.stats()}]')
         buttonTxt = button.text
+        logging.info(f'{type(self).__name__}::onClickAction(): clicking on text={buttonTxt}')
+        armed = self.navigation.arm(self.driver)
         button.click()
-        # probe current url to see if we went anywhere, we dont necessarily have to. might aswell put needed timeout to good use.
-        while ( self.driver.current_url == clickingFrom ) and (time() - clickTime <= 5): # TODO this could be user defined?
-            sleep(0.5)
-            if self.driver.current_url == clickingFrom:
-                logging.debug(f'{type(self).__name__}::onClickAction(): current url has not changed from clicking on "{buttonTxt}"')
-            else:
-                logging.debug(f'{type(self).__name__}::onClickAction(): current url has changed from "{clickingFrom}" to "{self.driver.current_url}"')
-            logging.info(f'{type(self).__name__}::onClickAction(): current url has changed from "{clickingFrom}" to "{self.driver.current_url}"')
+        self.pages.invalidate()
+        # wait for the page to settle, whether or not we went anywhere.
+        navigation = self.navigation.wait(self.driver, armed, timeout=self.navigation.timeoutFor(armed[0], self.navigationTimeout))
+        if navigation.navigated:
+            logging.info(f'{type(self).__name__}::onClickAction(): current url has changed from "{navigation.fromUrl}" to "{navigation.url}" in {navigation.seconds:.3f}s')
+        else:
+            logging.debug(f'{type(self).__name__}::onClickAction(): current url has not changed from clicking on "{buttonTxt}"')
         self._update_soup()
         return [BrowserActions.Return(current_url=self.driver.current_url, userID=self.userID, name=self.name, action=action, data=None)]
 
+    def onActionOutcome(self, action, error=None):
+        """
+        the outcome of the driver calls the action made tells whether the session is healthy,
+        see feed.drivers.DriverHealth
+        """
+        health = DriverHealth.of(self.driver)
+        if error is None:
+            health.succeeded()
+        else:
+            health.failed(error)
+
+    def _search(self, action: Action, stream=False):
+        """
+        search the current page for the action's items, see Action.getActionableItem.
+        :return: (searched, data), searched is what the page was searched through, the driver.
+        """
+        return self.driver, action.getActionableItem(action, self.driver, pages=self.pages, stream=stream, strategyStats=self.strategyStats)
+
+    def _currentUrl(self):
+        return self.driver.current_url
+
     def onCaptureAction(self, action: CaptureAction):
-        action.backupKey = f'{self.driver.current_url}'
-        data = action.getActionableItem(action, self.driver)
+        if self.streaming and not action.isSingle:
+            return self._streamCapture(action)
+        searched, data = self._search(action)
+        current_url = searched.current_url
+        action = action.replace(backupKey=f'{current_url}')
         if data is None:
             raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
-        self.rePublish(key=self.driver.current_url, action=action, data=data)
+        self.rePublish(key=current_url, action=action, data=data)
         if not action.isSingle:
-            return [BrowserActions.Return(current_url=self.driver.current_url, userID=self.userID, name=self.name, action=action, data=item) for item in data]
+            return [BrowserActions.Return(current_url=current_url, userID=self.userID, name=self.name, action=action, data=item, detached=self.detachReturns) for item in data]
         else:
             logging.debug(f'returning data={data}, action={action}')
-            return [BrowserActions.Return(current_url=self.driver.current_url, userID=self.userID, name=self.name, action=action,data=data)]
+            return [BrowserActions.Return(current_url=current_url, userID=self.userID, name=self.name, action=action, data=data, detached=self.detachReturns)]
 
-    def onPublishAction(self, action: PublishAction):
+    def _streamCapture(self, action: CaptureAction):
         """
-        search for and publish the links of an item or card.
-        TODO need to put chain to publish to on action - logic in rePublish
+        streaming onCaptureAction, each item is republished and returned as it is taken from the page.
+        """
+        searched, data = self._search(action, stream=True)
+        current_url = searched.current_url
+        action = action.replace(backupKey=f'{current_url}')
+        if data is None:
+            raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
+        found = 0
+        for item in data:
+            found += 1
+            self.rePublish(key=current_url, action=action, data=[item])
+            yield BrowserActions.Return(current_url=current_url, userID=self.userID, name=self.name, action=action, data=item, detached=self.detachReturns)
+        if found == 0:
+            raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
+
+    def _publishItems(self, action: PublishAction):
+        """
+        the snapshot of the page and the nodes on it to find links for.
         """
-        logging.info(f'{type(self).__name__}::onPublishAction: css=[{action.css}], xpath=[{action.xpath}], text=[{action.text}]')
         try:
-            data = action.getActionableItem(action, self.driver)
+            searched, data = self._search(action)
         except Exception:
             raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
         logging.info(f'{type(self).__name__}::onPublishAction: have found data=[{len(data)}]')
@@ -215,62 +345,48 @@ class BrowserActions(ActionChain):
         # Then we could have publish action ensure `items` is always a list.
         # at the moment, user specifying non single publish action breaks things. (simple fix just havent used yet)
         cls = data[0].get_attribute('class')
-        soup = BeautifulSoup(self.driver.page_source)
-        items = soup.findAll(attrs={'class': cls})
-        out=[]
-        for item in items:
-            # try find a link on the top most surface of html
-            link = item.attrs.get('href')
-            if link and action.urlStub in link:
-                # if it is in this add and continue
-                out.append(link)
-                continue
-            logging.info(f'{type(self).__name__}::onPublishAction: Link was not immediately available, will try parent')
-            # if failure, then try find a parent with regex
-            parent = item.findParent(attrs={'href': re.compile(f'{action.urlStub}/*')})
-            if parent is None:
-                # if nothing found, then try find in children with regex
-                child = item.findChild(attrs={'href': re.compile(f'{action.urlStub}/*')})
-                logging.info(f'{type(self).__name__}::onPublishAction: Link was not immediately available, will try child')
-            else:
-                # if parent was found then add the link of it and continue
-                logging.info(f'{type(self).__name__}::onPublishAction: Found parent link in parent tag.')
-                out.append(parent.attrs.get('href'))
-                continue
-            if child is None: # were here because regex on parent was unsuccesful as well as the child
-                # if link wasn't found in the child then try find 'a' tag of parent
-                logging.info(f'{type(self).__name__}::onPublishAction: Link was not found with child, searching parent for a tag')
-                parentAtag = item.findParent('a', attrs={'href': re.compile(f'{action.urlStub}/*')})
-                link = ''
-                if parentAtag:
-                    # if found then take the link
-                    logging.info(f'{type(self).__name__}::onPublishAction: Found parent "a" tag.')
-                    link = parentAtag.attrs.get('href')
-                if not parentAtag or action.urlStub not in link:
-                    # if no suitable parent found with a tag or it was wrong, then try the same with the child
-                    bckup = item.findChild('a', attrs={'href': re.compile(f'{action.urlStub}/*')})
-                    logginginfo(f'{type(self).__name__}::onPublishAction: Checking backups for link.')
-                    if bckup is not None:
-                        link = bckup.attrs.get('href') if action.urlStub in bckup.attrs.get('href') else None
-                # if all un succesful then dont add anything
-                if link == '':
-                    logging.warning(f'{type(self).__name__}::onPublishAction: could not find link to page item for chain=[{self.name}], action=[{action}]')
-                    continue
-                logging.info(f'{type(self).__name__}::onPublishAction: Found link=[{link}]. ')
-                out.append(link)
-            else:
-                out.append(child.attrs.get('href'))
+        page = self.pages.get(searched)
+        return page, page.findByClass(cls)
+
+    def onPublishAction(self, action: PublishAction):
+        """
+        search for and publish the links of an item or card.
+        TODO need to put chain to publish to on action - logic in rePublish
+        """
+        logging.info(f'{type(self).__name__}::onPublishAction: css=[{action.css}], xpath=[{action.xpath}], text=[{action.text}]')
+        if self.streaming and not action.isSingle:
+            return self._streamPublish(action)
+        page, items = self._publishItems(action)
+        current_url = page.url
+        # one pass over the page finds the href, parent or child link of every item
+        out = LinkExtractor(action.urlStub, action.urlStubPattern).extract(page.soup, items)
+        if len(out) < len(items):
+            logging.warning(f'{type(self).__name__}::onPublishAction: could not find link to page item for {len(items) - len(out)} items, chain=[{self.name}], action=[{action}]')
         if len(out) == 0:
             raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
         # TODO should put rePublishing into a callback.
-        self.rePublish(key=self.driver.current_url, action=action, data=out)
+        self.rePublish(key=current_url, action=action, data=out)
         if not action.isSingle:
-            return [BrowserActions.Return(current_url=self.driver.current_url, userID=self.userID, name=self.name, action=action,data=url) for url in out]
+            return [BrowserActions.Return(current_url=current_url, userID=self.userID, name=self.name, action=action,data=url) for url in out]
         else:
-            return [BrowserActions.Return(current_url=self.driver.current_url, name=self.name, userID=self.userID, action=action,data=out[0])]
+            return [BrowserActions.Return(current_url=current_url, name=self.name, userID=self.userID, action=action,data=out[0])]
+
+    def _streamPublish(self, action: PublishAction):
+        """
+        streaming onPublishAction, each link is republished and returned as soon as it is found.
+        """
+        page, items = self._publishItems(action)
+        current_url = page.url
+        found = 0
+        for url in LinkExtractor(action.urlStub, action.urlStubPattern).iterLinks(page.soup, items):
+            found += 1
+            self.rePublish(key=current_url, action=action, data=[url])
+            yield BrowserActions.Return(current_url=current_url, userID=self.userID, name=self.name, action=action, data=url)
+        if found == 0:
+            raise ActionableItemNotFound(position=action.position, actionHash=action.getActionHash(), chainName=self.name)
 
     def onInputAction(self, action: InputAction):
-        inputField: WebElement = action.getActionableItem(action, self.driver)
+        inputField: WebElement = action.getActionableItem(action, self.driver, pages=self.pages, strategyStats=self.strategyStats)
         try:
             inputField.send_keys(action.inputString)
         except AttributeError as ex:
@@ -282,30 +398,48 @@ class BrowserActions(ActionChain):
 
     def saveHistory(self):
         try:
-            logging.info(f'BrowserActions::saveHistory: Saving current_url=[{self.driver.current_url}]')
-            self.routerClient.get(f'/routingcontroller/updateHistory/{self.name}', payload=self.driver.current_url)
+            current_url = self._currentUrl()
+            logging.info(f'BrowserActions::saveHistory: Saving current_url=[{current_url}]')
+            self.routerClient.get(f'/routingcontroller/updateHistory/{self.name}', payload=current_url)
         except Exception as e:
             # this type of exception really should be in `Client` itself... maybe?
             logging.warning(f'BrowserActions::saveHistory: router is unavailable.')
 
-    def initialise(self, caller):
+    def _startingUrl(self):
+        """
+        the last page the chain visited, from the router, or its startUrl.
+        """
         hist = self.recoverHistory()
         logging.info(f'BrowserActions::initialise: recovered history for {self.name}, url=[{hist}]')
         url = hist.get('url')
         if not verifyUrl(url):
             logging.info(f'BrowserActions::initialise: last page url was none from router, response=[{hist}]')
             url= self.startUrl
+        return url
+
+    def _open(self, caller, url):
+        """
+        load url in the browser, renewing the caller's driver session if it has gone. A chain
+        on a worker's session, or a tab, is not the caller's to renew, the error is raised for
+        the worker to replace the session, see feed.workers.ChainScheduler.
+        """
         logging.debug(f'going to: {url}')
         try:
             self.driver.get(url)
-        except WebDriverException:
+        except (WebDriverException, MaxRetryError, ProtocolError, RemoteDisconnected) as ex:
+            DriverHealth.of(self.driver).failed(ex)
+            if self.driver is not getattr(caller, 'driver', None):
+                raise
             logging.warning(f'Webdriver exception on initialisation, will reinitiate web browser')
             caller.renewDriverSession()
             self.driver = caller.driver
             self.driver.get(url)
+        self.pages.invalidate()
         self._update_soup()
 
-        ret = BrowserActions.Return(action=None, data=None, userID=self.userID, current_url=self.driver.current_url, name=self.name)
+    def initialise(self, caller):
+        self._open(caller, self._startingUrl())
+        ret = BrowserActions.Return(action=None, data=None, userID=self.userID, current_url=self._currentUrl(), name=self.name)
         caller.initialiseCallback(ret, chain=self)
 
 
@@ -314,105 +448,220 @@ class BrowserService:
     retry_attempts = 10
 
     browser_action_cli_args = argparse.ArgumentParser()
-    browser_process_command_queue = Queue()
 
     def __init__(self, attempts=0, *args, **kwargs):
         """
         Request a port of the nanny service and then start a webdriver session
         :param attempts: will recursively try to get a container, do not populate
         """
-        if os.getenv('START_BROWSER', False):
-            # this is only used in containerised running - which is intended for. Local dev this doesn't run
-            # as you will have selenium running.
-            self.browser_monitor_thread = threading.Thread(target=BrowserService.beginBrowserThread, args=(self,))
-            self.browser_monitor_thread.daemon = True
-            self.browser_monitor_thread.start()
-            sleep(10)
-            logging.info(f'{type(self).__name__}::__init__(): Succesfully started browser process')
         self.driver_url = ''
         self.port = browser_params['port']
         url = f'http://{browser_params["host"]}:{self.port}/wd/hub'
         logging.info(f'browser host is set, using {url}')
         self.driver_url = url
+        self.supervisor = None # type: SeleniumSupervisor
+        if os.getenv('START_BROWSER', False):
+            # this is only used in containerised running - which is intended for. Local dev this doesn't run
+            # as you will have selenium running.
+            self.supervisor = SeleniumSupervisor(statusUrl=f'{url}/status').start()
+            if self.supervisor.waitUntilReady(selenium_params['start_timeout']):
+                logging.info(f'{type(self).__name__}::__init__(): Succesfully started browser process')
+            else:
+                logging.warning(f'{type(self).__name__}::__init__(): browser process is not ready after {selenium_params["start_timeout"]}s, trying anyway')
+        # sessions against the hub by browser profile, self.driver is the runner's own session
+        # checked out of the pool of its profile, self.pool. The pools share one limit, of
+        # BROWSER_SESSIONS and BROWSER_STANDBY sessions, whichever profiles chains ask for.
+        self.pools = {}
+        self.sessionLimit = SessionLimit(browser_params['sessions'] + browser_params['standby'])
+        self.profile = BrowserProfile.get()
+        self.pool = self.poolFor(self.profile)
+        self.pooledDriver = None # type: PooledDriver
+        self._tabs = None # type: SessionTabs
+        self._workerSessions = {} # driver: PooledDriver checked out by workers
+        self._workerLock = threading.Lock()
         logging.info(f'Starting remote webdriver with {self.driver_url}')
         self.startWebdriverSession()
         logging.info(f'success')
 
-    def driverHealthCheck(self):
+    def driverHealthCheck(self, probe=False):
         """
-        request the current url from the driver and handle a no active session exception
+        whether the runner's session is healthy, from the outcome of the last calls made on it.
+        the current url is only requested if the session has been idle, or probe is set.
+        see feed.drivers.DriverHealth
         """
+        return DriverHealth.of(self.driver).check(self.driver, probe=probe)
+
+    def recoverDriver(self):
+        """
+        recover the runner's session according to how it failed
+            expired: replace the session
+            dead: drop every session of the pool, as they ran in the same process, and start a new one once selenium is back
+            crashed: navigate away from the crashed page, replacing the session if that fails
+        """
+        if self.pooledDriver is None:
+            # the session was checked in for workers, see checkoutWorkerDriver
+            self.startWebdriverSession()
+            return
+        state = DriverHealth.of(self.driver).state
+        logging.info(f'{type(self).__name__}::recoverDriver(): recovering session, state=[{state}], pool_stats=[{self.pool.stats()}]')
+        if state == DriverHealth.CRASHED:
+            self._recoverCrashedPage()
+        elif state == DriverHealth.DEAD:
+            self._recoverDeadProcess()
+        else:
+            self.renewWebCrawler()
+
+    def _recoverCrashedPage(self):
+        health = DriverHealth.of(self.driver)
         try:
-            self.driver.current_url
-        # TODO here we should be able to detect if
-        # 1. Session has expired, invalid session id or similiar
-        # 2. process has stopped , we will get a urllib exception
-        # 3. there has been a page crash ' WebDriverException
+            self.driver.get('about:blank')
         except Exception as ex:
-            logging.warning(f'{type(self).__name__}::driverHealthCheck(): Remote Webdriver session is unhealthy: error=[{type(ex).__name__}], args=[{ex.args}]')
-            return False
-        return True
+            logging.warning(f'{type(self).__name__}::_recoverCrashedPage(): could not leave crashed page, error=[{type(ex).__name__}], renewing session')
+            health.failed(ex)
+            self.renewWebCrawler()
+            return
+        health.succeeded()
+
+    def _recoverDeadProcess(self):
+        if self.pooledDriver is not None:
+            self.pool.checkin(self.pooledDriver, healthy=False)
+            self.pooledDriver = None
+        for pool in self.pools.values():
+            pool.reset()
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                self.startWebdriverSession()
+                return
+            except (WebDriverException, MaxRetryError, ProtocolError, RemoteDisconnected, ConnectionError) as ex:
+                if attempt == self.retry_attempts:
+                    raise
+                logging.warning(f'{type(self).__name__}::_recoverDeadProcess(): selenium is unavailable, attempt=[{attempt}], error=[{type(ex).__name__}], retrying in {self.retry_wait}s')
+                if self.supervisor is None:
+                    sleep(self.retry_wait)
+                elif self.supervisor.ready:
+                    # the process is up but not answering, eg. hung
+                    self.supervisor.restart()
+                    self.supervisor.waitUntilReady(self.retry_wait)
+                else:
+                    # it is being restarted
+                    self.supervisor.waitUntilReady(self.retry_wait)
+
+    def _newDriver(self, profile: BrowserProfile) -> WebDriver:
+        logging.info(f'starting webdriver session with {self.driver_url}, profile=[{profile}]')
+        driver = webdriver.Remote(command_executor=self.driver_url,
+                                  desired_capabilities=profile.capabilities(),
+                                  options=profile.options())
+        profile.apply(driver)
+        logging.info("started webdriver session")
+        return driver
+
+    def poolFor(self, profile: BrowserProfile) -> DriverPool:
+        """
+        the pool of sessions of a browser profile, page load strategy is fixed when a session starts.
+        """
+        if profile.name not in self.pools:
+            self.pools[profile.name] = DriverPool(lambda: self._newDriver(profile),
+                                                  size=browser_params['sessions'],
+                                                  maxUses=browser_params['session_max_uses'],
+                                                  maxAge=browser_params['session_max_age'],
+                                                  standby=browser_params['standby'],
+                                                  limit=self.sessionLimit)
+        return self.pools.get(profile.name)
+
+    def useProfile(self, name=None):
+        """
+        move the runner's own session to the browser profile a chain asks for, see feed.settings.browser_profiles
+        """
+        profile = BrowserProfile.get(name)
+        if profile.name == self.profile.name:
+            return
+        if self.pooledDriver is None:
+            # the pool's sessions are checked out by workers, they keep the runner's profile
+            logging.warning(f'{type(self).__name__}::useProfile(): session is lent to workers, staying on profile=[{self.profile.name}]')
+            return
+        logging.info(f'{type(self).__name__}::useProfile(): switching browser profile from=[{self.profile.name}] to=[{profile.name}]')
+        # the session can not be moved to the other profile, quit it rather than hold it idle
+        self.pool.checkin(self.pooledDriver, retire=True)
+        self.profile = profile
+        self.pool = self.poolFor(profile)
+        self.startWebdriverSession()
 
     def startWebdriverSession(self):
-        options = Options()
-        options.add_argument("--headless")
-        logging.info(f'starting webdriver session with {self.driver_url}')
-        self.driver = webdriver.Remote(command_executor=self.driver_url,
-                                       desired_capabilities=DesiredCapabilities.CHROME,
-                                       options=options)
-        logging.info("started webdriver session")
+        self.pooledDriver = self.pool.checkout(timeout=browser_params['checkout_timeout'])
+        self.driver = self.pooledDriver.driver
 
     def renewWebCrawler(self):
-        logging.info(f'renewing webcrawler')
-        self.driver.quit()
+        """
+        replace the runner's session, with the standby session if it has started.
+        """
+        logging.info(f'renewing webcrawler, pool_stats=[{self.pool.stats()}]')
+        if self.pooledDriver is not None:
+            self.pool.checkin(self.pooledDriver, healthy=False)
         self.startWebdriverSession()
 
-    def renewDriverSession(self):
-        self.renewWebCrawler()
+    def driverSession(self, timeout=None, profile=None):
+        """
+        check another session out of the pool for the block, to run a chain alongside the runner's own.
 
-    ###########################
-    # following methods are for 
-    # managing the selenium-st-
-    # andalone-chrom process.
+            with browserService.driverSession(profile=params.get('browserProfile')) as driver:
+                BrowserActions(driver=driver, **params).execute(caller)
+        """
+        pool = self.poolFor(BrowserProfile.get(profile)) if profile else self.pool
+        return pool.session(timeout=timeout if timeout is not None else browser_params['checkout_timeout'])
 
-    def _bind_queue_and_log(queue: Queue, log):
+    def driverTabs(self) -> SessionTabs:
         """
-        iterate over next queue item or None and an io stream.
-        ran in seperate thread, given were generally waiting on remote webbrowser requests,
-        fine to probe the std out and std err of the process we started
+        the tabs of the runner's session, to run chains alongside each other in it.
+
+            browserService.driverTabs().runChains(caller, BrowserActions, [params, ...])
         """
-        # zip together the next item on the queue or None and the next log line
-        for i in log:
-            queueItem = next_item = None if queue.empty() else queue.get(block=False)
-            sleep(0.01)
-            yield i, queueItem
+        if self._tabs is None or self._tabs.driver is not self.driver:
+            self._tabs = SessionTabs(self.driver, profile=self.profile)
+        return self._tabs
 
-    def beginBrowserThread(self):
+    def renewDriverSession(self):
+        self.recoverDriver()
+
+    def checkoutWorkerDriver(self):
         """
-        open a process, forward its logs and watch for commands in a queue.
+        a session of the pool for a worker of feed.workers.ChainWorkers. The runner's own
+        session goes back to the pool for the workers.
         """
-        sellogger = logging.getLogger('crawling.SeleniumProcessLogger')
-        sellogger.info(f'BrowserService::beginBrowserThread(): Starting web browser thread')
-        # run the selenium standalone script
-        with subprocess.Popen(os.getenv('SELENIUM_PROCESS_SCRIPT',  "/opt/bin/start-selenium-standalone.sh"), stdout=subprocess.PIPE, bufsize=1, universal_newlines=True) as process:
-            for line, command in BrowserService._bind_queue_and_log(self.browser_process_command_queue, process.stdout):
-                sellogger.info(f'BrowserService:: {line}')
-                if command is None:
-                    sellogger.debug(f'nothing in queue')
-                    continue
-                elif command == 'KILL':
-                    sellogger.debug(f'have queue item')
-                    sellogger.info(f'BrowserService::beginBrowserThread(): Killing process {process.id}')
-                    process.kill()
-                    sellogger.debug(f'monitor thread is {"alive" if self.browser_monitor_thread.is_alive() else "complete"}')
-        sellogger.info(f'Browser process {process.pid} has been torn down.')
+        with self._workerLock:
+            if self.pooledDriver is not None:
+                self.pool.checkin(self.pooledDriver)
+                self.pooledDriver = None
+                self.driver = None
+        session = self.pool.checkout(timeout=browser_params['checkout_timeout'])
+        with self._workerLock:
+            self._workerSessions[session.driver] = session
+        return session.driver
+
+    def checkinWorkerDriver(self, driver, healthy=True):
+        with self._workerLock:
+            session = self._workerSessions.pop(driver, None)
+        if session is not None:
+            self.pool.checkin(session, healthy=healthy)
+
+    def workerDriverHealthy(self, driver) -> bool:
+        return DriverHealth.of(driver).check(driver)
+
+    def workerTabs(self, driver):
+        return SessionTabs(driver, profile=self.profile) if worker_params['tabs'] else None
 
     def _browser_clean_up(self):
         """
-        place a clean up command to the thread monitoring the selenium process to kill selenium gracefully and for sure.
+        close the driver pools and stop the selenium process, if we started it.
         """
-        logging.info(f'{type(self).__name__}::_browser_clean_up: sending kill command to browser monitor thread')
-        self.browser_process_command_queue.put(item='KILL')
+        logging.info(f'{type(self).__name__}::_browser_clean_up: closing driver pool, pool_stats=[{self.pool.stats()}]')
+        if self.pooledDriver is not None:
+            self.pool.checkin(self.pooledDriver, healthy=False)
+            self.pooledDriver = None
+        for pool in self.pools.values():
+            pool.close()
+        if self.supervisor is not None:
+            logging.info(f'{type(self).__name__}::_browser_clean_up: stopping browser process')
+            self.supervisor.stop(timeout=10)
 
 
 
@@ -0,0 +1,459 @@
+import logging
+import re
+import socket
+import threading
+import weakref
+from contextlib import contextmanager
+from http.client import RemoteDisconnected
+from time import time
+from selenium.common.exceptions import InvalidSessionIdException, WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from urllib3.exceptions import MaxRetryError, ProtocolError
+
+from feed.settings import browser_params
+from feed.tabs import TabDriver
+
+
+class DriverHealth:
+    """
+    Tracks whether a webdriver session is healthy from the outcome of the calls made on it,
+    so it only has to be probed with a round trip when it has not been used for a while.
+
+    failures are classified as
+        expired: the session has gone from the hub, or its browser has, a new session is needed
+        dead: the selenium process can not be reached, it has to be restarted
+        crashed: the page has crashed, the session may survive navigating away
+    see BrowserService.recoverDriver for the recovery of each.
+
+    :param: idle: seconds after the last outcome before check probes the session
+    """
+    HEALTHY = 'healthy'
+    EXPIRED = 'expired'
+    DEAD = 'dead'
+    CRASHED = 'crashed'
+
+    _expiredMessages = re.compile(r'invalid session id|no such session|session deleted|session not created|chrome not reachable|disconnected: ', re.IGNORECASE)
+    _crashedMessages = re.compile(r'tab crashed|page crash|target crashed', re.IGNORECASE)
+    _deadErrors = (MaxRetryError, ProtocolError, RemoteDisconnected, ConnectionError, socket.timeout)
+
+    _trackers = weakref.WeakKeyDictionary()
+    _trackersLock = threading.Lock()
+
+    def __init__(self, idle=None):
+        self.idle = idle if idle is not None else browser_params['health_idle']
+        self.state = DriverHealth.HEALTHY
+        self.lastOutcome = time()
+        self.lastError = None
+        self.probes = 0
+
+    @staticmethod
+    def of(driver):
+        """
+        the tracker of a driver, created on first use. tabs share the tracker of their session.
+        """
+        if isinstance(driver, TabDriver):
+            driver = driver.tabs.driver
+        with DriverHealth._trackersLock:
+            health = DriverHealth._trackers.get(driver)
+            if health is None:
+                health = DriverHealth()
+                DriverHealth._trackers[driver] = health
+            return health
+
+    @staticmethod
+    def classify(ex: BaseException):
+        """
+        the failure ex shows, following its cause and context, or None if it says nothing
+        about the session, eg. an element which was not found.
+        """
+        seen = set()
+        while ex is not None and id(ex) not in seen:
+            seen.add(id(ex))
+            if isinstance(ex, DriverHealth._deadErrors):
+                return DriverHealth.DEAD
+            if isinstance(ex, InvalidSessionIdException):
+                return DriverHealth.EXPIRED
+            if isinstance(ex, WebDriverException):
+                message = ex.msg or ''
+                if DriverHealth._crashedMessages.search(message):
+                    return DriverHealth.CRASHED
+                if DriverHealth._expiredMessages.search(message):
+                    return DriverHealth.EXPIRED
+            ex = ex.__cause__ if ex.__cause__ is not None else ex.__context__
+        return None
+
+    def succeeded(self):
+        self.state = DriverHealth.HEALTHY
+        self.lastOutcome = time()
+
+    def failed(self, ex: BaseException) -> str:
+        """
+        record a failed call, a failure which says nothing about the session counts as a success.
+        :return: the state of the session
+        """
+        state = DriverHealth.classify(ex)
+        if state is None:
+            self.succeeded()
+        else:
+            logging.warning(f'DriverHealth::failed: session is {state}, error=[{type(ex).__name__}]')
+            self.state = state
+            self.lastOutcome = time()
+            self.lastError = ex
+        return self.state
+
+    @property
+    def healthy(self) -> bool:
+        return self.state == DriverHealth.HEALTHY
+
+    def check(self, driver, probe=False) -> bool:
+        """
+        whether the session is healthy, making a round trip only if it has been idle for
+        longer than idle seconds or probe is set.
+        """
+        if not self.healthy:
+            return False
+        if not probe and time() - self.lastOutcome < self.idle:
+            return True
+        self.probes += 1
+        try:
+            driver.current_url
+        except Exception as ex:
+            logging.warning(f'DriverHealth::check: Remote Webdriver session is unhealthy: error=[{type(ex).__name__}], args=[{ex.args}]')
+            # a probe failing is a failure whatever it was
+            self.failed(ex)
+            if self.healthy:
+                self.state = DriverHealth.EXPIRED
+            return False
+        self.succeeded()
+        return True
+
+
+class DriverPoolTimeout(Exception):
+    pass
+
+
+class PooledDriver:
+    """
+    a webdriver session of a DriverPool.
+    :param: driver: the session
+    """
+    _ids = 0
+
+    def __init__(self, driver: WebDriver):
+        PooledDriver._ids += 1
+        self.id = PooledDriver._ids
+        self.driver = driver
+        self.created = time()
+        self.lastUsed = self.created
+        self.uses = 0
+        self.health = DriverHealth.of(driver)
+
+    @property
+    def age(self):
+        return time() - self.created
+
+    def __repr__(self):
+        return f'PooledDriver(id={self.id}, uses={self.uses}, age={self.age:.0f}s)'
+
+
+class SessionLimit:
+    """
+    a bound on the sessions of several DriverPools, eg. the pool of each browser profile, so
+    together they never hold more than size sessions. The pools share the limit's condition,
+    and when the limit is reached a pool which needs a session retires one another pool
+    has idle or on standby.
+
+    sessions are counted from when they start being created until they have quit.
+
+    :param: size: maximum number of sessions across the pools
+    """
+    def __init__(self, size):
+        self.size = size
+        self.condition = threading.Condition()
+        self.pools = []
+
+    def add(self, pool):
+        with self.condition:
+            self.pools.append(pool)
+
+    def sessions(self) -> int:
+        """
+        sessions alive across the pools, call holding condition.
+        """
+        return sum(pool._alive() for pool in self.pools)
+
+    def free(self) -> int:
+        """
+        sessions which can be started, call holding condition.
+        """
+        return self.size - self.sessions()
+
+    def reclaim(self, pool):
+        """
+        take an idle session, or else a standby session, of another pool to quit, call holding condition.
+        :return: (owner, session) or None, the session is counted by its owner until it has quit
+        """
+        others = [other for other in self.pools if other is not pool]
+        for other in others:
+            if other._idle:
+                other._created -= 1
+                other._quitting += 1
+                return other, other._idle.pop(0)
+        for other in others:
+            if other._spares:
+                other._quitting += 1
+                return other, other._spares.pop(0)
+        return None
+
+
+class DriverPool:
+    """
+    A bounded pool of remote webdriver sessions against one selenium hub. Sessions are
+    created as they are needed up to size, checked for health when checked out, and
+    retired after maxUses checkouts or maxAge seconds so a long lived browser does not
+    build up memory.
+
+    standby sessions are started in the background ahead of being needed, so replacing a
+    retired or unhealthy session does not wait on the browser starting. Retired sessions
+    are quit in the background too.
+
+        with pool.session() as driver:
+            chain = BrowserActions(driver=driver, **params)
+
+    :param: factory: callable returning a new WebDriver session
+    :param: size: maximum number of sessions
+    :param: maxUses: checkouts before a session is retired, 0 for no limit
+    :param: maxAge: seconds before a session is retired, 0 for no limit
+    :param: standby: sessions to keep started, over and above size
+    :param: standbyRetry: seconds before starting a standby session again after one failed to start
+    :param: limit: SessionLimit shared with other pools, sessions of this pool count towards it
+    """
+    def __init__(self, factory, size=1, maxUses=0, maxAge=0, standby=0, standbyRetry=None, limit=None):
+        self.factory = factory
+        self.size = size
+        self.maxUses = maxUses
+        self.maxAge = maxAge
+        self.standby = standby
+        self.standbyRetry = standbyRetry if standbyRetry is not None else browser_params['standby_retry']
+        self.limit = limit
+        self._idle = [] # sessions checked in, most recently used last
+        self._created = 0 # sessions alive, idle or checked out
+        self._spares = [] # standby sessions which have started
+        self._warming = 0 # standby sessions starting
+        self._quitting = 0 # sessions retired which have not quit yet
+        self._threads = [] # background starts and quits
+        self._available = limit.condition if limit is not None else threading.Condition()
+        self._closed = False
+        self.retired = 0
+        self.standbyUsed = 0
+        if limit is not None:
+            limit.add(self)
+        self._warm()
+
+    def _alive(self) -> int:
+        return self._created + len(self._spares) + self._warming + self._quitting
+
+    def _background(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        with self._available:
+            self._threads = [running for running in self._threads if running.is_alive()]
+            self._threads.append(thread)
+        thread.start()
+
+    def _warm(self):
+        """
+        start standby sessions in the background until there are enough, or the limit is reached.
+        """
+        with self._available:
+            starting = 0 if self._closed else max(0, self.standby - len(self._spares) - self._warming)
+            if self.limit is not None:
+                starting = max(0, min(starting, self.limit.free()))
+            self._warming += starting
+        for _ in range(starting):
+            self._background(self._startSpare)
+
+    def _startSpare(self):
+        try:
+            session = PooledDriver(self.factory())
+        except Exception as ex:
+            logging.warning(f'DriverPool::_startSpare: could not start standby session, error=[{type(ex).__name__}], args=[{ex.args}], retrying in seconds=[{self.standbyRetry}]')
+            with self._available:
+                self._warming -= 1
+                self._available.notify_all()
+                # checkouts start sessions themselves in the meantime
+                self._available.wait_for(lambda: self._closed, timeout=self.standbyRetry)
+            self._warm()
+            return
+        with self._available:
+            self._warming -= 1
+            closed = self._closed
+            if closed:
+                self._quitting += 1
+            else:
+                self._spares.append(session)
+            self._available.notify_all()
+        if closed:
+            self._quit(session, 'closed')
+        else:
+            logging.info(f'DriverPool::_startSpare: standby session=[{session}] is ready')
+
+    @staticmethod
+    def healthy(session: PooledDriver) -> bool:
+        return DriverHealth.of(session.driver).check(session.driver)
+
+    def _retiring(self, session: PooledDriver) -> bool:
+        return (self.maxUses and session.uses >= self.maxUses) or (self.maxAge and session.age >= self.maxAge)
+
+    def _quit(self, session: PooledDriver, reason):
+        """
+        quit a session counted in _quitting.
+        """
+        logging.info(f'DriverPool::_quit: retiring session=[{session}], reason=[{reason}]')
+        with self._available:
+            self.retired += 1
+        try:
+            session.driver.quit()
+        except Exception as ex:
+            logging.debug(f'DriverPool::_quit: quit failed for session=[{session}], error=[{type(ex).__name__}]')
+        finally:
+            with self._available:
+                self._quitting -= 1
+                self._available.notify_all()
+
+    def _discard(self, session: PooledDriver, reason):
+        with self._available:
+            self._created -= 1
+            self._quitting += 1
+            self._available.notify_all()
+        self._background(self._quit, session, reason)
+
+    def checkout(self, timeout=None) -> PooledDriver:
+        """
+        take a healthy session, starting one if there are less than size, and less than the limit.
+        :param: timeout: seconds to wait for a session to be checked in, None waits forever
+        :raises: DriverPoolTimeout
+        """
+        deadline = time() + timeout if timeout is not None else None
+        while True:
+            reclaimed = None
+            with self._available:
+                if self._closed:
+                    raise DriverPoolTimeout('driver pool is closed')
+                session = self._idle.pop() if self._idle else None
+                create = session is None and self._created < self.size
+                spare = self._spares.pop(0) if create and self._spares else None
+                # rather than start a session alongside one warming, wait for it
+                waitForSpare = create and spare is None and self._warming > 0
+                if create and spare is None and not waitForSpare and self.limit is not None and self.limit.free() <= 0:
+                    # the other pools hold every session the limit allows, retire one they are not using
+                    create = False
+                    reclaimed = self.limit.reclaim(self)
+                if create and not waitForSpare:
+                    self._created += 1
+                elif session is None and reclaimed is None:
+                    remaining = deadline - time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise DriverPoolTimeout(f'no webdriver session was available within {timeout}s')
+                    self._available.wait(remaining)
+                    continue
+            if reclaimed is not None:
+                owner, retiring = reclaimed
+                owner._quit(retiring, 'session limit')
+                continue
+            if spare is not None:
+                self._warm()
+                if not DriverPool.healthy(spare):
+                    self._discard(spare, 'unhealthy standby')
+                    continue
+                self.standbyUsed += 1
+                session = spare
+                logging.info(f'DriverPool::checkout: using standby session=[{session}], sessions=[{self._created}]')
+            elif create:
+                try:
+                    session = PooledDriver(self.factory())
+                except Exception:
+                    with self._available:
+                        self._created -= 1
+                        self._available.notify_all()
+                    raise
+                logging.info(f'DriverPool::checkout: started session=[{session}], sessions=[{self._created}]')
+            elif not DriverPool.healthy(session):
+                self._discard(session, 'unhealthy')
+                continue
+            session.uses += 1
+            session.lastUsed = time()
+            return session
+
+    def checkin(self, session: PooledDriver, healthy=True, retire=False):
+        """
+        return a session, it is retired if it is unhealthy or due, or retire is set.
+        """
+        session.lastUsed = time()
+        if not healthy:
+            self._discard(session, 'unhealthy')
+        elif retire:
+            self._discard(session, 'retired')
+        elif self._retiring(session) or self._closed:
+            self._discard(session, 'recycled')
+        else:
+            with self._available:
+                self._idle.append(session)
+                self._available.notify_all()
+
+    @contextmanager
+    def session(self, timeout=None):
+        """
+        check a driver out for the block, it is retired if a WebDriverException escapes it.
+        """
+        session = self.checkout(timeout=timeout)
+        healthy = True
+        try:
+            yield session.driver
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            self.checkin(session, healthy=healthy)
+
+    def reset(self):
+        """
+        retire the idle and standby sessions, eg. when the selenium process they ran in has died.
+        """
+        with self._available:
+            idle, self._idle = self._idle, []
+            spares, self._spares = self._spares, []
+            self._created -= len(idle)
+            self._quitting += len(idle) + len(spares)
+            self._available.notify_all()
+        for session in idle + spares:
+            self._background(self._quit, session, 'reset')
+        self._warm()
+
+    def close(self):
+        """
+        quit the idle and standby sessions, sessions checked out are quit when they are checked in.
+        """
+        with self._available:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            spares, self._spares = self._spares, []
+            self._quitting += len(spares)
+            self._available.notify_all()
+        for session in idle:
+            self._discard(session, 'closed')
+        for session in spares:
+            self._quit(session, 'closed')
+
+    def wait(self, timeout=None):
+        """
+        wait for sessions starting or quitting in the background.
+        """
+        with self._available:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._available:
+            return dict(size=self.size, sessions=self._created, idle=len(self._idle), retired=self.retired,
+                        standby=len(self._spares), standbyUsed=self.standbyUsed)
@@ -1,4 +1,4 @@
-from threading import Thread
+from threading import Thread, Condition
 
 from queue import Queue
 
@@ -42,3 +42,56 @@ class ThreadPool:
     def wait_completion(self):
         """ Wait for completion of all the tasks in the queue """
         self.tasks.join()
+
+
+class KeyedThreadPool:
+    """ Pool of threads where the tasks of a key run in the order they were added, on one thread.
+    A key is given the thread with the fewest tasks pending when it has none pending itself, so
+    keys such as id() of objects, which share their low bits, are spread over the threads.
+    Adding a task blocks while its thread's queue is full. The first exception a task of a key
+    raises is kept, see pop_failure, and the key's later tasks are skipped. """
+    def __init__(self, num_threads, queue_size=0):
+        self.queues = [Queue(queue_size) for _ in range(num_threads)]
+        self.loads = [0] * num_threads # tasks pending on each thread
+        self.pending = {} # key: [tasks pending, thread]
+        self.failures = {}
+        self.changed = Condition()
+        for tasks in self.queues:
+            Worker(tasks)
+
+    def add_task(self, key, func, *args, **kargs):
+        """ Add a task for key to the queue of its thread """
+        with self.changed:
+            if key not in self.pending:
+                self.pending[key] = [0, self.loads.index(min(self.loads))]
+            self.pending[key][0] += 1
+            thread = self.pending[key][1]
+            self.loads[thread] += 1
+        self.queues[thread].put((self._run, (key, func, args, kargs), {}))
+
+    def _run(self, key, func, args, kargs):
+        try:
+            with self.changed:
+                failed = key in self.failures
+            if not failed:
+                func(*args, **kargs)
+        except Exception as ex:
+            with self.changed:
+                self.failures.setdefault(key, ex)
+        finally:
+            with self.changed:
+                self.pending[key][0] -= 1
+                self.loads[self.pending[key][1]] -= 1
+                if self.pending[key][0] == 0:
+                    del self.pending[key]
+                self.changed.notify_all()
+
+    def wait_completion(self, key=None):
+        """ Wait for completion of the tasks of key, or of all the tasks """
+        with self.changed:
+            self.changed.wait_for(lambda: (key not in self.pending) if key is not None else not self.pending)
+
+    def pop_failure(self, key):
+        """ The first exception raised by a task of key since the last pop, or None """
+        with self.changed:
+            return self.failures.pop(key, None)
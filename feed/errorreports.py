@@ -0,0 +1,99 @@
+import logging
+import threading
+from time import time
+
+from feed.settings import error_report_params
+
+
+class ErrorReports:
+    """
+    The action error reports of chains, from nanny, which stop a chain running. The reports
+    for all the positions of a chain are fetched in one request and kept for ttl seconds, so
+    checking whether a chain should run, before it runs and before every repeat, is a
+    dictionary lookup.
+
+    A report published by this process is added to the chain's reports straight away, see
+    Action.publishActionError. If nanny can not list a chain's reports in one request,
+    they are requested for each position, as they were before, and the batched request is
+    tried again after ttl seconds.
+
+    :param: ttl: seconds reports are kept for
+    :param: batch: whether to try the batched request
+    """
+    _shared = None
+
+    def __init__(self, ttl=None, batch=None):
+        self.ttl = ttl if ttl is not None else error_report_params['ttl']
+        self.batch = batch if batch is not None else error_report_params['batch']
+        self._reports = {} # (userID, chainName): (fetched, {position: [report, ...]})
+        self._lock = threading.Lock()
+        self._unbatchedUntil = 0 # the batched request failed, reports are requested for each position until then
+        self.requests = 0
+
+    @staticmethod
+    def shared():
+        if ErrorReports._shared is None:
+            ErrorReports._shared = ErrorReports()
+        return ErrorReports._shared
+
+    @staticmethod
+    def _byPosition(reports) -> dict:
+        """
+        reports as nanny lists them, a list of reports or reports by position.
+        """
+        if isinstance(reports, dict):
+            return {int(position): found for position, found in reports.items() if found}
+        byPosition = {}
+        for report in reports:
+            byPosition.setdefault(report.get('position'), []).append(report)
+        return byPosition
+
+    def _fetch(self, nannyClient, chainName, positions) -> dict:
+        if self.batch and time() >= self._unbatchedUntil:
+            self.requests += 1
+            reports = nannyClient.get(f'/actionsmanager/findActionErrorReports/{chainName}', resp=True, error=None)
+            if reports is not None:
+                return ErrorReports._byPosition(reports)
+            logging.info(f'ErrorReports::_fetch: could not list reports of chainName=[{chainName}] at once, requesting each position for ttl=[{self.ttl}]')
+            self._unbatchedUntil = time() + self.ttl
+        byPosition = {}
+        for position in positions:
+            self.requests += 1
+            errors = nannyClient.get(f'/actionsmanager/findActionErrorReports/{chainName}/{position}', resp=True, error=[])
+            if errors:
+                byPosition[position] = errors
+        return byPosition
+
+    def get(self, nannyClient, chainName, positions) -> dict:
+        """
+        the reports of each position of a chain which has any.
+        :param: nannyClient: the chain's client, on behalf of its user
+        """
+        key = (nannyClient.behalf, chainName)
+        with self._lock:
+            fetched, byPosition = self._reports.get(key, (None, None))
+        if fetched is not None and time() - fetched < self.ttl:
+            return byPosition
+        byPosition = self._fetch(nannyClient, chainName, positions)
+        with self._lock:
+            self._reports[key] = (time(), byPosition)
+        return byPosition
+
+    def reported(self, userID, chainName, report: dict):
+        """
+        add a report which has been published.
+        """
+        with self._lock:
+            fetched, byPosition = self._reports.get((userID, chainName), (None, None))
+            if fetched is not None:
+                byPosition.setdefault(report.get('position'), []).append(report)
+
+    def invalidate(self, userID=None, chainName=None):
+        """
+        drop the reports of a chain, or all of them, eg. when they have been cleared in nanny.
+        """
+        with self._lock:
+            if chainName is None:
+                self._reports.clear()
+            else:
+                self._reports.pop((userID, chainName), None)
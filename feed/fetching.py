@@ -0,0 +1,292 @@
+import hashlib
+import logging
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import Tag
+from selenium.common.exceptions import WebDriverException
+try:
+    from lxml import etree, html as lxmlhtml
+except ImportError:
+    etree = lxmlhtml = None
+
+from feed.settings import fetch_params
+from feed.scripts import ELEMENT_SEARCH, PAGE_FINGERPRINT, PAGE_SNAPSHOT
+from feed.pagecache import PageSnapshot, normaliseText
+from feed.locators import pageTemplate
+from feed.crawling import BrowserActions
+from feed.actiontypes import Action, ClickAction, InputAction
+
+
+class StaticElement:
+    """
+    an element of a fetched page, with the parts of the WebElement interface the actions use.
+    :param: link: href of the element or of the nearest <a> around it
+    """
+    def __init__(self, tag_name, attrs: dict, text, link=None):
+        self.tag_name = tag_name
+        self.attrs = attrs
+        self.text = text
+        self.link = link
+
+    def get_attribute(self, name):
+        return self.attrs.get(name)
+
+    def __repr__(self):
+        return f'StaticElement(tag_name={self.tag_name}, class={self.attrs.get("class")})'
+
+    @staticmethod
+    def fromTag(tag: Tag):
+        attrs = {key: ' '.join(value) if isinstance(value, list) else value for key, value in tag.attrs.items()}
+        anchor = tag if tag.name == 'a' and tag.attrs.get('href') else tag.find_parent('a', href=True)
+        return StaticElement(tag.name, attrs, tag.get_text().strip(), anchor.attrs.get('href') if anchor is not None else None)
+
+    @staticmethod
+    def fromLxml(element):
+        anchor = element if element.tag == 'a' and element.get('href') else next(element.iterancestors('a'), None)
+        while anchor is not None and not anchor.get('href'):
+            anchor = next(anchor.iterancestors('a'), None)
+        return StaticElement(element.tag, dict(element.attrib), element.text_content().strip(), anchor.get('href') if anchor is not None else None)
+
+
+class StaticDocument:
+    """
+    A page fetched over http, standing in for the driver so that searching and the page
+    cache work on it as they do in the browser. It answers feed.scripts.ELEMENT_SEARCH with
+    the same css and xpath semantics, and the page cache scripts with its source. Anything
+    else needs the browser.
+    :param: url: url of the page after redirects
+    :param: source: html source of the page
+    """
+    # a page with less text than this and a script is taken to be rendered by the script
+    minText = 50
+    _ignoredTextParents = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self, url, source):
+        self.current_url = url
+        self.page_source = source
+        self.snapshot = PageSnapshot(url, hashlib.md5(source.encode('utf-8')).hexdigest(), source)
+        self._tree = None
+
+    @property
+    def tree(self):
+        """
+        lxml tree of the page for xpath, None if lxml is not installed.
+        """
+        if self._tree is None and lxmlhtml is not None:
+            self._tree = lxmlhtml.fromstring(self.page_source).getroottree()
+        return self._tree
+
+    def execute_script(self, script, *args):
+        if script is ELEMENT_SEARCH:
+            return self.search(*args)
+        if script is PAGE_FINGERPRINT:
+            return [self.snapshot.url, self.snapshot.fingerprint]
+        if script is PAGE_SNAPSHOT:
+            return [self.snapshot.url, self.snapshot.fingerprint, self.page_source]
+        raise WebDriverException('script can not be run on a page fetched without the browser')
+
+    def _find(self, kind, selector) -> list:
+        if kind == 'css':
+            return [StaticElement.fromTag(tag) for tag in self.snapshot.soup.select(selector)]
+        if kind == 'xpath':
+            if self.tree is None:
+                logging.warning(f'StaticDocument::_find: lxml is not installed, can not search with xpath=[{selector}]')
+                return []
+            found = self.tree.xpath(selector)
+            return [StaticElement.fromLxml(element) for element in found if isinstance(element, etree._Element) and isinstance(element.tag, str)]
+        return []
+
+    def search(self, strategies, isSingle, attribute, withElements) -> list:
+        """
+        see feed.scripts.ELEMENT_SEARCH, elements are StaticElements.
+        """
+        results = []
+        for kind, selector in strategies:
+            try:
+                elements = self._find(kind, selector)
+            except Exception as ex:
+                # invalid selector, same as nothing found
+                logging.debug(f'StaticDocument::search: {kind}=[{selector}] failed, error=[{type(ex).__name__}]')
+                elements = []
+            described = []
+            for element in elements:
+                item = {'class': element.get_attribute('class'),
+                        'text': element.text,
+                        'attr': element.get_attribute(attribute) if attribute else None}
+                if withElements:
+                    item['element'] = element
+                described.append(item)
+            results.append([kind, described])
+            if len(elements) > 0 and (not isSingle or len(elements) == 1):
+                break
+        return results
+
+    def needsScript(self) -> bool:
+        """
+        whether the page looks to be rendered by javascript, ie. it has a script and next to no text.
+        """
+        soup = self.snapshot.soup
+        root = soup.body if soup.body is not None else soup
+        text = ''.join(string for string in root.find_all(string=True) if string.parent.name not in StaticDocument._ignoredTextParents)
+        return len(normaliseText(text)) < StaticDocument.minText and soup.find('script') is not None
+
+
+class PageFetcher:
+    """
+    Fetches pages with a pooled http session, so connections to a host are kept alive
+    between pages.
+    :param: timeout: seconds to wait for a page
+    :param: poolSize: connections kept per host
+    :param: userAgent: User-Agent header to fetch with
+    """
+    _shared = None
+
+    def __init__(self, timeout=None, poolSize=None, userAgent=None):
+        self.timeout = timeout if timeout is not None else fetch_params['timeout']
+        poolSize = poolSize if poolSize is not None else fetch_params['pool_size']
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': userAgent if userAgent else fetch_params['user_agent'],
+                                     'Accept': 'text/html,application/xhtml+xml'})
+        self.fetches = 0
+        self.failures = 0
+
+    @staticmethod
+    def shared():
+        """
+        the process wide fetcher, configured by feed.settings.fetch_params
+        """
+        if PageFetcher._shared is None:
+            PageFetcher._shared = PageFetcher()
+        return PageFetcher._shared
+
+    def fetch(self, url) -> StaticDocument:
+        """
+        fetch url, None if it could not be fetched or is not html.
+        """
+        self.fetches += 1
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as ex:
+            self.failures += 1
+            logging.warning(f'PageFetcher::fetch: could not fetch url=[{url}], error=[{type(ex).__name__}]')
+            return None
+        contentType = response.headers.get('Content-Type', '')
+        if response.status_code >= 400 or 'html' not in contentType:
+            self.failures += 1
+            logging.info(f'PageFetcher::fetch: not using url=[{url}], status_code=[{response.status_code}], content_type=[{contentType}]')
+            return None
+        logging.debug(f'PageFetcher::fetch: fetched url=[{response.url}] in {response.elapsed.total_seconds():.3f}s')
+        return StaticDocument(response.url, response.text)
+
+
+class HttpActions(BrowserActions):
+    """
+    BrowserActions which fetch server rendered pages over http instead of loading them in the
+    browser. Captures and publishes search the fetched page, see StaticDocument, and clicks on
+    links fetch the link.
+
+    The chain moves to the browser, for the rest of the run, when the page can not be fetched
+    or needs javascript, for inputs and clicks on anything but a link, and, when fetchMode is
+    'auto', when an action finds nothing in the fetched page. Pages of a template which needed
+    the browser once are not fetched again.
+
+    :param: fetchMode: 'browser', 'http' or 'auto', defaults to feed.settings.fetch_params
+    """
+    fetchModes = ('browser', 'http', 'auto')
+
+    def __init__(self, driver, *args, **kwargs):
+        super().__init__(driver, *args, **kwargs)
+        self.fetchMode = kwargs.get('fetchMode', fetch_params['mode'])
+        if self.fetchMode not in HttpActions.fetchModes:
+            logging.warning(f'{type(self).__name__}::__init__: unknown fetchMode=[{self.fetchMode}], using the browser')
+            self.fetchMode = 'browser'
+        self.fetcher = PageFetcher.shared()
+        self.document = None # type: StaticDocument
+        self._browserTemplates = set() # templates of pages which needed the browser
+
+    def reset(self, driver=None, **kwargs):
+        super().reset(driver=driver, **kwargs)
+        self.document = None
+
+    def _load(self, url) -> bool:
+        """
+        fetch url and make it the current page.
+        :return: whether it was, the current page is unchanged if not.
+        """
+        if pageTemplate(url) in self._browserTemplates:
+            return False
+        document = self.fetcher.fetch(url)
+        if document is None:
+            return False
+        if document.needsScript():
+            logging.info(f'{type(self).__name__}::_load: url=[{url}] needs javascript, using the browser')
+            self._browserTemplates.add(pageTemplate(url))
+            return False
+        self.document = document
+        self.pages.put(document.snapshot)
+        self.soup = document.snapshot.soup
+        return True
+
+    def _browse(self, reason):
+        """
+        move the chain to the browser on the current page.
+        """
+        url = self.document.current_url
+        logging.info(f'{type(self).__name__}::_browse: using the browser for url=[{url}], {reason}')
+        self._browserTemplates.add(pageTemplate(url))
+        self.document = None
+        self.driver.get(url)
+        self.pages.invalidate()
+        self._update_soup()
+
+    def _currentUrl(self):
+        if self.document is not None:
+            return self.document.current_url
+        return super()._currentUrl()
+
+    def onActionOutcome(self, action, error=None):
+        # actions on a fetched page say nothing about the browser
+        if self.document is None:
+            super().onActionOutcome(action, error=error)
+
+    def _search(self, action: Action, stream=False):
+        if self.document is not None:
+            data = action.getActionableItem(action, self.document, pages=self.pages, stream=stream, strategyStats=self.strategyStats)
+            if data is not None or self.fetchMode != 'auto':
+                return self.document, data
+            self._browse(f'nothing found for action position=[{action.position}]')
+        return super()._search(action, stream=stream)
+
+    def onClickAction(self, action: ClickAction):
+        if self.document is None:
+            return super().onClickAction(action)
+        element = action.getActionableItem(action, self.document, pages=self.pages, strategyStats=self.strategyStats)
+        link = element.link if isinstance(element, StaticElement) else None
+        if link is None or link.startswith(('#', 'javascript:')):
+            self._browse(f'action position=[{action.position}] is not a click on a link')
+            return super().onClickAction(action)
+        url = urljoin(self.document.current_url, link)
+        if not self._load(url):
+            self._browse(f'could not fetch link=[{url}]')
+            return super().onClickAction(action)
+        logging.info(f'{type(self).__name__}::onClickAction(): fetched link=[{url}] for text=[{element.text}]')
+        return [BrowserActions.Return(current_url=self.document.current_url, userID=self.userID, name=self.name, action=action, data=None)]
+
+    def onInputAction(self, action: InputAction):
+        if self.document is not None:
+            self._browse(f'input is needed for action position=[{action.position}]')
+        return super().onInputAction(action)
+
+    def initialise(self, caller):
+        if self.fetchMode == 'browser':
+            return super().initialise(caller)
+        url = self._startingUrl()
+        self.document = None
+        if not self._load(url):
+            self._open(caller, url)
+        ret = BrowserActions.Return(action=None, data=None, userID=self.userID, current_url=self._currentUrl(), name=self.name)
+        caller.initialiseCallback(ret, chain=self)
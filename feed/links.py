@@ -0,0 +1,101 @@
+import logging
+import re
+from bs4 import Tag
+
+
+class LinkExtractor:
+    """
+    Finds the link for each of a set of matched nodes in a single pass over the document.
+
+    For each node the link is, in order of priority:
+        1. the node's own href, if it contains urlStub
+        2. the href of the nearest ancestor whose href matches the urlStub pattern
+        3. the href of the first descendant whose href matches the urlStub pattern
+    nodes without any of these are skipped. This is the order onPublishAction searched in
+    with findParent and findChild for each node, the parent and child <a> searches that
+    followed could only ever find a subset of 2. and 3.
+    :param: urlStub: the string the link should contain
+    :param: pattern: compiled urlStub pattern, see feed.actiontypes.PublishAction
+    """
+    def __init__(self, urlStub, pattern=None):
+        self.urlStub = urlStub
+        self.pattern = pattern if pattern else re.compile(f'{urlStub}/*')
+
+    def _matchingHref(self, tag: Tag):
+        href = tag.attrs.get('href')
+        if isinstance(href, str) and self.pattern.search(href):
+            return href
+        return None
+
+    def iterLinks(self, root: Tag, items: list):
+        """
+        yield the links of items, which are nodes of the tree under root, in the order of items.
+        each link is yielded as soon as the walk has decided it.
+        """
+        positions = {}
+        for index, item in enumerate(items):
+            positions.setdefault(id(item), []).append(index)
+        links = [None] * len(items)
+        decided = [False] * len(items)
+        for index, item in enumerate(items):
+            href = item.attrs.get('href')
+            if href and self.urlStub in href:
+                links[index] = href
+                decided[index] = True
+        waiting = set() # positions of open matched nodes which do not have a link yet
+        openLinks = [] # hrefs of open ancestors which match
+
+        def enter(tag):
+            href = self._matchingHref(tag)
+            if href is not None and waiting:
+                # first matching descendant of the nodes waiting
+                for index in waiting:
+                    links[index] = href
+                    decided[index] = True
+                waiting.clear()
+            for index in positions.get(id(tag), ()):
+                if decided[index]:
+                    continue
+                if openLinks:
+                    links[index] = openLinks[-1]
+                    decided[index] = True
+                else:
+                    waiting.add(index)
+            if href is not None:
+                openLinks.append(href)
+            return href
+
+        def leave(tag, href):
+            if href is not None:
+                openLinks.pop()
+            for index in positions.get(id(tag), ()):
+                if index in waiting:
+                    waiting.discard(index)
+                    decided[index] = True # no link
+
+        nextIndex = 0
+        stack = [(root, iter(root.contents), enter(root))]
+        while stack:
+            tag, children, href = stack[-1]
+            child = next(children, None)
+            if child is None:
+                leave(tag, href)
+                stack.pop()
+            elif isinstance(child, Tag):
+                stack.append((child, iter(child.contents), enter(child)))
+            while nextIndex < len(items) and decided[nextIndex]:
+                if links[nextIndex] is not None:
+                    yield links[nextIndex]
+                nextIndex += 1
+        for index in range(nextIndex, len(items)):
+            # only items which are not under root are left
+            if links[index] is not None:
+                yield links[index]
+
+    def extract(self, root: Tag, items: list) -> list:
+        """
+        return the links of items, which are nodes of the tree under root, in the order of items.
+        """
+        out = list(self.iterLinks(root, items))
+        logging.info(f'LinkExtractor::extract: found {len(out)} links for {len(items)} items')
+        return out
@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from urllib.parse import urlparse
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from feed.settings import strategy_params
+
+
+# how an element was found. text is set when value matches more than one element and the
+# one whose text is text, ignoring case, is wanted.
+Locator = namedtuple('Locator', ['by', 'value', 'text'])
+# the By of each kind of feed.scripts.ELEMENT_SEARCH strategy
+strategyBy = {'css': By.CSS_SELECTOR, 'xpath': By.XPATH}
+
+
+def pageTemplate(url) -> str:
+    """
+    the url without its query, fragment or numbers, so that the pages of a listing share
+    one template.
+    """
+    if not url:
+        return ''
+    parsed = urlparse(url)
+    return f'{parsed.netloc}{re.sub(r"[0-9]+", "#", parsed.path)}'
+
+
+class LocatorCache:
+    """
+    Remembers the locator which last found the element an action interacted with, by action
+    hash and page template. A repeating chain tries it before searching the page again.
+    """
+    def __init__(self):
+        self._locators = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(actionHash, url):
+        return actionHash, pageTemplate(url)
+
+    def get(self, actionHash, url) -> Locator:
+        return self._locators.get(LocatorCache._key(actionHash, url))
+
+    def put(self, actionHash, url, locator: Locator):
+        if locator is None:
+            return
+        logging.debug(f'LocatorCache::put: actionHash=[{actionHash}], template=[{pageTemplate(url)}], locator=[{locator}]')
+        self._locators.update({LocatorCache._key(actionHash, url): locator})
+
+    def discard(self, actionHash, url):
+        self._locators.pop(LocatorCache._key(actionHash, url), None)
+
+    @staticmethod
+    def resolve(driver: WebDriver, locator: Locator) -> WebElement:
+        """
+        the element locator finds, or None if it finds none or cannot tell which one to use.
+        """
+        elements = driver.find_elements(locator.by, locator.value)
+        if len(elements) == 1:
+            return elements[0]
+        if locator.text:
+            # the first with the text, as BrowserSearchParams.search picks it
+            for element in elements:
+                if (element.text or '').strip().upper() == locator.text.strip().upper():
+                    return element
+        return None
+
+    def find(self, driver: WebDriver, actionHash, url) -> WebElement:
+        """
+        resolve the cached locator for the action on this page, counting hits and misses.
+        a locator which no longer resolves is dropped.
+        """
+        locator = self.get(actionHash, url)
+        element = LocatorCache.resolve(driver, locator) if locator is not None else None
+        if element is None:
+            self.misses += 1
+            if locator is not None:
+                logging.info(f'LocatorCache::find: cached locator=[{locator}] no longer resolves, template=[{pageTemplate(url)}]')
+                self.discard(actionHash, url)
+            return None
+        self.hits += 1
+        return element
+
+    @property
+    def hitRate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return dict(hits=self.hits, misses=self.misses, hitRate=self.hitRate, size=len(self._locators))
+
+
+class StrategyStats:
+    """
+    Counts which search strategy (css, xpath) found each action's elements, so that the
+    strategy which has won most often for an action is tried first.
+    :param: path: json file the counts are loaded from and saved to
+    :param: saveEvery: save after this many new results
+    """
+    _shared = None
+
+    def __init__(self, path=None, saveEvery=50):
+        self.path = path
+        self.saveEvery = saveEvery
+        self._wins = {} # actionHash -> {strategy: count}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def shared():
+        """
+        the process wide statistics, configured by feed.settings.strategy_params and saved on exit.
+        """
+        if StrategyStats._shared is None:
+            StrategyStats._shared = StrategyStats(path=strategy_params['path'], saveEvery=strategy_params['save_every'])
+            atexit.register(StrategyStats._shared.save)
+        return StrategyStats._shared
+
+    def record(self, actionHash, strategy):
+        with self._lock:
+            wins = self._wins.setdefault(actionHash, {})
+            wins.update({strategy: wins.get(strategy, 0) + 1})
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.saveEvery
+        if save:
+            self.save()
+
+    def order(self, actionHash, strategies: list) -> list:
+        """
+        strategies, [[kind, selector], ...], most winning first. ties keep their given order.
+        """
+        wins = self._wins.get(actionHash)
+        if not wins:
+            return strategies
+        return sorted(strategies, key=lambda strategy: -wins.get(strategy[0], 0))
+
+    def wins(self, actionHash) -> dict:
+        return dict(self._wins.get(actionHash, {}))
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as fh:
+                loaded = json.load(fh)
+        except (OSError, ValueError) as ex:
+            logging.warning(f'StrategyStats::load: could not load strategy statistics from path=[{self.path}], error=[{type(ex).__name__}]')
+            return
+        with self._lock:
+            self._wins = loaded
+        logging.info(f'StrategyStats::load: loaded statistics for {len(loaded)} actions from path=[{self.path}]')
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            out = json.dumps(self._wins)
+            self._unsaved = 0
+        tmp = f'{self.path}.tmp'
+        try:
+            with open(tmp, 'w') as fh:
+                fh.write(out)
+            os.replace(tmp, self.path)
+        except OSError as ex:
+            logging.warning(f'StrategyStats::save: could not save strategy statistics to path=[{self.path}], error=[{type(ex).__name__}]')
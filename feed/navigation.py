@@ -0,0 +1,163 @@
+import logging
+from collections import namedtuple
+from time import sleep, time
+from urllib.parse import urlparse
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from feed.settings import navigation_params
+from feed.scripts import NAVIGATION_HOOKS, NAVIGATION_STATE, NAVIGATION_WAIT
+from feed.drivers import DriverHealth
+from feed.tabs import TabDriver
+
+
+# outcome of waiting on a click, seconds is how long the wait took
+NavigationResult = namedtuple('NavigationResult', ['fromUrl', 'url', 'navigated', 'ready', 'idle', 'seconds', 'timeout'])
+
+
+class NavigationWaiter:
+    """
+    Waits for the page to settle after an interaction, using hooks in the page rather than
+    polling current_url. The page has settled once the document is complete and there have
+    been no XMLHttpRequest or fetch calls in flight for the idle period, so a click which does
+    not navigate costs about the idle period instead of the whole timeout.
+
+    The wait is one async script, except in a tab, see feed.tabs.TabDriver, which holds its
+    session while a command is in flight. There the page's state is polled every pollInterval
+    with a script which returns straight away, so the other tabs' commands run in between.
+
+    :param: timeout: default seconds to wait
+    :param: idle: seconds without network activity for the page to have settled
+    :param: domainTimeouts: timeout by domain, eg. {"www.donedeal.co.uk": 8}
+    """
+    pollInterval = 0.05
+    defaultScriptTimeout = 30 # seconds, the w3c default, taken when the driver's can not be read
+    getTimeoutsCommand = 'feedGetTimeouts'
+
+    def __init__(self, timeout=None, idle=None, domainTimeouts=None):
+        self.timeout = timeout if timeout is not None else navigation_params['timeout']
+        self.idle = idle if idle is not None else navigation_params['idle']
+        self.domainTimeouts = domainTimeouts if domainTimeouts is not None else navigation_params['domain_timeouts']
+        self.waits = 0
+        self.totalSeconds = 0
+        self.last = None # type: NavigationResult
+        self._scriptTimeout = (None, None) # (driver, seconds) the script timeout of the driver last waited on
+
+    def timeoutFor(self, url, chainTimeout=None) -> float:
+        """
+        the timeout of the chain if it has one, otherwise of the domain of url, otherwise the default.
+        """
+        if chainTimeout is not None:
+            return float(chainTimeout)
+        return float(self.domainTimeouts.get(urlparse(url).netloc, self.timeout))
+
+    def arm(self, driver: WebDriver) -> tuple:
+        """
+        install the page hooks, call before the interaction.
+        :return: (url, marker) of the page to pass to wait
+        """
+        url, marker = driver.execute_script(NAVIGATION_HOOKS)
+        return url, marker
+
+    def _scriptTimeoutOf(self, driver) -> float:
+        """
+        the driver's script timeout in seconds, read once for each driver. selenium 3 can set
+        it but not get it, so the w3c endpoint is registered on the remote connection, as
+        BrowserProfile.apply does for devtools.
+        """
+        known, seconds = self._scriptTimeout
+        if known is driver:
+            return seconds
+        try:
+            driver.command_executor._commands[NavigationWaiter.getTimeoutsCommand] = ('GET', '/session/$sessionId/timeouts')
+            seconds = driver.execute(NavigationWaiter.getTimeoutsCommand)['value']['script'] / 1000
+        except Exception as ex:
+            if DriverHealth.classify(ex) is not None:
+                raise
+            logging.debug(f'NavigationWaiter::_scriptTimeoutOf: could not read script timeout, error=[{type(ex).__name__}]')
+            seconds = NavigationWaiter.defaultScriptTimeout
+        self._scriptTimeout = (driver, seconds)
+        return seconds
+
+    def wait(self, driver: WebDriver, armed: tuple, timeout=None) -> NavigationResult:
+        """
+        wait for the page to settle after an interaction.
+        :param: armed: return value of arm
+        :param: timeout: seconds, see timeoutFor
+        """
+        fromUrl, marker = armed
+        timeout = timeout if timeout is not None else self.timeoutFor(fromUrl)
+        if isinstance(driver, TabDriver):
+            return self._finished(*self._poll(driver, fromUrl, marker, timeout), fromUrl=fromUrl, timeout=timeout)
+        # the wait is one async script, the driver's script timeout is raised for it if it is shorter
+        previous = self._scriptTimeoutOf(driver)
+        needed = timeout + self.idle + 1
+        if previous < needed:
+            driver.set_script_timeout(needed)
+        start = time()
+        navigated = False
+        state = {}
+        try:
+            while True:
+                remaining = timeout - (time() - start)
+                if remaining <= 0:
+                    break
+                try:
+                    state = driver.execute_async_script(NAVIGATION_WAIT, fromUrl, marker, int(self.idle * 1000), int(remaining * 1000))
+                except WebDriverException as ex:
+                    if DriverHealth.classify(ex) is not None:
+                        # the session or its page has gone, waiting will not bring it back
+                        raise
+                    # the document was unloaded while waiting, a navigation is under way.
+                    logging.debug(f'NavigationWaiter::wait: document changed whilst waiting, error=[{type(ex).__name__}]')
+                    navigated = True
+                    sleep(self.pollInterval)
+                    continue
+                navigated = navigated or state.get('navigated', False)
+                if state.get('ready') and state.get('idle'):
+                    break
+        finally:
+            if previous < needed:
+                driver.set_script_timeout(previous)
+        return self._finished(state, navigated, time() - start, fromUrl=fromUrl, timeout=timeout)
+
+    def _poll(self, driver, fromUrl, marker, timeout):
+        """
+        wait by polling the page's state, releasing the session in between.
+        :return: (state, navigated, seconds)
+        """
+        start = time()
+        navigated = False
+        state = {}
+        while time() - start < timeout:
+            try:
+                state = driver.execute_script(NAVIGATION_STATE, fromUrl, marker, int(self.idle * 1000))
+            except WebDriverException as ex:
+                if DriverHealth.classify(ex) is not None:
+                    raise
+                logging.debug(f'NavigationWaiter::_poll: document changed whilst polling, error=[{type(ex).__name__}]')
+                navigated = True
+                sleep(self.pollInterval)
+                continue
+            navigated = navigated or state.get('navigated', False)
+            if state.get('ready') and state.get('idle'):
+                break
+            sleep(self.pollInterval)
+        return state, navigated, time() - start
+
+    def _finished(self, state, navigated, seconds, fromUrl, timeout) -> NavigationResult:
+        """
+        record and log the outcome of a wait.
+        """
+        result = NavigationResult(fromUrl=fromUrl,
+                                  url=state.get('url', fromUrl),
+                                  navigated=navigated,
+                                  ready=state.get('ready', False),
+                                  idle=state.get('idle', False),
+                                  seconds=seconds,
+                                  timeout=seconds >= timeout)
+        self.waits += 1
+        self.totalSeconds += seconds
+        self.last = result
+        logging.info(f'NavigationWaiter::wait: waited seconds=[{seconds:.3f}], navigated=[{navigated}], from=[{fromUrl}], to=[{result.url}], timed_out=[{result.timeout}]')
+        return result
@@ -0,0 +1,171 @@
+import difflib
+import logging
+import re
+from bs4 import BeautifulSoup, Comment, Tag
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from feed.scripts import PAGE_FINGERPRINT, PAGE_SNAPSHOT
+from feed.parsers import parse
+
+
+_whitespace = re.compile(r'\s+')
+
+def normaliseText(text) -> str:
+    return _whitespace.sub(' ', text).strip() if text else ''
+
+
+class PageSnapshot:
+    """
+    the source of a page at a point in time, parsed at most once.
+    :param: url: the url of the page when the source was taken
+    :param: fingerprint: fingerprint of the document content, see feed.scripts.PAGE_FINGERPRINT
+    :param: source: html source of the page
+    """
+    def __init__(self, url, fingerprint, source):
+        self.url = url
+        self.fingerprint = fingerprint
+        self.source = source
+        self._soup = None
+        self._classIndex = None # (class token -> nodes, full class string -> nodes)
+        self._textIndex = None # (normalised text -> nodes, case folded text -> nodes)
+
+    @property
+    def key(self):
+        return self.url, self.fingerprint
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            logging.debug(f'PageSnapshot::soup: parsing page source for url=[{self.url}]')
+            self._soup = parse(self.source)
+        return self._soup
+
+    def _buildClassIndex(self):
+        tokens = {}
+        full = {}
+        for tag in self.soup.find_all(True):
+            classes = tag.attrs.get('class')
+            if not classes:
+                continue
+            if isinstance(classes, str):
+                classes = classes.split()
+            for token in set(classes):
+                tokens.setdefault(token, []).append(tag)
+            full.setdefault(' '.join(classes), []).append(tag)
+        self._classIndex = (tokens, full)
+
+    def findByClass(self, cls) -> list:
+        """
+        the nodes soup.findAll(attrs={'class': cls}) returns, looked up from an index of the
+        page built on first use. a class string with spaces matches the whole class attribute,
+        otherwise any single class.
+        """
+        if not isinstance(cls, str) or cls.strip() == '':
+            return self.soup.findAll(attrs={'class': cls})
+        if self._classIndex is None:
+            self._buildClassIndex()
+        tokens, full = self._classIndex
+        if ' ' in cls:
+            return list(full.get(cls, ()))
+        return list(tokens.get(cls, ()))
+
+    # elements whose text is never something to act on
+    _ignoredTextParents = {'script', 'style', 'noscript', 'template', 'head', 'title'}
+    # attributes which are shown to the user as the text of an element
+    _textAttributes = ('value', 'aria-label', 'title', 'alt')
+
+    def _buildTextIndex(self):
+        exact = {}
+        for string in self.soup.find_all(string=True):
+            parent = string.parent
+            if isinstance(string, Comment) or parent is None or parent.name in PageSnapshot._ignoredTextParents:
+                continue
+            text = normaliseText(str(string))
+            if text:
+                exact.setdefault(text, []).append(parent)
+        for tag in self.soup.find_all(lambda tag: any(attribute in tag.attrs for attribute in PageSnapshot._textAttributes)):
+            for attribute in PageSnapshot._textAttributes:
+                text = normaliseText(tag.attrs.get(attribute)) if isinstance(tag.attrs.get(attribute), str) else ''
+                if text:
+                    exact.setdefault(text, []).append(tag)
+        folded = {}
+        for text, nodes in exact.items():
+            folded.setdefault(text.casefold(), []).extend(nodes)
+        self._textIndex = (exact, folded)
+
+    def findByText(self, text, cutoff=0.8, limit=5, fuzzy=True) -> list:
+        """
+        the elements whose own text, or value, aria-label, title or alt, matches text. exact
+        matches of the whitespace normalised text are preferred, then case folded matches,
+        then the closest fuzzy matches.
+        :param: cutoff: minimum similarity of a fuzzy match, see difflib.get_close_matches
+        :param: limit: maximum number of elements returned
+        :param: fuzzy: whether to take fuzzy matches at all
+        """
+        text = normaliseText(text)
+        if not text:
+            return []
+        if self._textIndex is None:
+            self._buildTextIndex()
+        exact, folded = self._textIndex
+        if text in exact:
+            return exact.get(text)[:limit]
+        if text.casefold() in folded:
+            return folded.get(text.casefold())[:limit]
+        if not fuzzy:
+            return []
+        out = []
+        for match in difflib.get_close_matches(text.casefold(), folded.keys(), n=limit, cutoff=cutoff):
+            out.extend(folded.get(match))
+        return out[:limit]
+
+    @staticmethod
+    def xpathFor(node: Tag) -> str:
+        """
+        absolute xpath of an element of the page, eg. /html/body/div[2]/a[1]
+        """
+        steps = []
+        while node is not None and node.name != '[document]':
+            position = 1 + sum(1 for _ in node.find_previous_siblings(node.name))
+            steps.append(f'{node.name}[{position}]')
+            node = node.parent
+        return '/' + '/'.join(reversed(steps))
+
+
+class PageCache:
+    """
+    Holds the snapshot of the page the driver is on, keyed by url and a content fingerprint
+    so that search, capture, click and publish work on the same parsed source rather than
+    each pulling page_source over the wire and parsing it again.
+
+    Anything which navigates the driver should call invalidate.
+    """
+    def __init__(self):
+        self.snapshot = None # type: PageSnapshot
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, driver: WebDriver) -> PageSnapshot:
+        """
+        return the snapshot of the page the driver is currently on, fetching it only if
+        the page has changed since it was last taken.
+        """
+        if self.snapshot is not None:
+            url, fingerprint = driver.execute_script(PAGE_FINGERPRINT)
+            if (url, fingerprint) == self.snapshot.key:
+                self.hits += 1
+                return self.snapshot
+            logging.debug(f'PageCache::get: page has changed, url=[{url}], fingerprint=[{fingerprint}]')
+        self.misses += 1
+        url, fingerprint, source = driver.execute_script(PAGE_SNAPSHOT)
+        self.snapshot = PageSnapshot(url, fingerprint, source)
+        return self.snapshot
+
+    def put(self, snapshot: PageSnapshot):
+        """
+        hold a snapshot taken some other way, eg. of a page fetched without the browser.
+        """
+        self.snapshot = snapshot
+
+    def invalidate(self):
+        self.snapshot = None
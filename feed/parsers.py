@@ -0,0 +1,83 @@
+import logging
+from bs4 import BeautifulSoup, FeatureNotFound
+
+from feed.settings import parser_params
+
+
+class Parser:
+    """
+    A html parser backend. Whatever the underlying engine, parse must return a bs4 tree
+    as that is what search, click and publish work on.
+    :param: name: name the backend is registered under
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def parse(self, source) -> BeautifulSoup:
+        raise NotImplementedError
+
+
+class SoupParser(Parser):
+    """
+    parse with one of the tree builders bs4 supports, eg. lxml, html.parser, html5lib
+    """
+    def __init__(self, name, features=None):
+        super().__init__(name)
+        self.features = features if features else name
+
+    def parse(self, source) -> BeautifulSoup:
+        return BeautifulSoup(source, features=self.features)
+
+
+parser_backends = {
+    'lxml': SoupParser('lxml'),
+    'html.parser': SoupParser('html.parser'),
+    'html5lib': SoupParser('html5lib')
+}
+
+fallback_backend = 'html.parser' # ships with python so is always available
+
+
+def registerParser(parser: Parser):
+    """
+    add a backend, eg. an adapter around a faster engine which builds a bs4 tree.
+    """
+    parser_backends.update({parser.name: parser})
+
+
+def isAvailable(name) -> bool:
+    if name not in parser_backends:
+        return False
+    try:
+        parser_backends.get(name).parse('<div></div>')
+    except (FeatureNotFound, ImportError):
+        return False
+    return True
+
+
+def availableParsers() -> list:
+    return [name for name in parser_backends if isAvailable(name)]
+
+
+_resolved = {}
+
+def getParser(name=None) -> Parser:
+    """
+    return the backend with name, or the configured one. If it is not installed, the
+    fallback backend is used.
+    """
+    name = name if name else parser_params['backend']
+    if name not in _resolved:
+        if isAvailable(name):
+            _resolved[name] = parser_backends.get(name)
+        else:
+            logging.warning(f'parsers::getParser: parser backend=[{name}] is not available, falling back to backend=[{fallback_backend}]')
+            _resolved[name] = parser_backends.get(fallback_backend)
+    return _resolved[name]
+
+
+def parse(source, backend=None) -> BeautifulSoup:
+    """
+    parse html source with the configured backend
+    """
+    return getParser(backend).parse(source)
@@ -0,0 +1,112 @@
+import logging
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+
+from feed.settings import browser_params, browser_profiles
+
+
+# url patterns blocked for each resource type a profile can block
+resource_patterns = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp"],
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m3u8"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "stylesheets": ["*.css"]
+}
+
+# chrome content settings which stop a resource type being loaded at all, 2 is block
+resource_prefs = {
+    "images": {"profile.managed_default_content_settings.images": 2},
+    "stylesheets": {"profile.managed_default_content_settings.stylesheets": 2}
+}
+
+page_load_strategies = ('normal', 'eager', 'none')
+
+
+class BrowserProfile:
+    """
+    How a browser session loads pages: the page load strategy, which decides when
+    driver.get returns, and the resources which are not loaded at all. Our chains read the
+    DOM's text and links, so images, fonts and stylesheets are only time spent waiting.
+
+    resource types are blocked with chrome content settings where there is one, and with
+    devtools request blocking (Network.setBlockedURLs) along with block_urls.
+
+    :param: name: name of the profile in feed.settings.browser_profiles
+    :param: pageLoadStrategy: normal, eager or none
+    :param: block: resource types, see resource_patterns
+    :param: blockUrls: url patterns, * matches anything
+    """
+    cdpCommand = 'executeCdpCommand'
+
+    def __init__(self, name, pageLoadStrategy='normal', block=(), blockUrls=()):
+        if pageLoadStrategy not in page_load_strategies:
+            raise ValueError(f'pageLoadStrategy=[{pageLoadStrategy}] is not one of {page_load_strategies}')
+        unknown = [resource for resource in block if resource not in resource_patterns]
+        if unknown:
+            raise ValueError(f'can not block resources=[{unknown}], choose from {list(resource_patterns)}')
+        self.name = name
+        self.pageLoadStrategy = pageLoadStrategy
+        self.block = list(block)
+        self.blockUrls = list(blockUrls)
+
+    def __repr__(self):
+        return f'BrowserProfile(name={self.name}, pageLoadStrategy={self.pageLoadStrategy}, block={self.block}, blockUrls={len(self.blockUrls)})'
+
+    @staticmethod
+    def get(name=None):
+        """
+        the profile with name in feed.settings.browser_profiles, or the configured default.
+        an unknown profile falls back to the default.
+        """
+        name = name if name else browser_params['profile']
+        params = browser_profiles.get(name)
+        if params is None:
+            logging.warning(f'BrowserProfile::get: no browser profile=[{name}], using profile=[{browser_params["profile"]}]')
+            name = browser_params['profile']
+            params = browser_profiles.get(name, {})
+        return BrowserProfile(name,
+                              pageLoadStrategy=params.get('page_load_strategy', 'normal'),
+                              block=params.get('block', []),
+                              blockUrls=params.get('block_urls', []))
+
+    @property
+    def blockedPatterns(self) -> list:
+        patterns = []
+        for resource in self.block:
+            patterns.extend(resource_patterns.get(resource))
+        return patterns + self.blockUrls
+
+    def options(self) -> Options:
+        options = Options()
+        options.add_argument("--headless")
+        prefs = {}
+        for resource in self.block:
+            prefs.update(resource_prefs.get(resource, {}))
+        if prefs:
+            options.add_experimental_option('prefs', prefs)
+        return options
+
+    def capabilities(self) -> dict:
+        capabilities = DesiredCapabilities.CHROME.copy()
+        capabilities.update(pageLoadStrategy=self.pageLoadStrategy)
+        return capabilities
+
+    def apply(self, driver) -> bool:
+        """
+        turn on request blocking in a new session of the profile. chromedriver's devtools
+        endpoint is registered on the remote connection as selenium 3 does not have it.
+        :return: whether requests are being blocked
+        """
+        patterns = self.blockedPatterns
+        if not patterns:
+            return True
+        driver.command_executor._commands[BrowserProfile.cdpCommand] = ('POST', '/session/$sessionId/goog/cdp/execute')
+        try:
+            driver.execute(BrowserProfile.cdpCommand, {'cmd': 'Network.enable', 'params': {}})
+            driver.execute(BrowserProfile.cdpCommand, {'cmd': 'Network.setBlockedURLs', 'params': {'urls': patterns}})
+        except WebDriverException as ex:
+            logging.warning(f'BrowserProfile::apply: could not block requests for profile=[{self.name}], error=[{type(ex).__name__}], args=[{ex.args}]')
+            return False
+        logging.info(f'BrowserProfile::apply: blocking {len(patterns)} url patterns for profile=[{self.name}]')
+        return True
@@ -0,0 +1,312 @@
+"""
+record the pages a chain visits with a live browser, and replay them without one.
+
+    recorder = PageRecorder(browserService.driver, 'recordings/donedeal')
+    BrowserActions(driver=recorder, **chainParams).execute(caller)
+
+    BrowserActions(driver=ReplayDriver('recordings/donedeal'), **chainParams).execute(caller)
+
+a recording is a directory of page sources and a manifest.json of
+    {"pages": {id: {"url": url, "file": file}}, "urls": {url: id}, "transitions": {id: {element: id}}}
+where urls are the pages loaded with get, and transitions are the page each click led to,
+with the element clicked identified by elementSignature.
+"""
+import hashlib
+import json
+import logging
+import os
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from selenium.webdriver.common.by import By
+
+from feed.scripts import ELEMENT_SEARCH, NAVIGATION_HOOKS, NAVIGATION_WAIT, PAGE_FINGERPRINT, PAGE_SNAPSHOT
+from feed.fetching import StaticDocument
+from feed.pagecache import normaliseText
+
+
+def elementSignature(element) -> str:
+    """
+    identifies an element between recording and replay, by its tag, class and text.
+    """
+    return f'{element.tag_name}|{element.get_attribute("class") or ""}|{normaliseText(element.text)}'
+
+
+class Recording:
+    """
+    the pages of a recording, see module docstring.
+    :param: path: directory of the recording
+    """
+    manifestFile = 'manifest.json'
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        self.urls = {}
+        self.transitions = {}
+        if os.path.exists(os.path.join(path, Recording.manifestFile)):
+            self.load()
+
+    def load(self):
+        with open(os.path.join(self.path, Recording.manifestFile), 'r') as fh:
+            manifest = json.load(fh)
+        self.pages = manifest.get('pages', {})
+        self.urls = manifest.get('urls', {})
+        self.transitions = manifest.get('transitions', {})
+        logging.info(f'Recording::load: loaded pages=[{len(self.pages)}] from path=[{self.path}]')
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        out = json.dumps(dict(pages=self.pages, urls=self.urls, transitions=self.transitions), indent=4)
+        manifest = os.path.join(self.path, Recording.manifestFile)
+        with open(f'{manifest}.tmp', 'w') as fh:
+            fh.write(out)
+        os.replace(f'{manifest}.tmp', manifest)
+
+    def addPage(self, url, source) -> str:
+        """
+        store the page, once however often it is seen.
+        :return: id of the page
+        """
+        pageId = hashlib.md5(f'{url}\n{source}'.encode('utf-8')).hexdigest()
+        if pageId not in self.pages:
+            file = f'{len(self.pages):04d}.html'
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, file), 'w', encoding='utf-8') as fh:
+                fh.write(source)
+            self.pages.update({pageId: dict(url=url, file=file)})
+            self.save()
+        return pageId
+
+    def addUrl(self, url, pageId):
+        if url not in self.urls:
+            self.urls.update({url: pageId})
+            self.save()
+
+    def addTransition(self, fromPage, signature, toPage):
+        self.transitions.setdefault(fromPage, {}).update({signature: toPage})
+        self.save()
+
+    def source(self, pageId) -> str:
+        with open(os.path.join(self.path, self.pages.get(pageId).get('file')), 'r', encoding='utf-8') as fh:
+            return fh.read()
+
+    def sources(self) -> dict:
+        """
+        file name to source of each page, eg. for feed.benchmarks.benchmarkParsers
+        """
+        return {page.get('file'): self.source(pageId) for pageId, page in self.pages.items()}
+
+
+class RecordingElement:
+    """
+    a WebElement of the browser being recorded, recording where clicking it leads.
+    """
+    def __init__(self, element, recorder):
+        self._element = element
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self._element, name)
+
+    def click(self):
+        self._recorder._beforeClick(self._element)
+        return self._element.click()
+
+    def find_element_by_link_text(self, text):
+        return RecordingElement(self._element.find_element_by_link_text(text), self._recorder)
+
+
+class PageRecorder:
+    """
+    Wraps a WebDriver, storing the pages it loads, the page sources BrowserActions take and
+    the page each click leads to in a Recording, to be served by ReplayDriver later.
+    :param: driver: the live driver
+    :param: path: directory to record to
+    """
+    def __init__(self, driver, path):
+        self._driver = driver
+        self.recording = Recording(path)
+        self._page = None # id of the page last recorded
+        self._clicked = None # (page, element signature) of a click whose page is not recorded yet
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def _wrap(self, elements):
+        return [RecordingElement(element, self) for element in elements]
+
+    def _addPage(self, url, source):
+        self._page = self.recording.addPage(url, source)
+        if self._clicked is not None:
+            fromPage, signature = self._clicked
+            self._clicked = None
+            if fromPage != self._page:
+                self.recording.addTransition(fromPage, signature, self._page)
+        return self._page
+
+    def _snapshot(self):
+        url, _, source = self._driver.execute_script(PAGE_SNAPSHOT)
+        return self._addPage(url, source)
+
+    def _beforeClick(self, element):
+        self._clicked = (self._snapshot(), elementSignature(element))
+
+    def get(self, url):
+        self._driver.get(url)
+        self.recording.addUrl(url, self._snapshot())
+
+    def execute_script(self, script, *args):
+        ret = self._driver.execute_script(script, *args)
+        if script is PAGE_SNAPSHOT:
+            self._addPage(ret[0], ret[2])
+        elif script is ELEMENT_SEARCH:
+            for _, items in ret:
+                for item in items:
+                    if item.get('element') is not None:
+                        item.update(element=RecordingElement(item.get('element'), self))
+        return ret
+
+    def find_elements(self, by, value):
+        return self._wrap(self._driver.find_elements(by, value))
+
+    def find_elements_by_class_name(self, name):
+        return self._wrap(self._driver.find_elements_by_class_name(name))
+
+    def find_elements_by_css_selector(self, selector):
+        return self._wrap(self._driver.find_elements_by_css_selector(selector))
+
+    def find_elements_by_xpath(self, xpath):
+        return self._wrap(self._driver.find_elements_by_xpath(xpath))
+
+
+class ReplayElement:
+    """
+    an element of a replayed page. Clicking it moves the driver to the page the same click
+    led to when recorded.
+    """
+    def __init__(self, element, driver):
+        self._element = element
+        self._driver = driver
+        self.tag_name = element.tag_name
+        self.text = element.text
+
+    def get_attribute(self, name):
+        return self._element.get_attribute(name)
+
+    def click(self):
+        self._driver._click(elementSignature(self))
+
+    def send_keys(self, *keys):
+        logging.debug(f'ReplayElement::send_keys: ignoring keys for element=[{elementSignature(self)}]')
+
+    def find_element_by_link_text(self, text):
+        if self._element.link is not None and self.text == text:
+            return self
+        raise NoSuchElementException(f'no link with text=[{text}] in replayed element')
+
+    def __str__(self):
+        return elementSignature(self)
+
+
+class ReplayDriver:
+    """
+    Serves a Recording through the parts of the WebDriver interface BrowserActions use. Pages
+    are searched as StaticDocuments, so search, click and the page cache run as they would
+    in the browser, without one.
+    :param: path: directory of the recording
+    """
+    def __init__(self, path):
+        self.recording = Recording(path)
+        self._page = None
+        self._document = None # type: StaticDocument
+        self._visits = 0 # changes of page, the navigation marker
+        self.clicks = 0
+        self.missedClicks = 0
+
+    def _show(self, pageId):
+        page = self.recording.pages.get(pageId)
+        self._page = pageId
+        self._document = StaticDocument(page.get('url'), self.recording.source(pageId))
+        self._visits += 1
+
+    @property
+    def document(self) -> StaticDocument:
+        if self._document is None:
+            raise WebDriverException('no page has been loaded in the replay driver')
+        return self._document
+
+    @property
+    def current_url(self):
+        return self.document.current_url
+
+    @property
+    def page_source(self):
+        return self.document.page_source
+
+    def get(self, url):
+        pageId = self.recording.urls.get(url)
+        if pageId is None:
+            raise WebDriverException(f'url=[{url}] is not in the recording')
+        self._show(pageId)
+
+    def _click(self, signature):
+        self.clicks += 1
+        pageId = self.recording.transitions.get(self._page, {}).get(signature)
+        if pageId is None:
+            self.missedClicks += 1
+            logging.info(f'ReplayDriver::_click: click on element=[{signature}] was not recorded to go anywhere, url=[{self.current_url}]')
+            return
+        self._show(pageId)
+
+    def execute_script(self, script, *args):
+        if script is PAGE_FINGERPRINT:
+            return [self.current_url, f'{self._page}:{self._visits}']
+        if script is PAGE_SNAPSHOT:
+            return [self.current_url, f'{self._page}:{self._visits}', self.page_source]
+        if script is NAVIGATION_HOOKS:
+            return [self.current_url, str(self._visits)]
+        if script is ELEMENT_SEARCH:
+            results = self.document.search(*args)
+            for _, items in results:
+                for item in items:
+                    if item.get('element') is not None:
+                        item.update(element=ReplayElement(item.get('element'), self))
+            return results
+        raise WebDriverException('script can not be replayed')
+
+    def execute_async_script(self, script, *args):
+        if script is NAVIGATION_WAIT:
+            fromUrl, marker = args[0], args[1]
+            return dict(url=self.current_url, navigated=self.current_url != fromUrl or str(self._visits) != marker, ready=True, idle=True)
+        raise WebDriverException('script can not be replayed')
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def find_elements(self, by, value):
+        if by == By.CSS_SELECTOR:
+            kind, selector = 'css', value
+        elif by == By.XPATH:
+            kind, selector = 'xpath', value
+        elif by == By.CLASS_NAME:
+            kind, selector = 'css', f'.{value}'
+        elif by == By.LINK_TEXT:
+            return [element for element in self.find_elements(By.CSS_SELECTOR, 'a[href]') if element.text == value]
+        else:
+            raise WebDriverException(f'can not find elements by=[{by}] in a replay')
+        results = self.document.search([[kind, selector]], False, None, True)
+        return [ReplayElement(item.get('element'), self) for _, items in results for item in items]
+
+    def find_elements_by_class_name(self, name):
+        return self.find_elements(By.CLASS_NAME, name)
+
+    def find_elements_by_css_selector(self, selector):
+        return self.find_elements(By.CSS_SELECTOR, selector)
+
+    def find_elements_by_xpath(self, xpath):
+        return self.find_elements(By.XPATH, xpath)
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
@@ -0,0 +1,145 @@
+"""
+javascript snippets executed in the remote browser with `WebDriver.execute_script`.
+
+they are kept here so that anything which has to stand in for a browser can recognise
+them by identity.
+"""
+
+# install a mutation counter on the document if there is not one already. The
+# fingerprint changes whenever the document is replaced or mutated.
+_INSTALL_FINGERPRINT = """
+if (!window.__feedSnapshot) {
+    var state = {id: Math.random().toString(36).slice(2), mutations: 0};
+    new MutationObserver(function (records) { state.mutations += records.length; })
+        .observe(document.documentElement, {subtree: true, childList: true, attributes: true, characterData: true});
+    window.__feedSnapshot = state;
+}
+var fingerprint = window.__feedSnapshot.id + ':' + window.__feedSnapshot.mutations;
+"""
+
+# returns [url, fingerprint]
+PAGE_FINGERPRINT = _INSTALL_FINGERPRINT + """
+return [document.URL, fingerprint];
+"""
+
+# returns [url, fingerprint, source], the page source is fetched in the same round trip.
+PAGE_SNAPSHOT = _INSTALL_FINGERPRINT + """
+return [document.URL, fingerprint, document.documentElement.outerHTML];
+"""
+
+# arguments: strategies [[kind, selector], ...] with kind 'css' or 'xpath', isSingle,
+# attribute, withElements. Runs each strategy in order until one finds a single element
+# (or any elements if not isSingle) and returns [[kind, items], ...] for the strategies
+# run, where each item is {class, text, attr, element}. element is only included
+# when withElements is set, as it is then a WebElement to act on.
+ELEMENT_SEARCH = """
+var strategies = arguments[0], isSingle = arguments[1], attribute = arguments[2], withElements = arguments[3];
+function byCss(selector) {
+    return Array.prototype.slice.call(document.querySelectorAll(selector));
+}
+function byXpath(selector) {
+    var found = document.evaluate(selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var out = [];
+    for (var i = 0; i < found.snapshotLength; i++) {
+        out.push(found.snapshotItem(i));
+    }
+    return out;
+}
+function describe(element) {
+    var item = {
+        'class': element.getAttribute('class'),
+        'text': (element.innerText || element.textContent || '').trim(),
+        'attr': attribute ? element.getAttribute(attribute) : null
+    };
+    if (withElements) {
+        item['element'] = element;
+    }
+    return item;
+}
+var finders = {'css': byCss, 'xpath': byXpath};
+var results = [];
+for (var i = 0; i < strategies.length; i++) {
+    var kind = strategies[i][0];
+    var elements = [];
+    try {
+        elements = finders[kind](strategies[i][1]);
+    } catch (e) {
+        elements = []; // invalid selector, same as nothing found
+    }
+    elements = elements.filter(function (node) { return node.nodeType === 1; });
+    results.push([kind, elements.map(describe)]);
+    if (elements.length > 0 && (!isSingle || elements.length === 1)) {
+        break;
+    }
+}
+return results;
+"""
+
+# install counters of in flight XMLHttpRequest and fetch calls on the document, if there
+# are none already, and return [url, marker]. A different marker after a click means the
+# document was replaced.
+NAVIGATION_HOOKS = """
+if (!window.__feedNetwork) {
+    var network = {pending: 0, lastActivity: Date.now(), marker: Math.random().toString(36).slice(2)};
+    var started = function () { network.pending += 1; network.lastActivity = Date.now(); };
+    var finished = function () { network.pending = Math.max(0, network.pending - 1); network.lastActivity = Date.now(); };
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        started();
+        this.addEventListener('loadend', finished);
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            started();
+            return fetch.apply(this, arguments).then(
+                function (response) { finished(); return response; },
+                function (error) { finished(); throw error; });
+        };
+    }
+    window.__feedNetwork = network;
+}
+window.__feedNetwork.lastActivity = Date.now(); // the idle period starts from being armed
+return [document.URL, window.__feedNetwork.marker];
+"""
+
+# async. arguments: fromUrl, marker, idleMs, timeoutMs. Resolves with
+# {url, navigated, ready, idle} once the document is complete and there has been no
+# network activity for idleMs, or when timeoutMs has passed. A document without the
+# hooks of NAVIGATION_HOOKS is a new one, and is idle once it is complete.
+NAVIGATION_WAIT = """
+var fromUrl = arguments[0], marker = arguments[1], idleMs = arguments[2], timeoutMs = arguments[3];
+var done = arguments[arguments.length - 1];
+var start = Date.now();
+function state() {
+    var network = window.__feedNetwork;
+    return {
+        'url': document.URL,
+        'navigated': document.URL !== fromUrl || !network || network.marker !== marker,
+        'ready': document.readyState === 'complete',
+        'idle': !network || (network.pending === 0 && Date.now() - network.lastActivity >= idleMs)
+    };
+}
+(function poll() {
+    var current = state();
+    if ((current.ready && current.idle) || Date.now() - start >= timeoutMs) {
+        done(current);
+    } else {
+        setTimeout(poll, 50);
+    }
+})();
+"""
+
+# arguments: fromUrl, marker, idleMs. the state NAVIGATION_WAIT resolves with, now, for
+# waits which poll rather than hold the session with an async script, see feed.navigation.
+NAVIGATION_STATE = """
+var fromUrl = arguments[0], marker = arguments[1], idleMs = arguments[2];
+var network = window.__feedNetwork;
+return {
+    'url': document.URL,
+    'navigated': document.URL !== fromUrl || !network || network.marker !== marker,
+    'ready': document.readyState === 'complete',
+    'idle': !network || (network.pending === 0 && Date.now() - network.lastActivity >= idleMs)
+};
+"""
@@ -1,4 +1,5 @@
 import os
+import json
 
 # service params
 
@@ -12,7 +13,102 @@ browser_params = {
     "image": os.getenv('BROWSER_IMAGE', 'selenium/standalone-chrome:3.141.59'),
     "port": os.getenv('BROWSER_PORT', 4444),
     "max": os.getenv("MAX_FEEDS", 10),
-    "base_port": os.getenv("BROWSER_BASE_PORT", 4444)
+    "base_port": os.getenv("BROWSER_BASE_PORT", 4444),
+    "sessions": int(os.getenv("BROWSER_SESSIONS", 1)), # webdriver sessions a runner may hold against the hub
+    "session_max_uses": int(os.getenv("BROWSER_SESSION_MAX_USES", 0)), # checkouts before a session is recycled, 0 for no limit
+    "session_max_age": float(os.getenv("BROWSER_SESSION_MAX_AGE", 0)), # seconds before a session is recycled, 0 for no limit
+    "checkout_timeout": float(os.getenv("BROWSER_CHECKOUT_TIMEOUT", 300)), # seconds to wait for a free session
+    "standby": int(os.getenv("BROWSER_STANDBY", 0)), # sessions started in the background to replace unhealthy or recycled ones
+    "standby_retry": float(os.getenv("BROWSER_STANDBY_RETRY", 5)), # seconds before starting a standby session again after it failed to start
+    "health_idle": float(os.getenv("BROWSER_HEALTH_IDLE", 30)), # seconds a session is idle before its health is checked with a round trip
+    "tabs": int(os.getenv("BROWSER_TABS", 4)), # windows a session runs chains in at once, see feed.tabs.SessionTabs
+    "profile": os.getenv("BROWSER_PROFILE", "default") # see browser_profiles, chains choose another with browserProfile
+}
+
+# page_load_strategy is normal, eager (until DOMContentLoaded) or none. block is any of
+# feed.profiles.resource_patterns, block_urls are url patterns with * wildcards.
+# more profiles can be given as json in BROWSER_PROFILES.
+browser_profiles = {
+    "default": {"page_load_strategy": "normal", "block": [], "block_urls": []},
+    "text": {"page_load_strategy": "eager", "block": ["images", "media", "fonts", "stylesheets"], "block_urls": []},
+    "lean": {"page_load_strategy": "eager", "block": ["images", "media", "fonts", "stylesheets"],
+             "block_urls": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*", "*hotjar.com*"]},
+    **json.loads(os.getenv("BROWSER_PROFILES", "{}"))
+}
+
+
+worker_params = {
+    "workers": int(os.getenv("WORKERS", 1)), # threads of feed.workers.ChainWorkers, each with a driver of its own
+    "processes": int(os.getenv("WORKER_PROCESSES", 1)), # processes of feed.workers.runProcesses
+    "group_id": os.getenv("KAFKA_GROUP_ID"), # consumer group the partitions of the topics are shared out in
+    "poll_timeout": float(os.getenv("WORKER_POLL_TIMEOUT", 1)), # seconds a worker without chains to repeat waits for messages
+    "max_records": int(os.getenv("WORKER_MAX_RECORDS", 1)), # messages a worker takes at once
+    "tabs": os.getenv("WORKER_TABS", "1") == "1" # run a worker's chains in tabs of its session, see feed.tabs
+}
+
+
+chain_pool_params = {
+    "size": int(os.getenv("CHAIN_POOL_SIZE", 0)), # chains kept to run messages of the same definition, 0 constructs one per message
+    "routing_session_ttl": float(os.getenv("ROUTING_SESSION_TTL", 0)) # seconds a pooled chain takes its router session to be live after it was initialised, 0 initialises it for every message
+}
+
+record_params = {
+    "detach_returns": os.getenv("DETACH_RETURNS", "0") == "1" # returns keep captured html as markup rather than bs4 Tags, see BrowserActions.Return
+}
+
+
+error_report_params = {
+    "ttl": float(os.getenv("ERROR_REPORT_TTL", 10)), # seconds the error reports of a chain are kept before asking nanny again
+    "batch": os.getenv("ERROR_REPORT_BATCH", "1") == "1" # ask for the reports of all the positions of a chain at once
+}
+
+
+dispatch_params = {
+    "threads": int(os.getenv("CALLBACK_THREADS", 0)), # threads on<ActionType>Callbacks run on, 0 runs them on the chain's thread
+    "queue_size": int(os.getenv("CALLBACK_QUEUE_SIZE", 100)) # callbacks waiting on a thread before chains wait for them
+}
+
+
+aio_params = {
+    "concurrency": int(os.getenv("AIO_CONCURRENCY", 8)), # chains feed.aio.AsyncActionChainRunner runs at once
+    "threads": int(os.getenv("AIO_THREADS", 16)), # threads blocking calls are run on, each running chain holds one
+    "poll_timeout": float(os.getenv("AIO_POLL_TIMEOUT", 1)) # seconds each poll of the subscription waits for messages
+}
+
+
+selenium_params = {
+    "script": os.getenv("SELENIUM_PROCESS_SCRIPT", "/opt/bin/start-selenium-standalone.sh"), # started when START_BROWSER is set
+    "ready_pattern": os.getenv("SELENIUM_READY_PATTERN", "Selenium Server is up and running|Started Selenium"), # log line once sessions are accepted
+    "start_timeout": float(os.getenv("SELENIUM_START_TIMEOUT", 60)), # seconds to wait for selenium to be ready
+    "status_interval": float(os.getenv("SELENIUM_STATUS_INTERVAL", 0.5)), # seconds between hub status requests while starting
+    "restarts": int(os.getenv("SELENIUM_RESTARTS", 5)), # times a crashed process is restarted in a row
+    "restart_wait": float(os.getenv("SELENIUM_RESTART_WAIT", 5)) # seconds before restarting a crashed process
+}
+
+
+parser_params = {
+    "backend": os.getenv("HTML_PARSER", "lxml") # see feed.parsers, falls back to html.parser if not installed
+}
+
+
+navigation_params = {
+    "timeout": float(os.getenv("NAVIGATION_TIMEOUT", 5)), # seconds to wait for a click to settle
+    "idle": float(os.getenv("NAVIGATION_IDLE", 0.25)), # seconds without network activity for a page to have settled
+    "domain_timeouts": json.loads(os.getenv("NAVIGATION_DOMAIN_TIMEOUTS", "{}")) # eg. {"www.donedeal.co.uk": 8}
+}
+
+
+strategy_params = {
+    "path": os.getenv("STRATEGY_STATS_PATH"), # json file to keep search strategy statistics in between runs
+    "save_every": int(os.getenv("STRATEGY_STATS_SAVE_EVERY", 50)) # save after this many new results
+}
+
+
+fetch_params = {
+    "mode": os.getenv("FETCH_MODE", "browser"), # browser, http or auto, see feed.fetching.HttpActions
+    "timeout": float(os.getenv("FETCH_TIMEOUT", 10)), # seconds to wait for a page fetched over http
+    "pool_size": int(os.getenv("FETCH_POOL_SIZE", 10)), # connections kept alive per host
+    "user_agent": os.getenv("FETCH_USER_AGENT", "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/90.0.4430.93 Safari/537.36")
 }
 
 
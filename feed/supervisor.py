@@ -0,0 +1,194 @@
+import logging
+import os
+import re
+import shlex
+import signal
+import subprocess
+import threading
+from queue import Queue, Empty
+from time import time
+import requests
+
+from feed.settings import selenium_params
+
+
+class SeleniumSupervisor:
+    """
+    Runs the selenium standalone process and keeps it running.
+
+    The process's output is pumped to the log by a thread of its own, so a quiet process does
+    not hold up commands and a chatty one is not slowed down. The supervising thread only
+    waits on its command queue: commands (stop, restart) and the process exiting are handled
+    as soon as they arrive. Until the process is ready, which is when its log says so or the
+    hub's status endpoint does, the status endpoint is polled every statusInterval seconds.
+
+    A process which exits without being told to is restarted, up to restarts times in a row,
+    restartWait seconds apart. Reaching ready again resets the count.
+
+    :param: command: script starting selenium, a path or a list of arguments
+    :param: statusUrl: status endpoint of the hub, eg. http://localhost:4444/wd/hub/status
+    :param: readyPattern: regex matching the log line selenium prints once it is accepting sessions
+    :param: statusInterval: seconds between status requests while starting
+    :param: restarts: times a crashed process is restarted before giving up
+    :param: restartWait: seconds to wait before restarting a crashed process
+    """
+    STOP = 'STOP'
+    RESTART = 'RESTART'
+    EXITED = 'EXITED'
+
+    def __init__(self, command=None, statusUrl=None, readyPattern=None, statusInterval=None, restarts=None, restartWait=None):
+        command = command if command is not None else selenium_params['script']
+        self.command = shlex.split(command) if isinstance(command, str) else list(command)
+        self.statusUrl = statusUrl
+        self.readyPattern = re.compile(readyPattern if readyPattern is not None else selenium_params['ready_pattern'])
+        self.statusInterval = statusInterval if statusInterval is not None else selenium_params['status_interval']
+        self.restarts = restarts if restarts is not None else selenium_params['restarts']
+        self.restartWait = restartWait if restartWait is not None else selenium_params['restart_wait']
+        self.commands = Queue()
+        self.process = None # type: subprocess.Popen
+        self.starts = 0
+        self.crashes = 0
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.logger = logging.getLogger('crawling.SeleniumProcessLogger')
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None else None
+
+    def start(self):
+        """
+        start the process and supervise it in the background.
+        """
+        self._thread = threading.Thread(target=self._supervise, name='SeleniumSupervisor', daemon=True)
+        self._thread.start()
+        return self
+
+    def waitUntilReady(self, timeout=None) -> bool:
+        """
+        wait for selenium to accept sessions.
+        :return: whether it does, False on timeout or if the supervisor has stopped
+        """
+        deadline = time() + timeout if timeout is not None else None
+        while not self._ready.is_set() and not self._stopped.is_set():
+            remaining = deadline - time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            self._ready.wait(min(remaining, 0.1) if remaining is not None else 0.1)
+        return self._ready.is_set()
+
+    def restart(self):
+        self.commands.put(SeleniumSupervisor.RESTART)
+
+    def stop(self, timeout=None):
+        """
+        terminate the process and stop supervising, waiting up to timeout seconds for both.
+        """
+        self.commands.put(SeleniumSupervisor.STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _launch(self):
+        self._ready.clear()
+        self.starts += 1
+        # a session of its own so the whole process group, selenium and the browsers it
+        # starts, can be signalled and none are left behind
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=1,
+                                        universal_newlines=True, start_new_session=True)
+        self.logger.info(f'SeleniumSupervisor::_launch: started process=[{self.process.pid}], starts=[{self.starts}]')
+        threading.Thread(target=self._pump, args=(self.process,), name='SeleniumLogPump', daemon=True).start()
+
+    def _pump(self, process: subprocess.Popen):
+        """
+        forward the output of process to the log until it closes, then tell the supervisor it has exited.
+        """
+        for line in process.stdout:
+            line = line.rstrip()
+            self.logger.info(f'SeleniumSupervisor:: {line}')
+            if not self._ready.is_set() and process is self.process and self.readyPattern.search(line):
+                self._onReady('log')
+        process.wait()
+        self.commands.put((SeleniumSupervisor.EXITED, process))
+
+    def _onReady(self, source):
+        self.crashes = 0
+        self._ready.set()
+        self.logger.info(f'SeleniumSupervisor::_onReady: selenium is ready, process=[{self.pid}], from=[{source}]')
+
+    def _statusReady(self) -> bool:
+        if not self.statusUrl:
+            return False
+        try:
+            response = requests.get(self.statusUrl, timeout=self.statusInterval)
+            return response.ok and response.json().get('value', {}).get('ready', False)
+        except (requests.RequestException, ValueError, AttributeError):
+            return False
+
+    def _terminate(self, process: subprocess.Popen, grace=5):
+        if process is None or process.poll() is not None:
+            return
+        self.logger.info(f'SeleniumSupervisor::_terminate: killing process=[{process.pid}]')
+        for sig, wait in ((signal.SIGTERM, grace), (signal.SIGKILL, None)):
+            try:
+                os.killpg(process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                process.send_signal(sig)
+            try:
+                process.wait(wait)
+                return
+            except subprocess.TimeoutExpired:
+                continue
+
+    def _supervise(self):
+        restartAt = None
+        try:
+            self._launch()
+            while True:
+                if restartAt is not None:
+                    timeout = max(0, restartAt - time())
+                elif not self._ready.is_set():
+                    timeout = self.statusInterval
+                else:
+                    timeout = None
+                try:
+                    command = self.commands.get(timeout=timeout)
+                except Empty:
+                    if restartAt is not None and time() >= restartAt:
+                        restartAt = None
+                        self._launch()
+                    elif not self._ready.is_set() and self._statusReady():
+                        self._onReady('status')
+                    continue
+                if command == SeleniumSupervisor.STOP:
+                    self._terminate(self.process)
+                    break
+                if command == SeleniumSupervisor.RESTART:
+                    self.logger.info(f'SeleniumSupervisor::_supervise: restarting process=[{self.pid}]')
+                    self._ready.clear()
+                    self._terminate(self.process)
+                    restartAt = None
+                    self._launch()
+                    continue
+                _, process = command
+                if process is not self.process:
+                    # a process which was terminated to restart it
+                    continue
+                self._ready.clear()
+                self.crashes += 1
+                if self.crashes > self.restarts:
+                    self.logger.error(f'SeleniumSupervisor::_supervise: process=[{process.pid}] exited with code=[{process.returncode}], restarted {self.restarts} times, giving up')
+                    break
+                self.logger.warning(f'SeleniumSupervisor::_supervise: process=[{process.pid}] exited with code=[{process.returncode}], restarting in {self.restartWait}s, crashes=[{self.crashes}]')
+                restartAt = time() + self.restartWait
+        except Exception:
+            self.logger.exception('SeleniumSupervisor::_supervise: supervisor failed')
+            self._terminate(self.process)
+        finally:
+            self._ready.clear()
+            self._stopped.set()
+            self.logger.info(f'SeleniumSupervisor::_supervise: browser process {self.pid} has been torn down.')
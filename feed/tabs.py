@@ -0,0 +1,168 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.mobile import Mobile
+from selenium.webdriver.remote.switch_to import SwitchTo
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from feed.settings import browser_params
+
+
+class TabDriver(WebDriver):
+    """
+    A webdriver bound to one window of a shared session. It shares the session rather than
+    starting one, and every command, its own and those of the elements it finds, switches to
+    its window first while holding the session's lock. Chains given a TabDriver keep their
+    own page, soup and current url as they would with a session of their own.
+    :param: tabs: the SessionTabs of the session
+    :param: handle: handle of the window
+    """
+    def __init__(self, tabs, handle):
+        self.__dict__.update(tabs.driver.__dict__)
+        self._switch_to = SwitchTo(self)
+        self._mobile = Mobile(self)
+        self.tabs = tabs
+        self.handle = handle
+
+    def __repr__(self):
+        return f'TabDriver(session={self.session_id}, handle={self.handle})'
+
+    def execute(self, driver_command, params=None):
+        with self.tabs.lock:
+            self.tabs._switch(self.handle)
+            return super().execute(driver_command, params)
+
+    def quit(self):
+        """
+        close the window, the session belongs to whoever opened it.
+        """
+        self.tabs.close(self)
+
+
+class SessionTabs:
+    """
+    The windows of one webdriver session, shared by chains running at the same time, each
+    in a window of its own. A headless browser holds many windows for much less than a
+    browser each, so this gives concurrency without a session per chain.
+
+    chromedriver runs a session's commands one at a time, so only one tab's command is in
+    flight at once, and a tab holds the session for the whole of a command. That includes
+    get, which returns once the page has loaded, so page loads of tabs do not overlap,
+    less of a cost with a page load strategy of eager or none. The tabs overlap in the time
+    chains spend between commands, and in waiting on a page to settle after a click, as
+    feed.navigation.NavigationWaiter polls a tab rather than holding it.
+    driver itself is on whichever window was used last while there are tabs, so should not be
+    used until they are closed.
+
+        tabs = SessionTabs(driver)
+        with tabs.tab() as driver:
+            BrowserActions(driver=driver, **params).execute(caller)
+
+    chromedriver sends devtools commands to the window the session is on, and each window
+    is a devtools target of its own, so the request blocking of the session's browser profile
+    does not reach windows opened later. open applies the profile to each tab.
+
+    :param: driver: the session
+    :param: maxTabs: windows open at once, open waits for one to close, 0 for no limit
+    :param: profile: feed.profiles.BrowserProfile the session was started with
+    """
+    def __init__(self, driver: WebDriver, maxTabs=None, profile=None):
+        self.driver = driver
+        self.maxTabs = maxTabs if maxTabs is not None else browser_params['tabs']
+        self.profile = profile
+        self.lock = threading.RLock()
+        self.home = None # handle of the window the session was on before the first tab
+        self.active = None # handle of the window the session is on
+        self.tabs = {} # handle: TabDriver
+        self._slots = threading.BoundedSemaphore(self.maxTabs) if self.maxTabs else None
+
+    def _switch(self, handle):
+        if self.active != handle:
+            self._execute(Command.SWITCH_TO_WINDOW, {'handle': handle, 'name': handle})
+            self.active = handle
+
+    def _execute(self, command, params=None):
+        return WebDriver.execute(self.driver, command, params)['value']
+
+    def open(self) -> TabDriver:
+        """
+        open a window for a tab, waiting for one to close if there are maxTabs.
+        """
+        if self._slots is not None:
+            self._slots.acquire()
+        w3c = self.driver.w3c
+        try:
+            with self.lock:
+                if self.home is None:
+                    self.home = self._execute(Command.W3C_GET_CURRENT_WINDOW_HANDLE if w3c else Command.GET_CURRENT_WINDOW_HANDLE)
+                    self.active = self.home
+                handles = self._execute(Command.W3C_GET_WINDOW_HANDLES if w3c else Command.GET_WINDOW_HANDLES)
+                self._execute(Command.W3C_EXECUTE_SCRIPT if w3c else Command.EXECUTE_SCRIPT, {'script': 'window.open("about:blank", "_blank")', 'args': []})
+                opened = self._execute(Command.W3C_GET_WINDOW_HANDLES if w3c else Command.GET_WINDOW_HANDLES)
+                handle = [handle for handle in opened if handle not in handles][0]
+                tab = TabDriver(self, handle)
+                self.tabs[handle] = tab
+        except Exception:
+            if self._slots is not None:
+                self._slots.release()
+            raise
+        if self.profile is not None:
+            self.profile.apply(tab)
+        logging.info(f'SessionTabs::open: opened tab=[{handle}], tabs=[{len(self.tabs)}]')
+        return tab
+
+    def close(self, tab: TabDriver):
+        """
+        close the tab's window, the session is left on the window it was on before the first tab.
+        """
+        with self.lock:
+            if self.tabs.pop(tab.handle, None) is None:
+                return
+            try:
+                self._switch(tab.handle)
+                self._execute(Command.CLOSE)
+                self.active = None
+                if not self.tabs:
+                    self._switch(self.home)
+            except Exception as ex:
+                logging.warning(f'SessionTabs::close: could not close tab=[{tab.handle}], error=[{type(ex).__name__}]')
+            finally:
+                if self._slots is not None:
+                    self._slots.release()
+        logging.info(f'SessionTabs::close: closed tab=[{tab.handle}], tabs=[{len(self.tabs)}]')
+
+    @contextmanager
+    def tab(self):
+        """
+        a tab for the block.
+        """
+        tab = self.open()
+        try:
+            yield tab
+        finally:
+            self.close(tab)
+
+    def _runChain(self, caller, implementation, params):
+        with self.tab() as driver:
+            chain = implementation(driver=driver, **params)
+            if not chain.shouldRun():
+                logging.info(f'SessionTabs::_runChain: skipping {chain.name}.')
+                return chain
+            ret = chain.execute(caller)
+            caller.onChainEndCallback(chain, ret)
+            return chain
+
+    def runChains(self, caller, implementation, chainsParams) -> list:
+        """
+        run chains at the same time, each in a tab of its own. The caller's callbacks are
+        called from the tabs' threads.
+        :param: implementation: ActionChain class taking driver
+        :param: chainsParams: parameters of each chain
+        :return: the chains, in the order of chainsParams
+        """
+        workers = min(len(chainsParams), self.maxTabs) if self.maxTabs else len(chainsParams)
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='SessionTab') as executor:
+            futures = [executor.submit(self._runChain, caller, implementation, params) for params in chainsParams]
+            return [future.result() for future in futures]
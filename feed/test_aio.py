@@ -0,0 +1,114 @@
+from unittest import TestCase, mock
+import asyncio
+import threading
+import unittest
+from queue import Queue
+from time import sleep, time
+
+from feed.aio import AsyncActionChainRunner, AsyncClient
+
+
+class Chain:
+    """
+    a chain which waits on its page for a while each run, and captures its name. With
+    waitFor, its repeats wait for that chain to have been captured.
+    """
+    captured = {}
+
+    def __init__(self, driver, name, repeats=1, wait=0.2, waitFor=None, **kwargs):
+        self.driver = driver
+        self.name = name
+        self.remaining = repeats
+        self.repeating = repeats > 1
+        self.wait = wait
+        self.waitFor = waitFor
+        self.isSample = False
+
+    def shouldRun(self):
+        return self.remaining > 0
+
+    def execute(self, caller, initialise=True):
+        self.remaining -= 1
+        if self.waitFor is not None and not initialise:
+            Chain.captured[self.waitFor].wait(5)
+        sleep(self.wait)
+        caller.onCaptureActionCallback(self.name, chain=self)
+
+
+class Runner(AsyncActionChainRunner):
+    def __init__(self, expected, **kwargs):
+        super().__init__(Chain, **kwargs)
+        self.messages = Queue()
+        self.captured = []
+        self.ended = []
+        self.expected = expected
+
+    def subscription(self):
+        while True:
+            yield self.messages.get()
+
+    async def onCaptureActionCallback(self, item, *args, **kwargs):
+        await asyncio.sleep(0)
+        self.captured.append(item)
+        if item in Chain.captured:
+            Chain.captured[item].set()
+
+    def onChainEndCallback(self, chain, chainReturn):
+        self.ended.append(chain.name)
+        if len(self.ended) == self.expected:
+            self.stop()
+
+    def cleanUp(self):
+        pass
+
+
+class TestAsyncActionChainRunner(TestCase):
+
+    def run_runner(self, runner, messages):
+        for message in messages:
+            runner.messages.put(message)
+        start = time()
+        with mock.patch('feed.aio.aio_params', dict(concurrency=8, threads=8, poll_timeout=0.05)):
+            runner.main()
+        return time() - start
+
+    def test_chains_run_at_once(self):
+        runner = Runner(expected=4, concurrency=4)
+        seconds = self.run_runner(runner, [(dict(name=f'chain{i}'), 'leader-route') for i in range(4)])
+        self.assertEqual(sorted(runner.captured), [f'chain{i}' for i in range(4)])
+        self.assertLess(seconds, 0.2 * 4)
+
+    def test_repeating_chain_takes_turns(self):
+        Chain.captured = {'once': threading.Event()}
+        runner = Runner(expected=4, concurrency=2)
+        messages = [(dict(name='repeating', repeats=3, wait=0, waitFor='once'), 'leader-route'), (dict(name='once', wait=0), 'leader-route')]
+        self.run_runner(runner, messages)
+        # the repeats waited on the other chain, which could only run alongside them
+        self.assertEqual(sorted(runner.captured[:2]), ['once', 'repeating'])
+        self.assertEqual(runner.captured[2:], ['repeating', 'repeating'])
+
+    def test_a_thread_for_each_running_chain(self):
+        runner = Runner(expected=1, concurrency=4, threads=2)
+        self.assertEqual(runner.executor._max_workers, 5)
+
+    def test_chains_sharing_a_driver_run_one_at_a_time(self):
+        runner = Runner(expected=2, concurrency=4)
+        runner.driver = 'driver'
+        seconds = self.run_runner(runner, [(dict(name=f'chain{i}'), 'leader-route') for i in range(2)])
+        self.assertGreaterEqual(seconds, 0.2 * 2)
+
+
+class TestAsyncClient(TestCase):
+
+    def test_get(self):
+        client = mock.Mock()
+        client.get.return_value = {'errors': []}
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        result = loop.run_until_complete(AsyncClient(client).get('/actionsmanager/findActionErrorReports/cars/0', resp=True))
+        self.assertEqual(result, {'errors': []})
+        client.get.assert_called_with('/actionsmanager/findActionErrorReports/cars/0', payload=None, resp=True, error=None)
+
+
+if __name__ == '__main__':
+    unittest.main()
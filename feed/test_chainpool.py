@@ -0,0 +1,118 @@
+from unittest import TestCase, mock
+import tempfile
+import unittest
+
+from feed.actionchains import ActionChainRunner, ChainPool
+from feed.crawling import BrowserActions
+from feed.replay import Recording, ReplayDriver
+
+
+page = '<html><body><span class="title">{}</span><span class="title">{}</span></body></html>'
+capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+
+
+def chainParams(startUrl, data=None, css='.title'):
+    return dict(name='cars', startUrl=startUrl, isRepeating=False, userID='user', actions=[dict(capture, css=css, data=data)])
+
+
+class Caller(ActionChainRunner):
+    def __init__(self):
+        super().__init__(BrowserActions)
+        self.captured = []
+
+    def onCaptureActionCallback(self, item, *args, **kwargs):
+        self.captured.append(item.data)
+
+
+class TestChainPool(TestCase):
+
+    def setUp(self):
+        self.get = mock.patch('feed.service.Client.get', return_value={}).start()
+        mock.patch('feed.service.Client.put', return_value={}).start()
+        mock.patch.dict('feed.crawling.BrowserActions._routingSessions', clear=True).start()
+        mock.patch.dict('feed.crawling.chain_pool_params', {'routing_session_ttl': 3600}).start()
+        self.addCleanup(mock.patch.stopall)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.recording = Recording(directory.name)
+        for i, names in enumerate([('one', 'two'), ('three', 'four')]):
+            url = f'https://example.com/cars?page={i}'
+            self.recording.addUrl(url, self.recording.addPage(url, page.format(*names)))
+
+    def routerInits(self):
+        return [call for call in self.get.call_args_list if 'initialiseRoutingSession' in call.args[0]]
+
+    def test_fingerprint(self):
+        fingerprint = ChainPool.fingerprint(chainParams('https://example.com/cars?page=0'))
+        self.assertEqual(fingerprint, ChainPool.fingerprint(chainParams('https://example.com/cars?page=1', data={'make': 'ford'})))
+        self.assertNotEqual(fingerprint, ChainPool.fingerprint(chainParams('https://example.com/cars?page=0', css='.name')))
+
+    def test_reuse(self):
+        pool = ChainPool(BrowserActions, size=2)
+        caller = Caller()
+        first = pool.get(ReplayDriver(self.recording.path), **chainParams('https://example.com/cars?page=0'))
+        first.execute(caller)
+        pool.put(first)
+        driver = ReplayDriver(self.recording.path)
+        second = pool.get(driver, **chainParams('https://example.com/cars?page=1', data={'make': 'ford'}))
+        self.assertIs(second, first)
+        self.assertIs(second.driver, driver)
+        self.assertEqual(second.actions[0].data, {'make': 'ford'})
+        second.execute(caller)
+        self.assertEqual(caller.captured, ['one', 'two', 'three', 'four'])
+        self.assertEqual(len(self.routerInits()), 1)
+        self.assertEqual(pool.stats()['hits'], 1)
+
+    def test_missing_run_params_take_defaults(self):
+        pool = ChainPool(BrowserActions, size=2)
+        first = pool.get(None, **chainParams('https://example.com/cars?page=0', data={'make': 'ford'}))
+        pool.put(first)
+        second = pool.get(None, **chainParams('https://example.com/cars?page=1'))
+        self.assertIs(second, first)
+        self.assertIsNone(second.actions[0].data)
+        self.assertIs(second.plan[0].action, second.actions[0])
+        fresh = BrowserActions(driver=None, **chainParams('https://example.com/cars?page=1'))
+        self.assertEqual(second.actions[0].to_dict(), fresh.actions[0].to_dict())
+
+    def test_reset_skips_dropped_actions(self):
+        params = chainParams('https://example.com/cars?page=0')
+        params['actions'].insert(0, dict(actionType='CaptureAction', css='.price')) # no captureName
+        pool = ChainPool(BrowserActions, size=2)
+        first = pool.get(None, **params)
+        self.assertNotIn(0, first.actions)
+        pool.put(first)
+        params['actions'][1]['data'] = {'make': 'ford'}
+        second = pool.get(None, **params)
+        self.assertIs(second, first)
+        self.assertEqual(second.actions[1].data, {'make': 'ford'})
+
+    def test_router_session_initialised_for_each_message_by_default(self):
+        pool = ChainPool(BrowserActions, size=2)
+        params = chainParams('https://example.com/cars?page=0')
+        BrowserActions(driver=None, **params)
+        self.assertEqual(len(self.routerInits()), 1)
+        first = pool.get(None, **params) # constructed chains always initialise it
+        self.assertEqual(len(self.routerInits()), 2)
+        pool.put(first)
+        with mock.patch.dict('feed.crawling.chain_pool_params', {'routing_session_ttl': 0}):
+            self.assertIs(pool.get(None, **params), first)
+        self.assertEqual(len(self.routerInits()), 3)
+
+    def test_chain_is_not_shared_while_running(self):
+        pool = ChainPool(BrowserActions, size=2)
+        params = chainParams('https://example.com/cars?page=0')
+        first = pool.get(None, **params)
+        self.assertIsNot(pool.get(None, **params), first)
+
+    def test_size(self):
+        pool = ChainPool(BrowserActions, size=1)
+        first = pool.get(None, **chainParams('https://example.com/cars?page=0'))
+        other = pool.get(None, **chainParams('https://example.com/cars?page=0', css='.name'))
+        pool.put(first)
+        pool.put(other)
+        self.assertEqual(pool.stats()['idle'], 1)
+        self.assertIs(pool.get(None, **chainParams('https://example.com/cars?page=0', css='.name')), other)
+
+
+if __name__ == '__main__':
+    unittest.main()
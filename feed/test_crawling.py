@@ -15,10 +15,10 @@ class TestBrowserService(SeleniumTestInterface, TestCase):
         cls.createSelenium()
 
     def test_driverHealtCheck(self):
-        res = self.browserService.driverHealthCheck()
+        res = self.browserService.driverHealthCheck(probe=True)
         self.assertTrue(res)
         self.browserService.driver.close()
-        res = self.browserService.driverHealthCheck()
+        res = self.browserService.driverHealthCheck(probe=True)
         self.assertFalse(res)
 
     def testRenewWebCrawler(self):
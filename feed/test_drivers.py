@@ -0,0 +1,184 @@
+from unittest import TestCase
+import threading
+import unittest
+from selenium.common.exceptions import InvalidSessionIdException, NoSuchElementException, WebDriverException
+from urllib3.exceptions import MaxRetryError
+
+from feed.drivers import DriverHealth, DriverPool, DriverPoolTimeout, SessionLimit
+
+
+class FakeDriver:
+    def __init__(self):
+        self.alive = True
+        self.quits = 0
+
+    @property
+    def current_url(self):
+        if not self.alive:
+            raise ConnectionError('session is gone')
+        return 'about:blank'
+
+    def quit(self):
+        self.quits += 1
+
+
+class TestDriverPool(TestCase):
+
+    def setUp(self):
+        self.created = []
+        self.pool = DriverPool(self.factory, size=2)
+
+    def factory(self):
+        driver = FakeDriver()
+        self.created.append(driver)
+        return driver
+
+    def test_checkout_reuses_and_bounds(self):
+        first = self.pool.checkout()
+        second = self.pool.checkout()
+        self.assertIsNot(first.driver, second.driver)
+        with self.assertRaises(DriverPoolTimeout):
+            self.pool.checkout(timeout=0.05)
+        self.pool.checkin(first)
+        self.assertIs(self.pool.checkout(timeout=0.05), first)
+        self.assertEqual(len(self.created), 2)
+
+    def test_checkout_waits_for_checkin(self):
+        sessions = [self.pool.checkout(), self.pool.checkout()]
+        threading.Timer(0.05, self.pool.checkin, args=(sessions[0],)).start()
+        self.assertIs(self.pool.checkout(timeout=5), sessions[0])
+
+    def test_unhealthy_and_recycled_sessions_are_replaced(self):
+        pool = DriverPool(self.factory, size=1, maxUses=2)
+        session = pool.checkout()
+        session.driver.alive = False
+        session.health.idle = 0 # idle for long enough to be probed
+        pool.checkin(session)
+        replacement = pool.checkout()
+        self.assertIsNot(replacement, session)
+        pool.wait()
+        self.assertEqual(session.driver.quits, 1)
+        pool.checkin(replacement)
+        self.assertIs(pool.checkout(), replacement)
+        pool.checkin(replacement) # second use, recycled
+        pool.wait()
+        self.assertEqual(replacement.driver.quits, 1)
+        self.assertEqual(pool.stats(), dict(size=1, sessions=0, idle=0, retired=2, standby=0, standbyUsed=0))
+
+    def test_session_context(self):
+        with self.assertRaises(WebDriverException):
+            with self.pool.session() as driver:
+                raise WebDriverException('page crashed')
+        self.pool.wait()
+        self.assertEqual(driver.quits, 1)
+        self.pool.close()
+        with self.assertRaises(DriverPoolTimeout):
+            self.pool.checkout()
+
+    def test_standby_replaces_retired_session(self):
+        pool = DriverPool(self.factory, size=1, standby=1)
+        first = pool.checkout(timeout=5) # waits for the standby already starting
+        pool.wait()
+        self.assertEqual(len(self.created), 2) # a new standby is warmed once the first is used
+        pool.checkin(first, healthy=False)
+        second = pool.checkout(timeout=5)
+        self.assertIs(second.driver, self.created[1])
+        pool.wait()
+        self.assertEqual(len(self.created), 3)
+        self.assertEqual(pool.stats().get('standbyUsed'), 2)
+        pool.close()
+        pool.wait()
+        self.assertEqual(self.created[2].quits, 1)
+
+    def test_standby_started_again_after_failing(self):
+        failures = [ConnectionRefusedError(111, 'refused')]
+        def factory():
+            if failures:
+                raise failures.pop()
+            return self.factory()
+        pool = DriverPool(factory, size=1, standby=1, standbyRetry=0.05)
+        for _ in range(100):
+            if pool.stats().get('standby'):
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(pool.stats().get('standby'), 1)
+        self.assertEqual(len(self.created), 1)
+        pool.close()
+        pool.wait()
+
+    def live(self):
+        return len([driver for driver in self.created if not driver.quits])
+
+    def test_limit_is_shared_between_pools(self):
+        # a pool for each browser profile
+        limit = SessionLimit(2)
+        default = DriverPool(self.factory, size=2, limit=limit)
+        lean = DriverPool(self.factory, size=2, limit=limit)
+        first, second = default.checkout(), default.checkout()
+        with self.assertRaises(DriverPoolTimeout):
+            lean.checkout(timeout=0.05)
+        default.checkin(first)
+        session = lean.checkout(timeout=1) # the idle session of default is quit for it
+        self.assertEqual(first.driver.quits, 1)
+        self.assertEqual(self.live(), 2)
+        # switching profile quits the session rather than holding it idle
+        lean.checkin(session, retire=True)
+        lean.wait()
+        self.assertEqual(self.live(), 1)
+        self.assertIsNot(default.checkout(timeout=1), first)
+        self.assertEqual(self.live(), 2)
+
+    def test_limit_counts_standby_sessions(self):
+        limit = SessionLimit(2)
+        pools = [DriverPool(self.factory, size=1, standby=1, limit=limit) for _ in range(3)]
+        for pool in pools:
+            pool.wait()
+        self.assertEqual(self.live(), 2)
+        sessions = [pool.checkout(timeout=1) for pool in pools[:2]]
+        for pool in pools:
+            pool.wait()
+        self.assertEqual(self.live(), 2)
+        with self.assertRaises(DriverPoolTimeout):
+            pools[2].checkout(timeout=0.05)
+        pools[0].checkin(sessions[0])
+        pools[2].checkout(timeout=1)
+        for pool in pools:
+            pool.wait()
+        self.assertEqual(self.live(), 2)
+
+
+class TestDriverHealth(TestCase):
+
+    def test_classify(self):
+        self.assertEqual(DriverHealth.classify(InvalidSessionIdException('invalid session id')), DriverHealth.EXPIRED)
+        self.assertEqual(DriverHealth.classify(WebDriverException('chrome not reachable')), DriverHealth.EXPIRED)
+        self.assertEqual(DriverHealth.classify(MaxRetryError(None, '/session', 'refused')), DriverHealth.DEAD)
+        self.assertEqual(DriverHealth.classify(WebDriverException('unknown error: session deleted because of page crash\nfrom tab crashed')), DriverHealth.CRASHED)
+        self.assertIsNone(DriverHealth.classify(NoSuchElementException('no such element')))
+        self.assertIsNone(DriverHealth.classify(KeyError('css')))
+        # a failure wrapped by the action, eg. ActionableItemNotFound raised whilst handling it
+        try:
+            try:
+                raise ConnectionRefusedError(111, 'refused')
+            except ConnectionRefusedError:
+                raise KeyError('wrapped')
+        except KeyError as ex:
+            self.assertEqual(DriverHealth.classify(ex), DriverHealth.DEAD)
+
+    def test_check_probes_only_when_idle(self):
+        driver = FakeDriver()
+        health = DriverHealth(idle=60)
+        driver.alive = False
+        self.assertTrue(health.check(driver)) # used recently, not probed
+        self.assertEqual(health.probes, 0)
+        self.assertFalse(health.check(driver, probe=True))
+        self.assertEqual(health.state, DriverHealth.DEAD)
+        health.failed(NoSuchElementException('no such element')) # the session answered
+        self.assertTrue(health.healthy)
+        health.failed(InvalidSessionIdException('invalid session id'))
+        self.assertFalse(health.check(driver))
+        self.assertEqual((health.state, health.probes), (DriverHealth.EXPIRED, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
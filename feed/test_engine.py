@@ -0,0 +1,132 @@
+from unittest import TestCase, mock
+import tempfile
+import threading
+import unittest
+from time import sleep
+
+from feed.engine import KeyedThreadPool
+from feed.actionchains import ActionChainRunner
+from feed.crawling import BrowserActions
+from feed.replay import Recording, ReplayDriver
+from feed.actiontypes import ActionChainException
+
+
+class TestKeyedThreadPool(TestCase):
+
+    def test_order_per_key(self):
+        pool = KeyedThreadPool(4, queue_size=2)
+        done = {key: [] for key in 'abc'}
+        for i in range(20):
+            for key in done:
+                pool.add_task(key, lambda key, i: (sleep(0.001), done[key].append(i)), key, i)
+        pool.wait_completion('a')
+        self.assertEqual(done['a'], list(range(20)))
+        pool.wait_completion()
+        self.assertTrue(all(items == list(range(20)) for items in done.values()))
+
+    def test_backpressure(self):
+        pool = KeyedThreadPool(1, queue_size=1)
+        release = threading.Event()
+        pool.add_task('a', release.wait)
+        pool.add_task('a', lambda: None)
+        adding = threading.Thread(target=pool.add_task, args=('a', lambda: None))
+        adding.start()
+        adding.join(0.1)
+        # the thread is busy and its queue is full
+        self.assertTrue(adding.is_alive())
+        release.set()
+        adding.join(1)
+        pool.wait_completion()
+        self.assertFalse(adding.is_alive())
+
+    def test_failure_is_kept_for_its_key(self):
+        pool = KeyedThreadPool(2)
+        done = []
+        pool.add_task('a', done.append, 1)
+        pool.add_task('a', lambda: 1 / 0)
+        pool.add_task('a', done.append, 2) # skipped
+        pool.add_task('b', done.append, 3)
+        pool.wait_completion()
+        self.assertIsInstance(pool.pop_failure('a'), ZeroDivisionError)
+        self.assertIsNone(pool.pop_failure('a'))
+        self.assertIsNone(pool.pop_failure('b'))
+        self.assertEqual(sorted(done), [1, 3])
+        pool.add_task('a', done.append, 4)
+        pool.wait_completion('a')
+        self.assertIn(4, done)
+
+    def test_object_ids_are_spread_over_threads(self):
+        # chains use id(self) as their key, ids are aligned so share their low bits
+        pool = KeyedThreadPool(4)
+        chains = [object() for _ in range(4)]
+        started = threading.Barrier(4, timeout=5)
+        threads = {}
+        def run(chain):
+            threads[id(chain)] = threading.current_thread().name
+            started.wait()
+        for chain in chains:
+            pool.add_task(id(chain), run, chain)
+        pool.wait_completion()
+        self.assertEqual(len(set(threads.values())), 4)
+        self.assertFalse(started.broken)
+
+
+page = '<html><body><span class="title">one</span><span class="title">two</span><span class="title">three</span></body></html>'
+
+
+class Caller(ActionChainRunner):
+    def __init__(self):
+        super().__init__(BrowserActions)
+        self.captured = []
+        self.threads = set()
+        self.failOn = None
+
+    def onCaptureActionCallback(self, item, *args, **kwargs):
+        sleep(0.01)
+        self.threads.add(threading.current_thread().name)
+        if item.data == 'two':
+            raise ActionChainException(position=0, message='can not save two')
+        if item.data == self.failOn:
+            raise IOError(f'could not save {item.data}')
+        self.captured.append(item.data)
+
+
+class TestCallbackDispatch(TestCase):
+
+    def setUp(self):
+        self.put = mock.patch('feed.service.Client.put', return_value={}).start()
+        mock.patch('feed.service.Client.get', return_value={}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def chain(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        recording = Recording(directory.name)
+        recording.addUrl('https://example.com/cars', recording.addPage('https://example.com/cars', page))
+        capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        return BrowserActions(driver=ReplayDriver(recording.path), name='cars', startUrl='https://example.com/cars', isRepeating=False, actions=[capture])
+
+    @mock.patch.dict('feed.actionchains.dispatch_params', {'threads': 2, 'queue_size': 1})
+    def test_callbacks_on_pool(self):
+        chain = self.chain()
+        caller = Caller()
+        chain.execute(caller)
+        # in order, and done before execute returns
+        self.assertEqual(caller.captured, ['one', 'three'])
+        self.assertNotIn(threading.current_thread().name, caller.threads)
+        reports = [call for call in self.put.call_args_list if 'reportActionError/cars' in call.args[0]]
+        self.assertEqual(len(reports), 1)
+        self.assertEqual(reports[0].kwargs['payload']['message'], 'can not save two')
+
+    def test_callback_failure_is_raised(self):
+        for threads in (0, 2):
+            with mock.patch.dict('feed.actionchains.dispatch_params', {'threads': threads, 'queue_size': 1}):
+                caller = Caller()
+                caller.failOn = 'one'
+                with self.assertRaises(IOError):
+                    self.chain().execute(caller)
+                self.assertEqual(caller.captured, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
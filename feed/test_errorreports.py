@@ -0,0 +1,69 @@
+from unittest import TestCase, mock
+import unittest
+
+from feed.errorreports import ErrorReports
+from feed.actionchains import ActionChain
+from feed.actiontypes import Action, ActionableItemNotFound
+
+
+capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+
+
+class TestErrorReports(TestCase):
+
+    def setUp(self):
+        self.get = mock.patch('feed.service.Client.get').start()
+        mock.patch('feed.service.Client.put', return_value={}).start()
+        self.addCleanup(mock.patch.stopall)
+        ErrorReports._shared = ErrorReports(ttl=60, batch=True)
+        self.addCleanup(setattr, ErrorReports, '_shared', None)
+        self.chain = ActionChain(name='cars', startUrl='https://example.com/cars', actions=[capture] * 6)
+
+    def test_one_request_for_all_positions(self):
+        self.get.return_value = []
+        for _ in range(5):
+            self.assertTrue(self.chain.shouldRun())
+        self.get.assert_called_once_with('/actionsmanager/findActionErrorReports/cars', resp=True, error=None)
+
+    def test_blocked_by_report(self):
+        self.get.return_value = [{'position': 3, 'errorType': 'ActionableItemNotFound'}]
+        self.assertFalse(self.chain.shouldRun())
+        # a position the chain does not have
+        self.get.return_value = [{'position': 9, 'errorType': 'ActionableItemNotFound'}]
+        ErrorReports.shared().invalidate()
+        self.assertTrue(self.chain.shouldRun())
+
+    def test_published_report_stops_chain(self):
+        self.get.return_value = []
+        self.assertTrue(self.chain.shouldRun())
+        Action.publishActionError(self.chain, ActionableItemNotFound(position=2, chainName='cars'))
+        self.assertFalse(self.chain.shouldRun())
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_falls_back_to_each_position(self):
+        def get(endpoint, resp=False, error=None, **kwargs):
+            if endpoint.endswith('/cars'):
+                return None
+            return [{'position': 5}] if endpoint.endswith('/5') else []
+        self.get.side_effect = get
+        self.assertFalse(self.chain.shouldRun())
+        self.assertEqual(self.get.call_count, 7)
+        # each position until the ttl is up
+        ErrorReports.shared().invalidate()
+        self.assertFalse(self.chain.shouldRun())
+        self.assertEqual(self.get.call_count, 13)
+        self.assertFalse(self.get.call_args_list[7][0][0].endswith('/cars'))
+
+    def test_batch_is_tried_again_after_ttl(self):
+        # one failed response, eg. nanny restarting, does not stop batching for good
+        self.get.side_effect = [None] + [[]] * 6 + [[{'position': 5}]]
+        reports = ErrorReports.shared()
+        reports.ttl = 0
+        self.assertTrue(self.chain.shouldRun())
+        self.assertFalse(self.chain.shouldRun())
+        self.assertEqual(self.get.call_count, 8)
+        self.assertEqual(self.get.call_args[0][0], '/actionsmanager/findActionErrorReports/cars')
+
+
+if __name__ == '__main__':
+    unittest.main()
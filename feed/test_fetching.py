@@ -0,0 +1,122 @@
+from unittest import TestCase, mock
+import unittest
+
+from feed.actionchains import ActionChainRunner
+from feed.actiontypes import CaptureAction
+from feed.fetching import HttpActions, StaticDocument
+from feed.scripts import ELEMENT_SEARCH, PAGE_FINGERPRINT, PAGE_SNAPSHOT
+
+
+listing = ('<html><body><div class="cards">'
+           '<div class="card"><a href="/cars/1"><span class="title">one</span></a></div>'
+           '<div class="card"><a href="/cars/2"><span class="title">two</span></a></div>'
+           '</div><a class="next" href="/cars?page=2">Next</a>'
+           '<p>a server rendered listing of cars, with more than enough text to not need scripts.</p></body></html>')
+
+secondPage = listing.replace('one', 'three').replace('two', 'four')
+
+
+class FakeFetcher:
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = []
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        source = self.pages.get(url)
+        return StaticDocument(url, source) if source is not None else None
+
+
+class FakeDriver:
+    current_url = 'about:blank'
+
+    def get(self, url):
+        self.current_url = url
+
+    def execute_script(self, script, *args):
+        if script is PAGE_FINGERPRINT:
+            return [self.current_url, '0']
+        if script is PAGE_SNAPSHOT:
+            return [self.current_url, '0', '<html></html>']
+        raise AssertionError('the browser should not be searched')
+
+
+class Caller(ActionChainRunner):
+    def __init__(self):
+        super().__init__(HttpActions)
+        self.captured = []
+
+    def onCaptureActionCallback(self, item, *args, **kwargs):
+        self.captured.append(item.data)
+
+
+class TestStaticDocument(TestCase):
+
+    def setUp(self):
+        self.document = StaticDocument('https://example.com/cars', listing)
+
+    def test_search_matches_element_search(self):
+        results = self.document.execute_script(ELEMENT_SEARCH, [['css', 'div.missing'], ['xpath', '//span[@class="title"]']], False, None, False)
+        self.assertEqual([kind for kind, _ in results], ['css', 'xpath'])
+        self.assertEqual(results[1][1], [{'class': 'title', 'text': 'one', 'attr': None}, {'class': 'title', 'text': 'two', 'attr': None}])
+        # single searches go on to the next strategy when there is more than one element
+        results = self.document.execute_script(ELEMENT_SEARCH, [['css', '.title'], ['css', 'a.next']], True, 'href', True)
+        self.assertEqual(len(results), 2)
+        element = results[1][1][0]['element']
+        self.assertEqual((results[1][1][0]['attr'], element.link, element.text), ('/cars?page=2', '/cars?page=2', 'Next'))
+
+    def test_search_invalid_selector(self):
+        results = self.document.execute_script(ELEMENT_SEARCH, [['css', 'div[['], ['xpath', '//a[']], False, None, False)
+        self.assertEqual(results, [['css', []], ['xpath', []]])
+
+    def test_capture(self):
+        action = CaptureAction(position=0, css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        self.assertEqual(action.search(self.document), ['one', 'two'])
+
+    def test_needsScript(self):
+        self.assertFalse(self.document.needsScript())
+        shell = StaticDocument('https://example.com/app', '<html><body><div id="root"></div><script>render()</script></body></html>')
+        self.assertTrue(shell.needsScript())
+
+
+class TestHttpActions(TestCase):
+
+    def setUp(self):
+        for method in ('get', 'put'):
+            patcher = mock.patch(f'feed.service.Client.{method}', return_value={})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def chain(self, actions, fetchMode='http'):
+        chain = HttpActions(driver=FakeDriver(), name='cars', startUrl='https://example.com/cars', isRepeating=False, fetchMode=fetchMode, actions=actions)
+        chain.fetcher = FakeFetcher({'https://example.com/cars': listing, 'https://example.com/cars?page=2': secondPage})
+        return chain
+
+    def test_capture_and_follow_link(self):
+        capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        click = dict(actionType='ClickAction', css='a.next', xpath='', text='Next', isSingle=True)
+        chain = self.chain([capture, click, capture])
+        caller = Caller()
+        chain.execute(caller)
+        self.assertEqual(caller.captured, ['one', 'two', 'three', 'four'])
+        self.assertEqual(chain.fetcher.fetched, ['https://example.com/cars', 'https://example.com/cars?page=2'])
+        self.assertFalse(chain.failedChain)
+
+    def test_browser_mode(self):
+        chain = self.chain([], fetchMode='browser')
+        chain.execute(Caller())
+        self.assertEqual(chain.fetcher.fetched, [])
+        self.assertEqual(chain.driver.current_url, 'https://example.com/cars')
+
+    def test_auto_falls_back_to_browser(self):
+        capture = dict(actionType='CaptureAction', css='.rendered-by-script', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        chain = self.chain([capture], fetchMode='auto')
+        with mock.patch('feed.crawling.BrowserActions._search', return_value=(chain.driver, None)) as browserSearch:
+            chain.execute(Caller())
+        browserSearch.assert_called_once()
+        self.assertIsNone(chain.document)
+        self.assertEqual(chain.driver.current_url, 'https://example.com/cars')
+
+
+if __name__ == '__main__':
+    unittest.main()
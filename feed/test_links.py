@@ -0,0 +1,30 @@
+from unittest import TestCase
+import unittest
+
+from feed.benchmarks import listingPage, _legacyLinks
+from feed.links import LinkExtractor
+from feed.parsers import parse
+
+urlStub = 'https://www.donedeal.ie/cars-for-sale'
+
+
+class TestLinkExtractor(TestCase):
+
+    def test_extract_matches_per_item_search(self):
+        soup = parse(listingPage(cards=40, urlStub=urlStub))
+        items = soup.find_all(attrs={'class': 'card__body'})
+        links = LinkExtractor(urlStub).extract(soup, items)
+        self.assertListEqual(links, _legacyLinks(items, urlStub))
+        self.assertEqual(len(links), 30)
+
+    def test_extract_priority(self):
+        soup = parse(f'<a href="{urlStub}/outer"><div class="card" href="{urlStub}/own"></div>'
+                     f'<div class="card"><a href="{urlStub}/inner"></a></div></a>'
+                     f'<div class="card"><div class="card"><a href="/other"></a><a href="{urlStub}/child"></a></div></div>')
+        items = soup.find_all(attrs={'class': 'card'})
+        self.assertListEqual(LinkExtractor(urlStub).extract(soup, items),
+                             [f'{urlStub}/own', f'{urlStub}/outer', f'{urlStub}/child', f'{urlStub}/child'])
+
+
+if __name__ == '__main__':
+    unittest.main()
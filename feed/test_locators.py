@@ -0,0 +1,98 @@
+from unittest import TestCase
+import unittest
+import os
+import tempfile
+from selenium.webdriver.common.by import By
+
+from feed.locators import Locator, LocatorCache, StrategyStats, pageTemplate
+from feed.actiontypes import ClickAction
+
+
+class FakeElement:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeDriver:
+    def __init__(self, elements):
+        self.elements = elements
+
+    def find_elements(self, by, value):
+        return self.elements.get((by, value), [])
+
+
+class FakeSearch:
+    """
+    a driver answering feed.scripts.ELEMENT_SEARCH with results.
+    """
+    def __init__(self, results):
+        self.results = results
+
+    def execute_script(self, script, *args):
+        return self.results
+
+
+class TestLocatorCache(TestCase):
+
+    def test_pageTemplate(self):
+        self.assertEqual(pageTemplate('https://www.donedeal.co.uk/cars/page/2?start=30'),
+                         pageTemplate('https://www.donedeal.co.uk/cars/page/3?start=60'))
+        self.assertNotEqual(pageTemplate('https://www.donedeal.co.uk/cars'), pageTemplate('https://www.donedeal.co.uk/vans'))
+
+    def test_find(self):
+        nextButton = FakeElement('Next')
+        driver = FakeDriver({(By.CLASS_NAME, 'pager'): [FakeElement('Previous'), nextButton]})
+        locators = LocatorCache()
+        self.assertIsNone(locators.find(driver, 'hash', 'https://example.com/cars?page=1'))
+        locators.put('hash', 'https://example.com/cars?page=1', Locator(By.CLASS_NAME, 'pager', 'next'))
+        self.assertIs(locators.find(driver, 'hash', 'https://example.com/cars?page=2'), nextButton)
+        self.assertEqual(locators.stats(), dict(hits=1, misses=1, hitRate=0.5, size=1))
+
+    def test_resolve_matches_whole_text(self):
+        nextButton = FakeElement('Next')
+        driver = FakeDriver({(By.CSS_SELECTOR, '.pager a'): [FakeElement('Next page of vans'), nextButton]})
+        self.assertIs(LocatorCache.resolve(driver, Locator(By.CSS_SELECTOR, '.pager a', 'next')), nextButton)
+        self.assertIsNone(LocatorCache.resolve(driver, Locator(By.CSS_SELECTOR, '.pager a', 'nex')))
+
+    def test_search_reports_the_strategy_which_won(self):
+        action = ClickAction(position=0, css='.pager', xpath='//a[@rel="next"]', text='Next', isSingle=True)
+        element = {'class': 'next', 'text': 'Next', 'attr': None, 'element': 'next'}
+        other = dict(element, text='Next page of vans', element='vans')
+        # the css finds nothing, the xpath finds the button
+        search = FakeSearch([['css', []], ['xpath', [element]]])
+        located = {}
+        self.assertEqual(action.search(search, located=located), 'next')
+        self.assertEqual(located, dict(kind='xpath', selector='//a[@rel="next"]', text=None))
+        # picked from several by its text
+        located = {}
+        self.assertEqual(action.search(FakeSearch([['css', [other, element]], ['xpath', []]]), located=located), 'next')
+        self.assertEqual(located, dict(kind='css', selector='.pager', text='Next'))
+        # picked as the first of several, there is no locator which would find it again
+        located = {}
+        action.search(FakeSearch([['css', [other, dict(other, element='cars')]], ['xpath', []]]), located=located)
+        self.assertEqual(located, {})
+
+    def test_find_drops_stale_locator(self):
+        locators = LocatorCache()
+        locators.put('hash', 'https://example.com/cars', Locator(By.CLASS_NAME, 'pager', None))
+        self.assertIsNone(locators.find(FakeDriver({}), 'hash', 'https://example.com/cars'))
+        self.assertIsNone(locators.get('hash', 'https://example.com/cars'))
+
+
+class TestStrategyStats(TestCase):
+
+    def test_order_and_persist(self):
+        strategies = [['css', '.next'], ['xpath', '//a']]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'strategies.json')
+            stats = StrategyStats(path=path, saveEvery=2)
+            self.assertListEqual(stats.order('hash', strategies), strategies)
+            stats.record('hash', 'xpath')
+            stats.record('hash', 'xpath')
+            restarted = StrategyStats(path=path)
+            self.assertListEqual(restarted.order('hash', strategies), [['xpath', '//a'], ['css', '.next']])
+            self.assertDictEqual(restarted.wins('hash'), {'xpath': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+from unittest import TestCase
+import unittest
+from selenium.common.exceptions import JavascriptException, WebDriverException
+
+from feed.navigation import NavigationWaiter
+
+
+class Executor:
+    def __init__(self):
+        self._commands = {}
+
+
+class FakeDriver:
+    """
+    a driver which answers the wait script from a list of states, raising those which are exceptions.
+    """
+    def __init__(self, states, scriptTimeout=30000):
+        self.states = list(states)
+        self.calls = 0
+        self.scriptTimeout = scriptTimeout
+        self.scriptTimeouts = []
+        self.command_executor = Executor()
+
+    def execute(self, command):
+        self.assertRegistered(command)
+        return {'value': {'script': self.scriptTimeout, 'pageLoad': 300000, 'implicit': 0}}
+
+    def assertRegistered(self, command):
+        assert self.command_executor._commands[command] == ('GET', '/session/$sessionId/timeouts')
+
+    def set_script_timeout(self, seconds):
+        self.scriptTimeouts.append(seconds)
+
+    def execute_async_script(self, script, *args):
+        self.calls += 1
+        state = self.states.pop(0) if len(self.states) > 1 else self.states[0]
+        if isinstance(state, Exception):
+            raise state
+        return state
+
+
+class TestNavigationWaiter(TestCase):
+
+    def setUp(self):
+        self.waiter = NavigationWaiter(timeout=2, idle=0.1, domainTimeouts={})
+
+    def test_settled(self):
+        driver = FakeDriver([dict(url='https://example.com/', ready=True, idle=True)])
+        result = self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.calls, 1)
+        self.assertFalse(result.navigated)
+        self.assertTrue(result.ready and result.idle)
+        self.assertFalse(result.timeout)
+
+    def test_unloaded_document_is_a_navigation(self):
+        driver = FakeDriver([JavascriptException('javascript error: document unloaded while waiting for result'),
+                             dict(url='https://example.com/next', ready=True, idle=True)])
+        result = self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.calls, 2)
+        self.assertTrue(result.navigated)
+        self.assertEqual(result.url, 'https://example.com/next')
+
+    def test_dead_session_is_raised(self):
+        driver = FakeDriver([WebDriverException('chrome not reachable')])
+        with self.assertRaises(WebDriverException):
+            self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.calls, 1)
+        driver = FakeDriver([WebDriverException('unknown error: session deleted because of page crash\nfrom tab crashed')])
+        with self.assertRaises(WebDriverException):
+            self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.calls, 1)
+
+    def test_times_out(self):
+        driver = FakeDriver([dict(url='https://example.com/', ready=True, idle=False)])
+        result = self.waiter.wait(driver, ('https://example.com/', 'marker'), timeout=0.2)
+        self.assertTrue(result.timeout)
+        self.assertFalse(result.idle)
+
+    def test_script_timeout_is_restored(self):
+        # shorter than the wait, raised for it then put back
+        driver = FakeDriver([dict(ready=True, idle=True)], scriptTimeout=1000)
+        self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.scriptTimeouts, [2 + 0.1 + 1, 1])
+        driver = FakeDriver([WebDriverException('chrome not reachable')], scriptTimeout=1000)
+        with self.assertRaises(WebDriverException):
+            self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.scriptTimeouts, [2 + 0.1 + 1, 1])
+        # long enough already, left alone
+        driver = FakeDriver([dict(ready=True, idle=True)])
+        self.waiter.wait(driver, ('https://example.com/', 'marker'))
+        self.assertEqual(driver.scriptTimeouts, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+from unittest import TestCase
+import unittest
+from lxml import html
+
+from feed.pagecache import PageCache, PageSnapshot
+from feed.scripts import PAGE_FINGERPRINT, PAGE_SNAPSHOT
+
+
+class FakeDriver:
+    """
+    answers the page cache scripts for a page held in memory.
+    """
+    def __init__(self, url, source):
+        self.url = url
+        self.source = source
+        self.version = 0
+        self.calls = []
+
+    def execute_script(self, script, *args):
+        self.calls.append(script)
+        if script is PAGE_FINGERPRINT:
+            return [self.url, str(self.version)]
+        if script is PAGE_SNAPSHOT:
+            return [self.url, str(self.version), self.source]
+        raise ValueError('unexpected script')
+
+
+class TestPageCache(TestCase):
+
+    def setUp(self):
+        self.driver = FakeDriver('https://example.com/cars', '<div class="card">one</div>')
+        self.pages = PageCache()
+
+    def test_get_parses_once(self):
+        first = self.pages.get(self.driver)
+        second = self.pages.get(self.driver)
+        self.assertIs(first, second)
+        self.assertIs(first.soup, second.soup)
+        self.assertEqual(self.driver.calls, [PAGE_SNAPSHOT, PAGE_FINGERPRINT])
+        self.assertEqual((self.pages.hits, self.pages.misses), (1, 1))
+
+    def test_get_refetches_changed_page(self):
+        first = self.pages.get(self.driver)
+        self.driver.version += 1
+        self.driver.source = '<div class="card">two</div>'
+        second = self.pages.get(self.driver)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.soup.find(attrs={'class': 'card'}).text, 'two')
+
+    def test_invalidate(self):
+        self.pages.get(self.driver)
+        self.pages.invalidate()
+        self.pages.get(self.driver)
+        self.assertEqual(self.driver.calls, [PAGE_SNAPSHOT, PAGE_SNAPSHOT])
+
+
+class TestPageSnapshot(TestCase):
+
+    def setUp(self):
+        source = ('<div class="card"><a class="card__link  big" href="/1">one</a></div>'
+                  '<div class="card card--featured"><a class="big card__link" href="/2">two</a></div>'
+                  '<span class="card">three</span><p class="">four</p>')
+        self.snapshot = PageSnapshot('https://example.com', '0', source)
+
+    def test_findByClass_matches_findAll(self):
+        for cls in ['card', 'card card--featured', 'card--featured', 'big', 'card__link big', 'big card__link', 'missing', '', None]:
+            self.assertListEqual(self.snapshot.findByClass(cls), self.snapshot.soup.findAll(attrs={'class': cls}), msg=f'class=[{cls}]')
+
+    def test_findByText(self):
+        source = ('<html><head><title>Next</title></head><body><div><a>Prev</a></div>'
+                  '<div><a><span>Next\n  page</span></a><input type="submit" value="Search"></div>'
+                  '<script>var next = "Next page";</script></body></html>')
+        snapshot = PageSnapshot('https://example.com', '0', source)
+        self.assertEqual([node.name for node in snapshot.findByText('Next page')], ['span'])
+        self.assertEqual([node.name for node in snapshot.findByText('NEXT PAGE')], ['span'])
+        self.assertEqual([node.name for node in snapshot.findByText('Nxt page')], ['span'])
+        self.assertEqual(snapshot.findByText('Nxt page', fuzzy=False), [])
+        self.assertEqual([node.name for node in snapshot.findByText('search')], ['input'])
+        self.assertEqual(snapshot.findByText('checkout'), [])
+        # the xpath locates the same element in the browser's document
+        tree = html.fromstring(source)
+        for text in ['Next page', 'Prev', 'Search']:
+            node = snapshot.findByText(text)[0]
+            xpath = snapshot.xpathFor(node)
+            found = tree.getroottree().xpath(xpath)
+            self.assertEqual(len(found), 1, msg=xpath)
+            self.assertEqual(found[0].tag, node.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
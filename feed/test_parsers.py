@@ -0,0 +1,47 @@
+from unittest import TestCase, mock
+import unittest
+from bs4 import BeautifulSoup
+
+from feed import parsers
+from feed.parsers import Parser, SoupParser, availableParsers, getParser, parse, registerParser
+
+
+class UpperParser(Parser):
+    """
+    a registered backend, which builds its tree with html.parser.
+    """
+    def parse(self, source) -> BeautifulSoup:
+        return BeautifulSoup(source.upper(), features='html.parser')
+
+
+class TestParsers(TestCase):
+
+    def setUp(self):
+        # backends resolved by other tests, and the ones these register, do not leak between tests
+        for patcher in (mock.patch.dict(parsers._resolved, clear=True), mock.patch.dict(parsers.parser_backends)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_configured_backend(self):
+        with mock.patch.dict('feed.parsers.parser_params', {'backend': 'html.parser'}):
+            self.assertEqual(getParser().name, 'html.parser')
+        self.assertEqual(getParser('lxml').name, 'lxml')
+        self.assertIs(getParser('lxml'), getParser('lxml'))
+        self.assertEqual(parse('<div class="card">one</div>', backend='lxml').find(attrs={'class': 'card'}).text, 'one')
+
+    def test_register(self):
+        registerParser(UpperParser('upper'))
+        self.assertIn('upper', availableParsers())
+        self.assertEqual(parse('<p>one</p>', backend='upper').find('p').text, 'ONE')
+
+    def test_falls_back_when_not_installed(self):
+        # as when lxml is not installed, bs4 has no tree builder for it
+        registerParser(SoupParser('lxml', features='not-installed'))
+        self.assertNotIn('lxml', availableParsers())
+        self.assertEqual(getParser('lxml').name, parsers.fallback_backend)
+        self.assertEqual(parse('<p>one</p>', backend='lxml').find('p').text, 'one')
+        self.assertEqual(getParser('unknown').name, parsers.fallback_backend)
+
+
+if __name__ == '__main__':
+    unittest.main()
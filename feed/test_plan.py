@@ -0,0 +1,60 @@
+from unittest import TestCase, mock
+import unittest
+
+from feed.actionchains import ActionChain, ActionChainRunner
+from feed.actiontypes import CaptureAction, ClickAction
+
+
+capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars')
+
+
+class Caller(ActionChainRunner):
+    def __init__(self):
+        super().__init__(ActionChain)
+
+    def onClickActionCallback(self, item, *args, **kwargs):
+        pass
+
+
+class TestActionChainPlan(TestCase):
+
+    def setUp(self):
+        mock.patch('feed.service.Client.get', return_value={}).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_compile(self):
+        chain = ActionChain(name='cars', actions=[dict(actionType='ClickAction', css='.next'), capture])
+        self.assertEqual([step.position for step in chain.plan], [0, 1])
+        click, captureStep = chain.plan
+        self.assertIsInstance(click.action, ClickAction)
+        self.assertEqual(click.handler, chain.onClickAction)
+        self.assertEqual(captureStep.callbackName, 'onCaptureActionCallback')
+        self.assertEqual(captureStep.actionHash, chain.actions[1].getActionHash())
+
+    def test_bind_callbacks_once_per_caller(self):
+        chain = ActionChain(name='cars', actions=[dict(actionType='ClickAction', css='.next'), capture])
+        caller = Caller()
+        callbacks = chain._bindCallbacks(caller)
+        self.assertEqual(callbacks, (caller.onClickActionCallback, caller.onCaptureActionCallback))
+        self.assertIs(chain._bindCallbacks(caller), callbacks)
+        self.assertIsNot(chain._bindCallbacks(Caller()), callbacks)
+
+    def test_action_defaults(self):
+        # only the parameters of the action type are required
+        action = ActionChain.actionFactory(0, dict(actionType='CaptureAction', css='.title', captureName='cars'))
+        self.assertIsInstance(action, CaptureAction)
+        self.assertEqual((action.xpath, action.text, action.isSingle), (None, None, False))
+        ActionChain.actionFactory(1, dict(actionType='ClickAction', xpath='//a'))
+        with self.assertRaises(KeyError) as raised:
+            ActionChain.actionFactory(0, dict(actionType='CaptureAction', css='.title'))
+        self.assertEqual(raised.exception.args, ('captureName',))
+        self.assertRaises(KeyError, ActionChain.actionFactory, 0, dict(actionType='ScrollAction', css='.title'))
+
+    def test_invalid_actions_are_dropped(self):
+        chain = ActionChain(name='cars', actions=[dict(actionType='CaptureAction', css='.title'), capture])
+        self.assertEqual(list(chain.actions), [1])
+        self.assertEqual([step.position for step in chain.plan], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
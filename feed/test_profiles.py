@@ -0,0 +1,106 @@
+from unittest import TestCase, mock
+import os
+import tempfile
+import unittest
+import urllib.request
+from selenium.common.exceptions import WebDriverException
+
+from feed.profiles import BrowserProfile
+from feed.benchmarks import FixtureHandler, benchmarkProfiles, fixtureSite
+
+
+class FakeExecutor:
+    def __init__(self):
+        self._commands = {}
+
+
+class FakeDriver:
+    def __init__(self, fail=False):
+        self.command_executor = FakeExecutor()
+        self.executed = []
+        self.fail = fail
+        self.loaded = []
+
+    def execute(self, command, params=None):
+        if self.fail:
+            raise WebDriverException('unknown command')
+        self.executed.append((command, params))
+
+    def get(self, url):
+        self.loaded.append(urllib.request.urlopen(url).read())
+
+    def quit(self):
+        pass
+
+
+profiles = {
+    'default': dict(page_load_strategy='normal'),
+    'lean': dict(page_load_strategy='eager', block=['images', 'fonts'], block_urls=['*analytics*'])
+}
+
+
+@mock.patch.dict('feed.profiles.browser_profiles', profiles, clear=True)
+@mock.patch.dict('feed.profiles.browser_params', {'profile': 'default'})
+class TestBrowserProfile(TestCase):
+
+    def test_get(self):
+        lean = BrowserProfile.get('lean')
+        self.assertEqual((lean.name, lean.pageLoadStrategy), ('lean', 'eager'))
+        self.assertIn('*.woff2', lean.blockedPatterns)
+        self.assertEqual(lean.blockedPatterns[-1], '*analytics*')
+        self.assertEqual(BrowserProfile.get('unknown').name, 'default')
+        self.assertEqual(BrowserProfile.get().name, 'default')
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, BrowserProfile, 'bad', pageLoadStrategy='fast')
+        self.assertRaises(ValueError, BrowserProfile, 'bad', block=['scripts'])
+
+    def test_session_settings(self):
+        lean = BrowserProfile.get('lean')
+        self.assertEqual(lean.capabilities()['pageLoadStrategy'], 'eager')
+        prefs = lean.options().experimental_options['prefs']
+        self.assertEqual(prefs, {'profile.managed_default_content_settings.images': 2})
+        self.assertNotIn('prefs', BrowserProfile.get('default').options().experimental_options)
+
+    def test_apply(self):
+        driver = FakeDriver()
+        self.assertTrue(BrowserProfile.get('lean').apply(driver))
+        self.assertIn(BrowserProfile.cdpCommand, driver.command_executor._commands)
+        self.assertEqual([params['cmd'] for _, params in driver.executed], ['Network.enable', 'Network.setBlockedURLs'])
+        # nothing to block, nothing sent
+        driver = FakeDriver()
+        self.assertTrue(BrowserProfile.get('default').apply(driver))
+        self.assertEqual(driver.executed, [])
+        self.assertFalse(BrowserProfile.get('lean').apply(FakeDriver(fail=True)))
+
+    def test_benchmark(self):
+        server = fixtureSite(latency=0)
+        self.addCleanup(server.shutdown)
+        urls = [f'http://127.0.0.1:{server.server_port}/page/{i}' for i in range(3)]
+        drivers = []
+
+        def factory(profile):
+            drivers.append(FakeDriver())
+            return drivers[-1]
+
+        results = benchmarkProfiles(factory, urls, [BrowserProfile.get('default'), BrowserProfile.get('lean')])
+        self.assertEqual(sorted(result['profile'] for result in results), ['default', 'lean'])
+        self.assertTrue(all(result['pages'] == 3 and result['pagesPerMinute'] > 0 for result in results))
+        # a warm up load and the pages
+        self.assertEqual(len(drivers[0].loaded), 4)
+        self.assertIn(b'/assets/1-0.png', drivers[0].loaded[2])
+
+    def test_fixture_directory(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, 'saved.html'), 'w') as saved:
+            saved.write('<html><body>saved</body></html>')
+        server = fixtureSite(directory=directory.name, latency=0)
+        self.addCleanup(server.shutdown)
+        self.addCleanup(server.server_close)
+        self.addCleanup(setattr, FixtureHandler, 'root', None)
+        self.assertEqual(urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/saved.html').read(), b'<html><body>saved</body></html>')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+from unittest import TestCase
+import gc
+import unittest
+import weakref
+
+from bs4 import Tag
+
+from feed.actiontypes import Action, CaptureAction, ActionChainException, ActionableItemNotFound
+from feed.crawling import BrowserActions
+from feed.parsers import parse
+
+
+capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='src')
+
+
+class TestActionRecords(TestCase):
+
+    def test_round_trip(self):
+        action = Action.from_dict(dict(capture, data={'make': 'ford'}, fromUpstream='kept'), position=3)
+        self.assertIsInstance(action, CaptureAction)
+        self.assertFalse(hasattr(action, '__dict__'))
+        params = action.to_dict()
+        self.assertEqual(params['fromUpstream'], 'kept')
+        self.assertNotIn('position', params)
+        same = Action.from_dict(params, position=3)
+        self.assertEqual(same.to_dict(), params)
+        self.assertEqual(same.getActionHash(), action.getActionHash())
+        self.assertEqual(Action.from_dict(dict(actionType='InputAction', css='#q', inputString='ford')).to_dict()['inputString'], 'ford')
+
+    def test_immutable(self):
+        action = Action.from_dict(capture)
+        with self.assertRaises(AttributeError):
+            action.data = {}
+        copy = action.replace(backupKey='https://example.com/cars')
+        self.assertIsNone(action.backupKey)
+        self.assertEqual(copy.backupKey, 'https://example.com/cars')
+        self.assertEqual(copy.position, action.position)
+
+    def test_error_round_trip(self):
+        report = ActionableItemNotFound(position=2, chainName='cars', actionHash='abc', userID='user').to_dict()
+        self.assertEqual(report['errorType'], 'ActionableItemNotFound')
+        error = ActionChainException.from_dict(report)
+        self.assertIsInstance(error, ActionableItemNotFound)
+        self.assertEqual(error.to_dict(), report)
+
+
+class TestReturnRecords(TestCase):
+
+    def test_detached(self):
+        soup = parse('<html><body><a href="/1"><span class="title">one</span></a></body></html>')
+        item = soup.find(attrs={'class': 'title'})
+        data = (item, item.find_parent('a').attrs)
+        ret = BrowserActions.Return(action=Action.from_dict(capture), data=data, current_url='https://example.com', name='cars', userID='user', detached=True)
+        self.assertEqual(ret.data, ('<span class="title">one</span>', {'href': '/1'}))
+        with self.assertRaises(AttributeError):
+            ret.data = None
+        # nothing holds the parsed page
+        page = weakref.ref(soup)
+        del soup, item, data
+        gc.collect()
+        self.assertIsNone(page())
+        same = BrowserActions.Return.from_dict(ret.to_dict())
+        self.assertEqual(same.to_dict(), ret.to_dict())
+
+    def test_attached_by_default(self):
+        soup = parse('<span class="title">one</span>')
+        ret = BrowserActions.Return(action=None, data=soup.span, current_url='https://example.com', name='cars')
+        self.assertIsInstance(ret.data, Tag)
+        self.assertIsNone(ret.to_dict()['action'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+from unittest import TestCase, mock
+import tempfile
+import unittest
+
+from feed.actionchains import ActionChainRunner
+from feed.crawling import BrowserActions
+from feed.replay import PageRecorder, Recording, ReplayDriver
+
+
+page = ('<html><body><div class="cards">'
+        '<div class="card"><span class="title">{}</span></div>'
+        '<div class="card"><span class="title">{}</span></div>'
+        '</div><a class="next" href="/cars?page={}">Next</a></body></html>')
+
+capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+click = dict(actionType='ClickAction', css='a.next', xpath='', text='Next', isSingle=True)
+chainParams = dict(name='cars', startUrl='https://example.com/cars', isRepeating=False, actions=[capture, click, capture])
+
+
+class Caller(ActionChainRunner):
+    def __init__(self):
+        super().__init__(BrowserActions)
+        self.captured = []
+
+    def onCaptureActionCallback(self, item, *args, **kwargs):
+        self.captured.append(item.data)
+
+
+class TestReplay(TestCase):
+
+    def setUp(self):
+        for method in ('get', 'put'):
+            patcher = mock.patch(f'feed.service.Client.{method}', return_value={})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = directory.name
+        recording = Recording(f'{self.path}/recorded')
+        first = recording.addPage('https://example.com/cars', page.format('one', 'two', 2))
+        second = recording.addPage('https://example.com/cars?page=2', page.format('three', 'four', 3))
+        recording.addUrl('https://example.com/cars', first)
+        recording.addTransition(first, 'a|next|Next', second)
+
+    def run_chain(self, driver):
+        caller = Caller()
+        chain = BrowserActions(driver=driver, **chainParams)
+        chain.execute(caller)
+        return chain, caller.captured
+
+    def test_replay(self):
+        driver = ReplayDriver(f'{self.path}/recorded')
+        chain, captured = self.run_chain(driver)
+        self.assertEqual(captured, ['one', 'two', 'three', 'four'])
+        self.assertEqual(driver.current_url, 'https://example.com/cars?page=2')
+        self.assertEqual((driver.clicks, driver.missedClicks), (1, 0))
+        self.assertFalse(chain.failedChain)
+
+    def test_record_then_replay(self):
+        # the replay driver stands in for the live browser being recorded
+        recorder = PageRecorder(ReplayDriver(f'{self.path}/recorded'), f'{self.path}/rerecorded')
+        _, recordedCapture = self.run_chain(recorder)
+        recording = Recording(f'{self.path}/rerecorded')
+        self.assertEqual(len(recording.pages), 2)
+        self.assertEqual(recording.transitions, Recording(f'{self.path}/recorded').transitions)
+        _, replayedCapture = self.run_chain(ReplayDriver(f'{self.path}/rerecorded'))
+        self.assertEqual(replayedCapture, recordedCapture)
+
+
+if __name__ == '__main__':
+    unittest.main()
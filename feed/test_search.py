@@ -0,0 +1,76 @@
+from unittest import TestCase
+import unittest
+
+from feed.actiontypes import CaptureAction, ClickAction
+from feed.fetching import StaticDocument
+from feed.locators import StrategyStats
+from feed.pagecache import PageCache
+from feed.scripts import ELEMENT_SEARCH
+
+
+page = '<html><body><div class="pager"><a class="page">Previous</a><a class="page">Next</a><a class="page">Last</a></div>{}</body></html>'
+
+
+class SearchDriver:
+    """
+    a page fetched without the browser, counting the round trips of the searches on it.
+    """
+    def __init__(self, source, results=None):
+        self.document = StaticDocument('https://example.com/cars', source)
+        self.results = results
+        self.searches = []
+
+    def execute_script(self, script, *args):
+        if script is ELEMENT_SEARCH:
+            self.searches.append(args[0])
+        if self.results is not None and script is ELEMENT_SEARCH:
+            return self.results
+        return self.document.execute_script(script, *args)
+
+
+def action(**params):
+    return CaptureAction(position=0, captureName='cars', returnType='text', **params)
+
+
+class TestBrowserSearchParams(TestCase):
+
+    def test_one_round_trip_in_strategy_order(self):
+        driver = SearchDriver(page.format(''), results=[['css', []], ['xpath', [{'class': 'page', 'text': 'Next', 'attr': None}]]])
+        found = action(css='.missing', xpath='//a[2]', isSingle=True).search(driver)
+        self.assertEqual(found, 'Next')
+        self.assertEqual(driver.searches, [[['css', '.missing'], ['xpath', '//a[2]']]])
+        # the strategy which has won most is tried first
+        stats = StrategyStats()
+        searched = action(css='.missing', xpath='//a[2]', isSingle=True)
+        stats.record(searched.getActionHash(), 'xpath')
+        searched.search(driver, strategyStats=stats)
+        self.assertEqual(driver.searches[-1], [['xpath', '//a[2]'], ['css', '.missing']])
+
+    def test_search_stops_at_the_first_strategy_found(self):
+        document = StaticDocument('https://example.com/cars', page.format('<span class="title">car</span>'))
+        results = document.execute_script(ELEMENT_SEARCH, [['css', '.missing'], ['css', '.title'], ['css', '.page']], True, None, False)
+        self.assertEqual([kind for kind, _ in results], ['css', 'css'])
+        self.assertEqual(results[-1][1][0]['text'], 'car')
+
+    def test_backup_matched_by_text(self):
+        driver = SearchDriver(page.format(''))
+        self.assertEqual(action(css='.page', isSingle=True, text='next').search(driver), 'Next')
+        # none with the text, the first of them
+        self.assertEqual(action(css='.page', isSingle=True, text='first').search(driver), 'Previous')
+        self.assertEqual(len(driver.searches), 2)
+
+    def test_backup_is_not_kept_between_searches(self):
+        searched = action(css='.page', isSingle=True, text='next')
+        self.assertEqual(searched.search(SearchDriver(page.format(''))), 'Next')
+        self.assertIsNone(searched.search(SearchDriver('<html><body><p>no pager</p></body></html>')))
+
+    def test_only_clicks_match_text_fuzzily(self):
+        driver = SearchDriver(page.format(''))
+        self.assertEqual(action(css='.missing', isSingle=True, text='next').search(driver, pages=PageCache()), 'Next')
+        self.assertIsNone(action(css='.missing', isSingle=True, text='Nxt').search(driver, pages=PageCache()))
+        click = ClickAction(position=0, css='.missing', text='Nxt')
+        self.assertEqual(click.search(driver, pages=PageCache()).text, 'Next')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+from unittest import TestCase, mock
+import unittest
+
+from feed.actionchains import ActionChainRunner
+from feed.actiontypes import ActionableItemNotFound, Action
+from feed.fetching import HttpActions
+from feed.test_fetching import FakeDriver, FakeFetcher, listing
+
+
+class Chain(HttpActions):
+    """
+    a streaming chain which logs what it republishes, interleaved with the caller's callbacks.
+    """
+    def __init__(self, log, **kwargs):
+        super().__init__(**kwargs)
+        self.log = log
+
+    def rePublish(self, action, key, data, *args, **kwargs):
+        self.log.append(('rePublish', type(action).__name__, data))
+
+
+class Caller(ActionChainRunner):
+    def __init__(self, log):
+        super().__init__(HttpActions)
+        self.log = log
+
+    def onCaptureActionCallback(self, item, *args, **kwargs):
+        self.log.append(('callback', 'CaptureAction', item.data))
+
+    def onPublishActionCallback(self, item, *args, **kwargs):
+        self.log.append(('callback', 'PublishAction', item.data))
+
+
+class TestStreaming(TestCase):
+
+    def setUp(self):
+        for method in ('get', 'put'):
+            patcher = mock.patch(f'feed.service.Client.{method}', return_value={})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.log = []
+
+    def chain(self, actions):
+        chain = Chain(self.log, driver=FakeDriver(), name='cars', startUrl='https://example.com/cars', isRepeating=False, fetchMode='http', streaming=True, actions=actions)
+        chain.fetcher = FakeFetcher({'https://example.com/cars': listing})
+        return chain
+
+    def test_capture_streams_each_item(self):
+        capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        chain = self.chain([capture])
+        chain.execute(Caller(self.log))
+        # each item is republished and called back before the next is taken
+        self.assertEqual(self.log, [('rePublish', 'CaptureAction', ['one']), ('callback', 'CaptureAction', 'one'),
+                                    ('rePublish', 'CaptureAction', ['two']), ('callback', 'CaptureAction', 'two')])
+        self.assertFalse(chain.failedChain)
+
+    def test_publish_streams_each_link(self):
+        publish = dict(actionType='PublishAction', css='.card', xpath='', text='', isSingle=False, urlStub='/cars', returnType='element')
+        chain = self.chain([publish])
+        chain.execute(Caller(self.log))
+        self.assertEqual([entry[0] for entry in self.log], ['rePublish', 'callback', 'rePublish', 'callback'])
+        self.assertEqual([data for kind, _, data in self.log if kind == 'callback'], ['/cars/1', '/cars/2'])
+        self.assertEqual([data for kind, _, data in self.log if kind == 'rePublish'], [['/cars/1'], ['/cars/2']])
+        self.assertFalse(chain.failedChain)
+
+    def test_nothing_found(self):
+        capture = dict(actionType='CaptureAction', css='.missing', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        publish = dict(actionType='PublishAction', css='.title', xpath='', text='', isSingle=False, urlStub='/trucks', returnType='element')
+        for action in (capture, publish):
+            self.log.clear()
+            chain = self.chain([action])
+            with mock.patch.object(Action, 'publishActionError') as published:
+                chain.execute(Caller(self.log))
+            self.assertEqual(self.log, [])
+            self.assertTrue(chain.failedChain)
+            published.assert_called_once()
+            self.assertIsInstance(published.call_args[0][1], ActionableItemNotFound)
+
+    def test_stream_is_lazy(self):
+        capture = dict(actionType='CaptureAction', css='.title', xpath='', text='', isSingle=False, captureName='cars', returnType='text')
+        chain = self.chain([capture])
+        chain.initialise(Caller(self.log))
+        items = chain.onCaptureAction(chain.actions[0])
+        self.assertEqual(self.log, [])
+        self.assertEqual(next(items).data, 'one')
+        self.assertEqual(self.log, [('rePublish', 'CaptureAction', ['one'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+from unittest import TestCase, mock
+import sys
+import unittest
+from time import time
+
+from feed.supervisor import SeleniumSupervisor
+
+
+def script(source):
+    return [sys.executable, '-u', '-c', source]
+
+
+quiet = script('import time\nprint("Selenium Server is up and running on port 4444")\ntime.sleep(60)')
+crashing = script('print("Selenium Server is up and running on port 4444")')
+chatty = script('import time\nwhile True:\n    print("x" * 100)')
+
+
+class TestSeleniumSupervisor(TestCase):
+
+    def supervise(self, command, **kwargs):
+        supervisor = SeleniumSupervisor(command, statusInterval=0.05, restartWait=0, **kwargs).start()
+        self.addCleanup(supervisor.stop, 5)
+        return supervisor
+
+    def test_ready_from_log_and_stop_when_quiet(self):
+        supervisor = self.supervise(quiet)
+        self.assertTrue(supervisor.waitUntilReady(10))
+        process = supervisor.process
+        start = time()
+        supervisor.stop(10)
+        self.assertLess(time() - start, 5)
+        self.assertIsNotNone(process.poll())
+        self.assertFalse(supervisor.ready)
+
+    def test_stop_when_chatty(self):
+        supervisor = self.supervise(chatty)
+        with mock.patch.object(supervisor, 'logger'):
+            supervisor.waitUntilReady(0.2)
+            start = time()
+            supervisor.stop(10)
+        self.assertLess(time() - start, 5)
+        self.assertIsNotNone(supervisor.process.poll())
+
+    def test_ready_from_status(self):
+        with mock.patch('feed.supervisor.requests.get') as get:
+            get.return_value.ok = True
+            get.return_value.json.return_value = {'value': {'ready': True}}
+            supervisor = self.supervise(script('import time\ntime.sleep(60)'), statusUrl='http://localhost:4444/wd/hub/status')
+            self.assertTrue(supervisor.waitUntilReady(10))
+        get.assert_called_with('http://localhost:4444/wd/hub/status', timeout=0.05)
+
+    def test_restarts_on_crash(self):
+        supervisor = self.supervise(crashing, restarts=1)
+        deadline = time() + 10
+        while supervisor.starts < 4 and time() < deadline:
+            supervisor.waitUntilReady(0.05)
+        # reaching ready resets the count of crashes, so it keeps restarting
+        self.assertGreaterEqual(supervisor.starts, 4)
+        self.assertTrue(supervisor._thread.is_alive())
+
+    def test_gives_up_after_restarts(self):
+        supervisor = self.supervise(script('import sys\nsys.exit(1)'), restarts=2)
+        supervisor._thread.join(10)
+        self.assertEqual((supervisor.starts, supervisor.crashes), (3, 3))
+        self.assertFalse(supervisor.waitUntilReady(0.1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+from unittest import TestCase
+import threading
+import unittest
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from feed.navigation import NavigationWaiter
+from feed.profiles import BrowserProfile
+from feed.scripts import NAVIGATION_STATE
+from feed.tabs import SessionTabs
+
+
+class FakeBrowser:
+    """
+    the command executor of a remote session, with windows as chrome has them.
+    """
+    def __init__(self):
+        self.w3c = True
+        self.windows = ['home']
+        self.current = 'home'
+        self.urls = {'home': 'about:blank'}
+        self.clicks = []
+        self.lock = threading.Lock()
+        self.opened = 0
+        self.polls = [] # window of each poll of the navigation state
+        self.blocked = {} # window: url patterns
+        self._commands = {}
+
+    def execute(self, command, params):
+        assert self.lock.acquire(blocking=False), 'commands of a session were sent at the same time'
+        try:
+            return {'value': self._execute(command, params)}
+        finally:
+            self.lock.release()
+
+    def _execute(self, command, params):
+        if command == 'newSession':
+            return {'sessionId': 'session', 'capabilities': {}}
+        if command == 'w3cGetCurrentWindowHandle':
+            return self.current
+        if command == 'w3cGetWindowHandles':
+            return list(self.windows)
+        if command == 'w3cExecuteScript' and params['script'] is NAVIGATION_STATE:
+            # settles on the fourth poll
+            self.polls.append(self.current)
+            settled = self.polls.count(self.current) >= 4
+            return {'url': self.urls[self.current], 'navigated': False, 'ready': True, 'idle': settled}
+        if command == 'w3cExecuteScript':
+            self.opened += 1
+            handle = f'tab{self.opened}'
+            self.windows.append(handle)
+            self.urls[handle] = 'about:blank'
+            return None
+        if command == 'switchToWindow':
+            assert params['handle'] in self.windows
+            self.current = params['handle']
+            return None
+        if command == 'close':
+            self.windows.remove(self.current)
+            return None
+        if command == 'get':
+            self.urls[self.current] = params['url']
+            return None
+        if command == 'getCurrentUrl':
+            return self.urls[self.current]
+        if command == 'findElements':
+            return [{'ELEMENT': f'{self.current}-button'}]
+        if command == BrowserProfile.cdpCommand:
+            if params['cmd'] == 'Network.setBlockedURLs':
+                self.blocked[self.current] = params['params']['urls']
+            return {}
+        if command == 'clickElement':
+            self.clicks.append((self.current, params['id']))
+            return None
+        raise AssertionError(command)
+
+
+class Chain:
+    def __init__(self, driver, name, startUrl):
+        self.driver = driver
+        self.name = name
+        self.startUrl = startUrl
+
+    def shouldRun(self):
+        return True
+
+    def execute(self, caller):
+        self.driver.get(self.startUrl)
+        self.urls = []
+        for _ in range(20):
+            self.urls.append(self.driver.current_url)
+
+
+class Caller:
+    def onChainEndCallback(self, chain, ret):
+        pass
+
+
+class TestSessionTabs(TestCase):
+
+    def setUp(self):
+        self.browser = FakeBrowser()
+        self.driver = WebDriver(command_executor=self.browser, desired_capabilities={})
+
+    def test_tabs_keep_their_window(self):
+        tabs = SessionTabs(self.driver, maxTabs=0)
+        first, second = tabs.open(), tabs.open()
+        first.get('https://example.com/first')
+        second.get('https://example.com/second')
+        self.assertEqual((first.current_url, second.current_url), ('https://example.com/first', 'https://example.com/second'))
+        button = first.find_elements_by_css_selector('a.next')[0]
+        second.current_url
+        button.click()
+        self.assertEqual(self.browser.clicks, [(first.handle, f'{first.handle}-button')])
+
+    def test_close(self):
+        tabs = SessionTabs(self.driver, maxTabs=0)
+        with tabs.tab() as first:
+            second = tabs.open()
+            second.quit()
+            first.current_url
+        self.assertEqual(self.browser.windows, ['home'])
+        self.assertEqual(self.browser.current, 'home')
+        self.assertEqual(self.driver.current_url, 'about:blank')
+
+    def test_tabs_block_the_profiles_requests(self):
+        tabs = SessionTabs(self.driver, maxTabs=0, profile=BrowserProfile('lean', blockUrls=['*analytics*']))
+        first, second = tabs.open(), tabs.open()
+        self.assertEqual(self.browser.blocked, {first.handle: ['*analytics*'], second.handle: ['*analytics*']})
+        # nothing to block
+        tabs = SessionTabs(self.driver, maxTabs=0, profile=BrowserProfile('default'))
+        third = tabs.open()
+        self.assertNotIn(third.handle, self.browser.blocked)
+
+    def test_navigation_waits_overlap(self):
+        tabs = SessionTabs(self.driver, maxTabs=0)
+        first, second = tabs.open(), tabs.open()
+        results = {}
+        def wait(tab):
+            results[tab.handle] = NavigationWaiter(timeout=5, idle=0.1, domainTimeouts={}).wait(tab, ('about:blank', 'marker'))
+        waiting = [threading.Thread(target=wait, args=(tab,)) for tab in (first, second)]
+        for thread in waiting:
+            thread.start()
+        for thread in waiting:
+            thread.join(5)
+        self.assertTrue(all(result.idle and not result.timeout for result in results.values()))
+        # the tabs are polled in turn rather than one waiting for the other to settle
+        polls = self.browser.polls
+        self.assertLess(polls.index(second.handle), len(polls) - 1 - polls[::-1].index(first.handle))
+        self.assertLess(polls.index(first.handle), len(polls) - 1 - polls[::-1].index(second.handle))
+
+    def test_run_chains(self):
+        tabs = SessionTabs(self.driver, maxTabs=3)
+        params = [dict(name=f'chain{i}', startUrl=f'https://example.com/{i}') for i in range(6)]
+        chains = tabs.runChains(Caller(), Chain, params)
+        for chain in chains:
+            self.assertEqual(set(chain.urls), {chain.startUrl})
+        self.assertLessEqual(self.browser.opened, 6)
+        self.assertEqual(self.browser.windows, ['home'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+from unittest import TestCase, mock
+import threading
+import unittest
+from queue import Queue
+from selenium.common.exceptions import WebDriverException
+
+from feed.actionchains import ActionChainRunner, KafkaActionSubscription
+from feed.crawling import BrowserActions, BrowserService
+from feed.test_fetching import FakeDriver
+from feed.workers import ChainScheduler, ChainWorkers
+
+
+class Chain:
+    """
+    a chain which runs repeats times, logging each run.
+    """
+    log = []
+    lock = threading.Lock()
+
+    def __init__(self, driver, name, repeats=1, fail=False, killsDriver=None, **kwargs):
+        self.driver = driver
+        self.fail = fail
+        self.killsDriver = killsDriver # runner whose driver the chain fails with
+        self.name = name
+        self.remaining = repeats
+        self.repeating = repeats > 1
+        self.isSample = False
+        self.initialised = 0
+
+    def shouldRun(self):
+        return self.remaining > 0
+
+    def execute(self, caller, initialise=True):
+        self.initialised += initialise
+        self.remaining -= 1
+        if self.killsDriver is not None:
+            self.killsDriver.healthy = False
+            raise WebDriverException('chrome not reachable')
+        if self.fail:
+            raise RuntimeError('chain failed')
+        with Chain.lock:
+            Chain.log.append((self.name, self.driver))
+
+
+class Runner(ActionChainRunner):
+    def __init__(self, messages):
+        super().__init__(Chain)
+        self.messages = messages
+        self.drivers = 0
+        self.ended = Queue()
+        self.healthy = True # whether the driver, shared by the tabs, is
+
+    def subscription(self):
+        while True:
+            yield self.messages.get()
+
+    def checkoutWorkerDriver(self):
+        self.drivers += 1
+        return f'driver{self.drivers}'
+
+    def workerDriverHealthy(self, driver):
+        return self.healthy
+
+    def onChainEndCallback(self, chain, chainReturn):
+        if not chain.shouldRun():
+            self.ended.put(chain.name)
+
+
+class TestChainScheduler(TestCase):
+
+    def setUp(self):
+        Chain.log = []
+
+    def test_round_robin(self):
+        scheduler = ChainScheduler(Runner(Queue()), 'driver')
+        scheduler.add(dict(name='repeating', repeats=3), 'leader-route')
+        scheduler.add(dict(name='other', repeats=2), 'leader-route')
+        scheduler.add(dict(name='once'), 'leader-route')
+        while scheduler.step():
+            pass
+        self.assertEqual([name for name, _ in Chain.log], ['repeating', 'other', 'once', 'repeating', 'other', 'repeating'])
+
+    def test_shared_driver_initialises_again(self):
+        scheduler = ChainScheduler(Runner(Queue()), 'driver')
+        scheduler.add(dict(name='repeating', repeats=3), 'leader-route')
+        chain = scheduler.active[0].chain
+        scheduler.step()
+        # nothing else ran on the driver in between
+        self.assertEqual(chain.initialised, 1)
+        scheduler.add(dict(name='once'), 'leader-route')
+        scheduler.step()
+        self.assertEqual(chain.initialised, 2)
+
+    def test_close(self):
+        scheduler = ChainScheduler(Runner(Queue()), 'driver')
+        scheduler.add(dict(name='repeating', repeats=3), 'leader-route-sample')
+        self.assertTrue(scheduler.active[0].chain.isSample)
+        self.assertEqual(scheduler.close(), [(dict(name='repeating', repeats=3), 'leader-route-sample')])
+        self.assertFalse(scheduler.step())
+
+    def test_failed_chain_is_dropped(self):
+        tabs = Tabs()
+        scheduler = ChainScheduler(Runner(Queue()), 'driver', tabs=tabs)
+        scheduler.add(dict(name='failing', repeats=3, fail=True), 'leader-route')
+        scheduler.add(dict(name='repeating', repeats=2), 'leader-route')
+        while scheduler.step():
+            pass
+        self.assertEqual(scheduler.failures, 1)
+        self.assertEqual([name for name, _ in Chain.log], ['repeating', 'repeating'])
+        self.assertEqual(tabs.opened, 0)
+
+    def test_chain_interrupted_by_driver_is_started_again(self):
+        tabs = Tabs()
+        runner = Runner(Queue())
+        scheduler = ChainScheduler(runner, 'driver', tabs=tabs)
+        params = dict(name='dying', repeats=2, killsDriver=runner)
+        scheduler.add(dict(name='repeating', repeats=2), 'leader-route')
+        scheduler.add(params, 'leader-route')
+        self.assertEqual(scheduler.failures, 0)
+        self.assertEqual(tabs.opened, 1)
+        # the chains still to run go to the worker's next driver too
+        self.assertEqual(scheduler.close(), [(params, 'leader-route'), (dict(name='repeating', repeats=2), 'leader-route')])
+        self.assertEqual(tabs.opened, 0)
+
+
+class Tabs:
+    """
+    SessionTabs which counts the tabs open.
+    """
+    maxTabs = 2
+
+    def __init__(self):
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        return f'tab{self.opened}'
+
+    def close(self, tab):
+        self.opened -= 1
+
+
+class TestChainWorkers(TestCase):
+
+    def test_kafka_workers_need_a_group(self):
+        runner = KafkaActionSubscription.__new__(KafkaActionSubscription)
+        runner.topics = ['feed-leader-route']
+        with mock.patch.dict('feed.actionchains.worker_params', {'group_id': None}):
+            runner.checkWorkers(1)
+            self.assertRaises(ValueError, ChainWorkers(runner, workers=2).start)
+            self.assertRaises(ValueError, ChainWorkers(runner, workers=1, processes=2).start)
+        with mock.patch.dict('feed.actionchains.worker_params', {'group_id': 'feed'}):
+            runner.checkWorkers(4)
+
+    def test_repeating_chain_does_not_block(self):
+        Chain.log = []
+        messages = Queue()
+        runner = Runner(messages)
+        workers = ChainWorkers(runner, workers=2).start()
+        self.addCleanup(workers.stop, 5)
+        messages.put((dict(name='forever', repeats=10 ** 9), 'leader-route'))
+        for i in range(5):
+            messages.put((dict(name=f'once{i}'), 'leader-route'))
+        ended = {runner.ended.get(timeout=5) for _ in range(5)}
+        self.assertEqual(ended, {f'once{i}' for i in range(5)})
+        self.assertEqual(runner.drivers, 2)
+        workers.stop(5)
+        self.assertFalse(any(worker.is_alive() for worker in workers.workers))
+
+
+class DeadDriver:
+    def get(self, url):
+        raise WebDriverException('chrome not reachable')
+
+
+class TestWorkerSessions(TestCase):
+
+    def setUp(self):
+        for method in ('get', 'put'):
+            patcher = mock.patch(f'feed.service.Client.{method}', return_value={})
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_worker_driver_is_not_renewed_by_the_runner(self):
+        # the runner's session is lent to the workers, the worker replaces its own
+        chain = BrowserActions(driver=DeadDriver(), name='cars', startUrl='https://example.com/cars', isRepeating=False, actions=[])
+        caller = mock.Mock(driver=None)
+        self.assertRaises(WebDriverException, chain._open, caller, 'https://example.com/cars')
+        caller.renewDriverSession.assert_not_called()
+        self.assertIsInstance(chain.driver, DeadDriver)
+        # the runner's own session is renewed
+        caller = mock.Mock(driver=chain.driver)
+        caller.renewDriverSession.side_effect = lambda: setattr(caller, 'driver', FakeDriver())
+        chain._open(caller, 'https://example.com/cars')
+        self.assertIs(chain.driver, caller.driver)
+        self.assertEqual(chain.driver.current_url, 'https://example.com/cars')
+
+    def test_runner_without_its_session(self):
+        service = BrowserService.__new__(BrowserService)
+        service.pool = mock.Mock()
+        service.pool.checkout.return_value = mock.Mock(driver='replacement')
+        service.profile = mock.Mock()
+        service.profile.name = 'default'
+        service.pooledDriver = service.driver = None
+        service.useProfile('default')
+        with mock.patch('feed.crawling.BrowserProfile.get', return_value=mock.Mock()):
+            service.useProfile('lean')
+        self.assertEqual(service.profile.name, 'default')
+        service.renewWebCrawler()
+        self.assertEqual(service.driver, 'replacement')
+        service.pooledDriver = service.driver = None
+        service.recoverDriver()
+        self.assertEqual(service.driver, 'replacement')
+        service.pool.checkin.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque, namedtuple
+from time import time
+
+from feed.settings import worker_params
+from feed.actionchains import ActionChainRunner, GracefulKiller
+
+
+ScheduledChain = namedtuple('ScheduledChain', ['chain', 'params', 'route', 'tab'])
+
+
+class ChainScheduler:
+    """
+    Runs a worker's chains round robin, a repeating chain runs once and then waits its turn
+    behind the other chains rather than repeating until it stops.
+
+    With tabs each chain runs in a window of its own, see feed.tabs.SessionTabs, and picks up
+    where it left off. Without, chains share the driver and a repeating chain which was not
+    the last to run is initialised again, which resumes from the last page it saved, see
+    ActionChain.recoverHistory.
+
+    A chain which fails is dropped, unless the driver has become unhealthy, see
+    ActionChainRunner.workerDriverHealthy, in which case it is started again once the worker
+    has replaced the driver, see close.
+
+    :param: runner: the ActionChainRunner whose implementation and callbacks are used
+    :param: driver: the worker's driver
+    :param: tabs: SessionTabs of driver, or None
+    """
+    def __init__(self, runner: ActionChainRunner, driver, tabs=None):
+        self.runner = runner
+        self.driver = driver
+        self.tabs = tabs
+        self.active = deque()
+        self.interrupted = [] # (actionChainParams, route) of chains which failed with the driver
+        self._lastRan = None
+        self.runs = 0
+        self.failures = 0
+
+    @property
+    def full(self) -> bool:
+        """
+        whether another chain would wait on a tab to close, the worker stops taking messages until one does.
+        """
+        return self.tabs is not None and bool(self.tabs.maxTabs) and len(self.active) >= self.tabs.maxTabs
+
+    def add(self, actionChainParams, route):
+        """
+        start a chain, it runs once before add returns. a chain which fails is dropped, the
+        worker carries on with the others.
+        """
+        tab = self.tabs.open() if self.tabs is not None else None
+        try:
+            chain = self.runner.newChain(tab if tab is not None else self.driver, actionChainParams)
+        except Exception:
+            logging.exception(f'ChainScheduler::add: could not construct chain, name=[{actionChainParams.get("name")}]')
+            self.failures += 1
+            if tab is not None:
+                self.tabs.close(tab)
+            return
+        if 'sample' in route:
+            chain.isSample = True
+        scheduled = ScheduledChain(chain=chain, params=actionChainParams, route=route, tab=tab)
+        try:
+            run = chain.shouldRun()
+        except Exception:
+            logging.exception(f'ChainScheduler::add: could not check {chain.name} should run')
+            self._finish(scheduled, failed=True)
+            return
+        if not run:
+            logging.info(f'ChainScheduler::add: skipping {chain.name}.')
+            self._finish(scheduled)
+            return
+        logging.info(f'ChainScheduler::add: START:{chain.name}, active=[{len(self.active)}]')
+        self._run(scheduled, initialise=True)
+
+    def step(self) -> bool:
+        """
+        run the next repeating chain once.
+        :return: whether there was one
+        """
+        if not self.active:
+            return False
+        scheduled = self.active.popleft()
+        self._run(scheduled, initialise=self.tabs is None and self._lastRan is not scheduled)
+        return True
+
+    def _run(self, scheduled: ScheduledChain, initialise):
+        self._lastRan = scheduled
+        self.runs += 1
+        try:
+            ret = scheduled.chain.execute(caller=self.runner, initialise=initialise)
+            self.runner.onChainEndCallback(scheduled.chain, ret)
+            repeat = scheduled.chain.repeating and scheduled.chain.shouldRun()
+        except Exception:
+            if not self.runner.workerDriverHealthy(self.driver):
+                logging.exception(f'ChainScheduler::_run: {scheduled.chain.name} has failed with the driver, starting it again on the next')
+                self._finish(scheduled, failed=True, interrupted=True)
+                return
+            logging.exception(f'ChainScheduler::_run: {scheduled.chain.name} has failed, dropping it')
+            self._finish(scheduled, failed=True)
+            return
+        if repeat:
+            self.active.append(scheduled)
+        else:
+            self._finish(scheduled)
+
+    def _finish(self, scheduled: ScheduledChain, failed=False, interrupted=False):
+        """
+        close the chain's tab, a chain which failed is not returned to the runner to run again.
+        :param: interrupted: the chain failed with the driver, close returns it to start again
+        """
+        if interrupted:
+            self.interrupted.append((scheduled.params, scheduled.route))
+        elif failed:
+            self.failures += 1
+        else:
+            self.runner.releaseChain(scheduled.chain)
+        if scheduled.tab is not None:
+            self.tabs.close(scheduled.tab)
+        logging.info(f'ChainScheduler::_finish: END:{scheduled.chain.name}, failed=[{failed}], active=[{len(self.active)}]')
+
+    def close(self) -> list:
+        """
+        stop the repeating chains.
+        :return: (actionChainParams, route) of each, and of the chains interrupted, to start again elsewhere
+        """
+        pending, self.interrupted = self.interrupted, []
+        while self.active:
+            scheduled = self.active.popleft()
+            if scheduled.tab is not None:
+                self.tabs.close(scheduled.tab)
+            pending.append((scheduled.params, scheduled.route))
+        return pending
+
+
+class ChainWorker(threading.Thread):
+    """
+    a worker of ChainWorkers: a subscription, a driver of its own, and the chains running on it.
+    """
+    def __init__(self, workers, index):
+        super().__init__(name=f'ChainWorker-{index}', daemon=True)
+        self.workers = workers
+        self.runner = workers.runner
+        self.index = index
+        self.pending = [] # chains to start again after the driver was replaced
+        self.error = None
+
+    def run(self):
+        subscription = self.runner.workerSubscription(self.index)
+        try:
+            while not self.workers.stopping.is_set():
+                driver = self.runner.checkoutWorkerDriver()
+                scheduler = ChainScheduler(self.runner, driver, tabs=self.runner.workerTabs(driver))
+                healthy = False
+                try:
+                    healthy = self._serve(scheduler, subscription)
+                finally:
+                    self.pending.extend(scheduler.close())
+                    self.runner.checkinWorkerDriver(driver, healthy=healthy)
+        except Exception as ex:
+            logging.exception(f'ChainWorker::run: worker=[{self.index}] has failed')
+            self.error = ex
+        finally:
+            subscription.close()
+
+    def _serve(self, scheduler: ChainScheduler, subscription) -> bool:
+        """
+        run chains until stopping, or the driver is unhealthy.
+        :return: whether the driver is healthy
+        """
+        while not self.workers.stopping.is_set():
+            if not scheduler.full:
+                if not self.pending:
+                    # do not wait on messages while there are chains to repeat
+                    timeout = 0 if scheduler.active else worker_params['poll_timeout']
+                    self.pending.extend(subscription.poll(timeout))
+                while self.pending and not scheduler.full:
+                    scheduler.add(*self.pending.pop(0))
+            scheduler.step()
+            if not self.runner.workerDriverHealthy(scheduler.driver):
+                logging.warning(f'ChainWorker::_serve: worker=[{self.index}] driver is unhealthy, replacing it, chains=[{len(scheduler.active)}]')
+                return False
+        return True
+
+
+class ChainWorkers:
+    """
+    Runs the runner's chains with workers threads, each with its own subscription and driver,
+    rather than one chain at a time in ActionChainRunner.main.
+
+    For kafka subscriptions each worker is a consumer of worker_params group_id, so messages
+    are shared out by partition, and running more processes, see runProcesses, scales the
+    same way. A worker's chains take turns, see ChainScheduler, so a repeating chain does
+    not hold up the messages behind it.
+
+    The runner's callbacks are called from every worker, so have to be thread safe.
+
+        ChainWorkers(runner, workers=4).main()
+
+    :param: runner: ActionChainRunner
+    :param: workers: threads, defaults to worker_params
+    :param: processes: processes running ChainWorkers of the same runner, see runProcesses
+    """
+    def __init__(self, runner: ActionChainRunner, workers=None, processes=1):
+        self.runner = runner
+        self.size = workers if workers is not None else worker_params['workers']
+        self.processes = processes
+        self.stopping = threading.Event()
+        self.workers = []
+
+    def start(self):
+        self.runner.checkWorkers(self.size * self.processes)
+        logging.info(f'ChainWorkers::start: starting {self.size} workers for {type(self.runner).__name__}')
+        self.workers = [ChainWorker(self, index) for index in range(self.size)]
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        deadline = time() + timeout if timeout is not None else None
+        for worker in self.workers:
+            worker.join(max(0, deadline - time()) if deadline is not None else None)
+
+    def main(self):
+        killer = GracefulKiller()
+        self.start()
+        while not killer.kill_now and any(worker.is_alive() for worker in self.workers):
+            self.stopping.wait(1)
+        self.stop()
+        self.runner.cleanUp()
+
+
+def _runWorkers(factory, workers, processes):
+    ChainWorkers(factory(), workers=workers, processes=processes).main()
+
+
+def runProcesses(factory, processes=None, workers=None):
+    """
+    run ChainWorkers in processes, for chains which are cpu bound in python.
+    :param: factory: picklable callable returning the runner, called in each process
+    :param: processes: processes, defaults to worker_params
+    :param: workers: threads of each process
+    """
+    processes = processes if processes is not None else worker_params['processes']
+    killer = GracefulKiller()
+    running = [multiprocessing.Process(target=_runWorkers, args=(factory, workers, processes), name=f'ChainWorkers-{index}') for index in range(processes)]
+    for process in running:
+        process.start()
+    while not killer.kill_now and any(process.is_alive() for process in running):
+        for process in running:
+            process.join(1)
+    for process in running:
+        if process.is_alive():
+            process.terminate()
+        process.join()